@@ -0,0 +1,186 @@
+"""Token budgets for admission control of model work"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class CostBudget:
+    """Budgets of estimated model tokens per client key.
+
+    ``limits`` maps a key kind ("session", "ip") to (tokens, period): each
+    key of that kind may spend ``tokens`` per ``period`` seconds, refilled
+    continuously. A budget is a single number per key, the time at which
+    its bucket would be full again (the generic cell rate algorithm), so a
+    charge is one read and one write. Kinds missing from ``limits`` are not
+    limited.
+    """
+
+    # Seconds between sweeps dropping keys whose bucket is full again
+    sweep_interval = 60
+
+    def __init__(self, limits):
+        self.limits = limits
+
+    def _plan(self, keys, cost, now, current):
+        """New full-at time of every key after spending ``cost``, and how long
+        to wait (0 if every key can afford it). ``current(key)`` gives a
+        key's stored full-at time or None."""
+        updates = {}
+        wait = 0.0
+        for kind, ident in keys:
+            if kind not in self.limits:
+                continue
+            tokens, period = self.limits[kind]
+            key = f"{kind}:{ident}"
+            # A request costing more than a whole budget is let through on a full one
+            charge = max(-tokens, min(cost, tokens)) * period / tokens
+            full_at = max(current(key) or now, now) + charge
+            wait = max(wait, full_at - now - period)
+            updates[key] = full_at
+        return updates, wait
+
+    def charge(self, keys, cost):
+        """Spend ``cost`` tokens from the budget of every (kind, id) in
+        ``keys``; returns 0 on success, else the seconds until they can all
+        afford it (nothing is spent then)"""
+        raise NotImplementedError
+
+    def refund(self, keys, cost):
+        """Give back a charge for work that did not happen"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": self.name, "limits": {kind: list(limit) for kind, limit in self.limits.items()}}
+
+
+class MemoryBudget(CostBudget):
+    """Budgets of this process only"""
+    name = "memory"
+
+    def __init__(self, limits):
+        super().__init__(limits)
+        self._full_at = {}
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _sweep(self, now):
+        if time.monotonic() - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = time.monotonic()
+        for key in [key for key, full_at in self._full_at.items() if full_at <= now]:
+            del self._full_at[key]
+
+    def charge(self, keys, cost):
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            updates, wait = self._plan(keys, cost, now, self._full_at.get)
+            if wait > 0:
+                return wait
+            self._full_at.update(updates)
+        return 0.0
+
+    def refund(self, keys, cost):
+        with self._lock:
+            updates, _ = self._plan(keys, -cost, 0, self._full_at.get)
+            self._full_at.update(updates)
+
+    def stats(self):
+        stats = super().stats()
+        stats["keys"] = len(self._full_at)
+        return stats
+
+
+class SQLiteBudget(CostBudget):
+    """Budgets shared by every worker through a small SQLite file.
+
+    The file holds nothing but one row per active key. It runs in WAL mode
+    without fsync (losing recent charges in a crash only refills some
+    budgets early), and each charge is one short ``BEGIN IMMEDIATE``
+    transaction, so checking a request costs well under a millisecond.
+    """
+    name = "sqlite"
+
+    def __init__(self, path, limits, busy_timeout=5):
+        super().__init__(limits)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS budgets (key TEXT PRIMARY KEY, full_at REAL NOT NULL)")
+
+    def _conn(self):
+        """One connection per thread and process (see SQLiteStore._conn)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _current(self, conn, keys):
+        names = [f"{kind}:{ident}" for kind, ident in keys if kind in self.limits]
+        rows = conn.execute(
+            f"SELECT key, full_at FROM budgets WHERE key IN ({','.join('?' * len(names))})", names)
+        return dict(rows.fetchall())
+
+    def _write(self, conn, updates):
+        conn.executemany(
+            "INSERT INTO budgets (key, full_at) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET full_at = excluded.full_at",
+            list(updates.items()))
+
+    def charge(self, keys, cost):
+        now = time.time()
+        with self._transaction() as conn:
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.monotonic()
+                conn.execute("DELETE FROM budgets WHERE full_at <= ?", (now,))
+            updates, wait = self._plan(keys, cost, now, self._current(conn, keys).get)
+            if wait > 0:
+                return wait
+            self._write(conn, updates)
+        return 0.0
+
+    def refund(self, keys, cost):
+        with self._transaction() as conn:
+            updates, _ = self._plan(keys, -cost, 0, self._current(conn, keys).get)
+            self._write(conn, updates)
+
+    def stats(self):
+        stats = super().stats()
+        stats["keys"] = self._conn().execute("SELECT COUNT(*) FROM budgets").fetchone()[0]
+        return stats
+
+
+def create_budget(config):
+    """Budgets from config.ADMISSION_*; None when admission control is off"""
+    limits = {
+        kind: (tokens, config.ADMISSION_PERIOD)
+        for kind, tokens in (("session", config.ADMISSION_SESSION_TOKENS), ("ip", config.ADMISSION_IP_TOKENS))
+        if tokens > 0
+    }
+    if not limits:
+        return None
+    if config.SHARED_STATE:
+        return SQLiteBudget(config.ADMISSION_DB_PATH, limits)
+    return MemoryBudget(limits)
@@ -1,15 +1,38 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
-import google.generativeai as genai
+import time
+_import_started = time.perf_counter()
+
+from flask import Blueprint, Flask, Response, g, request, jsonify, render_template, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 import os
+import copy
+import functools
 import json
+import math
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-import PyPDF2
-import re
 from config import Config
+import metrics
+from llm import STREAM_META_MARKER, dispatcher, generate_text, stream_text
+from notes_cache import NotesCache, content_key, study_key
+from jobs import UploadJobs
+from extractors import extract_file_content
+from upload_store import UploadStore
+from retrieval import SessionIndexes, content_chunks, estimate_tokens
+from admission import create_budget
+from store import create_store, decode_cursor, encode_cursor
+from context import ChatContexts
+from markdown_render import render_markdown
+from assets import DIST, STATIC_DIR, load_manifest
+from compression import ENCODINGS, SUFFIXES, choose_encoding, compress_response
+from records import Record
+from json_extract import SCHEMAS, JSONScanner, extract_json, first_valid, validate
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import threading
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import mimetypes
 import uuid
 from dotenv import load_dotenv
 from flask_cors import CORS
@@ -17,122 +40,154 @@ from flask import Flask, make_response
 
 load_dotenv()
 
-app = Flask(__name__)
-app.config.from_object(Config)
+# Routes are registered on this blueprint; create_app() builds the Flask app
+bp = Blueprint("edubot", __name__)
 
-# Enable CORS for modern frontend
-CORS(app)
+def request_session_id():
+    """The session a request names (JSON session_id or the X-Session-ID header), if any"""
+    data = request.get_json(silent=True) if request.is_json else None
+    session_id = data.get("session_id") if isinstance(data, dict) else None
+    return session_id or request.headers.get('X-Session-ID')
 
-# Initialize rate limiter
+# Rate limiter (request counts per address), bound to the app in create_app();
+# session ids are chosen by the client, so only the token budgets use them
 limiter = Limiter(
-    app=app,
     key_func=get_remote_address,
-    default_limits=[Config.RATE_LIMIT]
+    default_limits=[Config.RATE_LIMIT],
+    storage_uri=Config.RATELIMIT_STORAGE_URI
+)
+
+# Estimated model-token budgets per session and per IP (see admit()),
+# shared by the workers when Config.SHARED_STATE is on; None when disabled
+budget = create_budget(Config)
+
+# Fingerprinted static asset names, written by `python assets.py` at deploy time
+asset_manifest = load_manifest()
+
+# Startup timings of this process, reported by /health and /metrics
+startup = {"pid": os.getpid(), "import_seconds": None, "worker_ready_seconds": None, "preloaded": False}
+
+# Sessions and processed notes live in the store selected by Config.SESSION_STORE
+# (always the shared SQLite store when Config.SHARED_STATE is on)
+store = create_store(Config)
+
+# Notes are cached by content hash so repeated uploads skip the model call
+notes_cache = NotesCache(Config.NOTES_CACHE_SIZE, Config.NOTES_CACHE_DIR, max_disk_bytes=Config.NOTES_CACHE_DISK_BYTES)
+# Bump whenever the notes prompt changes so stale cached notes are not reused
+NOTES_PROMPT_VERSION = "1"
+
+# Generated quizzes and flashcard decks, reused for the same notes and parameters
+study_cache = NotesCache(Config.STUDY_CACHE_SIZE, Config.STUDY_CACHE_DIR, ttl=Config.STUDY_CACHE_TTL,
+                         max_disk_bytes=Config.STUDY_CACHE_DISK_BYTES)
+# Bump whenever the quiz or flashcard prompts change
+STUDY_PROMPT_VERSION = "1"
+# What the Quiz and Flashcards tabs request by default (used for prefetching)
+DEFAULT_QUIZ = {"topic": "", "difficulty": "intermediate", "num_questions": 5}
+DEFAULT_FLASHCARDS = {"topic": "", "num_cards": 10}
+
+# Characters of text extracted from an upload; map-reduce notes read further
+EXTRACT_BUDGET = (max(Config.EXTRACT_CHAR_BUDGET, Config.NOTES_MAX_CHARS)
+                  if Config.NOTES_MAP_REDUCE and Config.EXTRACT_CHAR_BUDGET else Config.EXTRACT_CHAR_BUDGET)
+
+# Uploaded files, stored once per distinct content and shared by sessions
+upload_store = UploadStore(Config.UPLOAD_FOLDER, Config.UPLOAD_RETENTION, EXTRACT_BUDGET)
+
+def release_session_uploads(session_id):
+    """Delete stored uploads that no session references any more"""
+    for blob_id in store.release_blob_refs(session_id):
+        # A concurrent upload of the same content may have referenced it again
+        store.delete_if_unreferenced(blob_id, upload_store.delete)
+
+store.on_evict(release_session_uploads)
+
+# Uploads are processed in the background on a bounded worker pool
+upload_jobs = UploadJobs(Config.UPLOAD_WORKERS, Config.UPLOAD_JOB_RETENTION, store)
+
+# Chunk summaries of long documents, shared by all uploads so the number of
+# concurrent map calls stays bounded however many files are processed
+notes_map_pool = ThreadPoolExecutor(max_workers=Config.NOTES_MAP_CONCURRENCY, thread_name_prefix="notes-map")
+
+# Per-session lexical index over uploaded documents, used for chat context
+session_indexes = SessionIndexes(Config.RETRIEVAL_CHUNK_CHARS)
+store.on_evict(session_indexes.drop)
+
+# Incrementally maintained, token-budgeted history/summary for chat prompts
+chat_contexts = ChatContexts(
+    history_tokens=Config.CHAT_HISTORY_TOKENS,
+    summary_tokens=Config.CHAT_SUMMARY_TOKENS,
+    message_tokens=Config.CHAT_MESSAGE_TOKENS
 )
+store.on_evict(chat_contexts.drop)
+
+# Values read from the caches and the store each time /metrics is scraped
+MODEL_CACHES = (("notes", notes_cache), ("study", study_cache))
+
+def cache_lookup_samples():
+    samples = []
+    for name, cache in MODEL_CACHES:
+        stats = cache.stats()
+        samples.append(({"cache": name, "result": "memory"}, stats["hits"] - stats["disk_hits"]))
+        samples.append(({"cache": name, "result": "disk"}, stats["disk_hits"]))
+        samples.append(({"cache": name, "result": "miss"}, stats["misses"]))
+    return samples
 
-# Configure Gemini
-genai.configure(api_key=Config.GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
+def store_bytes_samples():
+    stats = store.stats()
+    return [({"backend": store.name}, stats.get("approx_bytes", stats.get("db_bytes", 0)))]
 
-# Enhanced in-memory store with session management
-sessions = {}
-processed_notes = {}
+def store_record_samples():
+    stats = store.stats()
+    return [({"kind": kind}, stats[kind]) for kind in ("sessions", "notes", "uploads")]
+
+metrics.registry.collector(
+    "edubot_cache_lookups_total", "Notes and study cache lookups by result",
+    cache_lookup_samples, kind="counter"
+)
+metrics.registry.collector(
+    "edubot_cache_hit_ratio", "Share of cache lookups served from memory or disk",
+    lambda: [({"cache": name}, cache.stats()["hit_rate"]) for name, cache in MODEL_CACHES]
+)
+metrics.registry.collector(
+    "edubot_store_bytes", "Approximate in-memory store size, or the SQLite file size",
+    store_bytes_samples
+)
+metrics.registry.collector("edubot_store_records", "Sessions, notes and stored uploads", store_record_samples)
+metrics.registry.collector(
+    "edubot_retrieval_chunks", "Document chunks held in the chat retrieval index",
+    lambda: [({}, session_indexes.stats()["chunks"])]
+)
+metrics.registry.collector(
+    "edubot_model_calls_active", "Model calls currently holding a dispatcher slot",
+    lambda: [({}, dispatcher.stats()["active"])]
+)
+metrics.registry.collector(
+    "edubot_startup_seconds", "Time to import the app, and from fork to ready for gunicorn workers",
+    lambda: [({"phase": phase}, startup[f"{phase}_seconds"]) for phase in ("import", "worker_ready")
+             if startup[f"{phase}_seconds"] is not None]
+)
 
 # Create upload folder if not exists
 os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 
 # File upload configuration
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'pdf', 'txt', 'json', 'doc', 'docx'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+ALLOWED_EXTENSIONS = Config.ALLOWED_EXTENSIONS
+# Small files of these types can share a notes call (Config.NOTES_BATCH)
+NOTES_BATCH_EXTENSIONS = {'txt', 'json'}
+# Notes are generated from at most this many characters of a document
+NOTES_INPUT_CHARS = 15000
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 def format_gemini_response(text):
     """Enhanced formatting for modern UI"""
-    # Convert markdown to HTML
-    text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', text)
-    text = re.sub(r'\*(.*?)\*', r'<em>\1</em>', text)
-    text = re.sub(r'^### (.*?)$', r'<h3>\1</h3>', text, flags=re.MULTILINE)
-    text = re.sub(r'^## (.*?)$', r'<h2>\1</h2>', text, flags=re.MULTILINE)
-    text = re.sub(r'^# (.*?)$', r'<h1>\1</h1>', text, flags=re.MULTILINE)
-    
-    # Handle code blocks
-    text = re.sub(r'```(.*?)```', r'<code>\1</code>', text, flags=re.DOTALL)
-    text = re.sub(r'`(.*?)`', r'<code>\1</code>', text)
-    
-    # Handle lists
-    lines = text.split('\n')
-    formatted_lines, in_list = [], False
-    
-    for line in lines:
-        stripped = line.strip()
-        if stripped.startswith(('- ', '* ', '• ')):
-            if not in_list:
-                formatted_lines.append('<ul class="message-list">')
-                in_list = True
-            formatted_lines.append(f'<li>{stripped[2:]}</li>')
-        elif stripped.startswith(tuple(f'{i}. ' for i in range(1, 10))):
-            if not in_list:
-                formatted_lines.append('<ol class="message-list">')
-                in_list = True
-            formatted_lines.append(f'<li>{stripped[3:]}</li>')
-        else:
-            if in_list:
-                formatted_lines.append('</ul>' if '- ' in text or '* ' in text else '</ol>')
-                in_list = False
-            if stripped:
-                formatted_lines.append(f'<p>{line}</p>')
-            else:
-                formatted_lines.append('<br>')
-    
-    if in_list:
-        formatted_lines.append('</ul>')
-    
-    return '\n'.join(formatted_lines)
+    with metrics.timed("format", "chat"):
+        return render_markdown(text)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_text_from_pdf(pdf_file):
-    text = ""
-    try:
-        reader = PyPDF2.PdfReader(pdf_file)
-        for page in reader.pages:
-            text += page.extract_text() or ""
-    except Exception as e:
-        print(f"PDF error: {e}")
-    return text
-
-def extract_file_content(filepath):
-    """Extract text from various file types"""
-    try:
-        if filepath.endswith('.pdf'):
-            with open(filepath, 'rb') as f:
-                return extract_text_from_pdf(f)
-        elif filepath.endswith('.txt'):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return f.read()
-        elif filepath.endswith('.json'):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return str(json.load(f))
-        elif filepath.endswith(('.doc', '.docx')):
-            return "Document content extraction not yet implemented for this format."
-    except Exception as e:
-        print(f"Error extracting content: {e}")
-        return ""
-    return ""
-
-def generate_structured_notes(content, subject=""):
-    """Generate structured notes with enhanced prompt"""
-    prompt = f"""
-Analyze this educational content and create comprehensive structured notes in JSON format.
-
-Subject: {subject}
-Content: {content[:15000]}
-
-Required JSON structure:
-{{
-    "title": "Concise, descriptive title",
+# Notes fields asked of the model, shared by the single and batched prompts
+NOTES_FIELDS = """    "title": "Concise, descriptive title",
     "summary": "Comprehensive 2-3 paragraph summary",
     "key_points": ["Important point 1", "Important point 2", "..."],
     "important_concepts": ["Concept 1", "Concept 2", "..."],
@@ -140,36 +195,482 @@ Required JSON structure:
     "potential_questions": ["Question 1", "Question 2", "..."],
     "difficulty_level": "Beginner/Intermediate/Advanced",
     "estimated_study_time": "X minutes"
-}}
+"""
 
-Focus on:
+NOTES_FOCUS = """Focus on:
 - Key formulas and equations (if applicable)
 - Important dates and events (if applicable)
 - Core theories and principles
 - Vocabulary and definitions
 - Practical applications
 """
+
+def notes_cache_key(content, subject):
+    return content_key(content[:NOTES_INPUT_CHARS], subject, NOTES_PROMPT_VERSION)
+
+def generate_structured_notes(content, subject=""):
+    """Generate structured notes with enhanced prompt"""
+    if Config.NOTES_MAP_REDUCE and len(content) > NOTES_INPUT_CHARS:
+        return generate_long_notes(content[:Config.NOTES_MAX_CHARS], subject)
+    content = content[:NOTES_INPUT_CHARS]
+    cache_key = notes_cache_key(content, subject)
+    cached = notes_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = f"""
+Analyze this educational content and create comprehensive structured notes in JSON format.
+
+Subject: {subject}
+Content: {content}
+
+Required JSON structure:
+{{
+{NOTES_FIELDS}}}
+
+{NOTES_FOCUS}"""
+    try:
+        response_text = generate_text(prompt, route="notes")
+        notes = extract_json(response_text, "notes")
+        if notes is None:
+            # Not cached, so the next upload of this content asks the model again
+            return {"summary": response_text, "title": f"Notes: {subject}"}
+        notes_cache.put(cache_key, notes)
+        return notes
+    except Exception as e:
+        return {"error": str(e), "title": f"Processing Error: {subject}"}
+
+def format_partial_notes(partials):
+    """Partial notes of consecutive sections as text for a merge prompt"""
+    sections = []
+    for number, notes in enumerate(partials, start=1):
+        lines = [f"Section {number}: {notes.get('summary', '')}"]
+        for label, key in (("Key points", "key_points"), ("Concepts", "important_concepts"),
+                           ("Questions", "potential_questions")):
+            items = [str(item) for item in notes.get(key) or []]
+            if items:
+                lines.append(f"{label}: " + "; ".join(items))
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+def summarize_chunk(chunk, subject):
+    """Partial notes of one section of a long document (the map step).
+
+    The prompt does not say where the section sits in the document, so the
+    same text gives the same cache key wherever an edit moved it.
+    """
+    cache_key = content_key(chunk, subject, NOTES_PROMPT_VERSION + "-chunk")
+    cached = notes_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    prompt = f"""
+Summarize this section of an educational document in JSON format.
+
+Subject: {subject}
+Section: {chunk}
+
+Required JSON structure:
+{{
+    "summary": "One paragraph summary of the section",
+    "key_points": ["Important point 1", "..."],
+    "important_concepts": ["Concept 1", "..."],
+    "potential_questions": ["Question 1", "..."]
+}}
+
+{NOTES_FOCUS}"""
+    notes = extract_json(generate_text(prompt, route="notes"), "notes_section")
+    if notes is None:
+        raise ValueError("Unparseable section summary")
+    notes_cache.put(cache_key, notes)
+    return notes
+
+def merge_partial_notes(partials, subject, final):
+    """Merge partial notes of consecutive sections (the reduce step): into
+    the full notes schema when ``final`` (None when the reply does not
+    parse), else into one partial summary"""
+    if final:
+        task = "Combine these summaries of consecutive sections of one educational document into comprehensive structured notes for the whole document"
+        fields = NOTES_FIELDS
+    else:
+        task = "Combine these summaries of consecutive sections of an educational document into one summary of the whole passage"
+        fields = """    "summary": "One paragraph summary of the passage",
+    "key_points": ["Important point 1", "..."],
+    "important_concepts": ["Concept 1", "..."],
+    "potential_questions": ["Question 1", "..."]
+"""
+    prompt = f"""
+{task}, in JSON format.
+
+Subject: {subject}
+Sections:
+{format_partial_notes(partials)}
+
+Required JSON structure:
+{{
+{fields}}}
+
+{NOTES_FOCUS}"""
+    notes = extract_json(generate_text(prompt, route="notes"), "notes" if final else "notes_section")
+    if notes is None and not final:
+        raise ValueError("Unparseable merged summary")
+    return notes
+
+def generate_long_notes(content, subject=""):
+    """Structured notes of a document longer than one notes call.
+
+    The document is split into content-defined chunks (see
+    retrieval.content_chunks), each chunk is summarised on notes_map_pool
+    and the partial notes are merged. When they are too long for one merge
+    call they are merged in groups first, as many rounds as needed. Chunk
+    summaries are cached on their own, so re-uploading a slightly edited
+    document only summarises the chunks the edit touched.
+    """
+    cache_key = content_key(content, subject, NOTES_PROMPT_VERSION + "-map-reduce")
+    cached = notes_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    chunks = content_chunks(content, Config.NOTES_CHUNK_CHARS)
+    futures = [notes_map_pool.submit(summarize_chunk, chunk, subject) for chunk in chunks]
+    partials = []
+    for future in futures:
+        try:
+            partials.append(future.result())
+        except Exception as e:
+            print(f"Section summary error: {e}")
+    if not partials:
+        return generate_structured_notes(content[:NOTES_INPUT_CHARS], subject)
+    print(f"Long notes: {len(partials)}/{len(chunks)} sections of {len(content)} characters")
+    # Notes missing a section are served but not cached, so the next upload retries it
+    complete = len(partials) == len(chunks)
+
     try:
-        response = model.generate_content(prompt)
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        else:
-            return {"summary": response.text, "title": f"Notes: {subject}"}
+        while len(format_partial_notes(partials)) > NOTES_INPUT_CHARS and len(partials) > 1:
+            groups, group = [], []
+            for notes in partials:
+                if group and len(format_partial_notes(group + [notes])) > NOTES_INPUT_CHARS:
+                    groups.append(group)
+                    group = []
+                group.append(notes)
+            groups.append(group)
+            if len(groups) == len(partials):
+                groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+            partials = [group[0] if len(group) == 1 else merge_partial_notes(group, subject, final=False)
+                        for group in groups]
+        notes = merge_partial_notes(partials, subject, final=True)
     except Exception as e:
         return {"error": str(e), "title": f"Processing Error: {subject}"}
+    if notes is None:
+        # The section summaries stand in, uncached, until a merge parses
+        return {"summary": format_partial_notes(partials), "title": f"Notes: {subject}"}
+    if complete:
+        notes_cache.put(cache_key, notes)
+    return notes
+
+def notes_batch_prompt(documents, subject):
+    parts = [
+        f"Analyze each of the following {len(documents)} educational documents separately and create "
+        "comprehensive structured notes for each one in JSON format.\n\n"
+        f"Subject: {subject}\n"
+    ]
+    for number, (filename, content) in enumerate(documents, start=1):
+        parts.append(f"\n=== DOCUMENT {number}: {filename} ===\n{content}\n=== END DOCUMENT {number} ===\n")
+    parts.append(f"""
+Return a JSON array with one object per document, in document order:
+[
+  {{
+    "document": 1,
+{NOTES_FIELDS}  }}
+]
+
+{NOTES_FOCUS}""")
+    return "".join(parts)
+
+def generate_batch_notes(documents, subject=""):
+    """Structured notes for several small documents [(filename, content)]
+    with one model call; returns one notes dict per document.
+
+    Cached documents are not sent again. Documents the reply leaves out
+    or gets wrong are retried on their own with generate_structured_notes.
+    """
+    results = [None] * len(documents)
+    pending = []
+    for i, (filename, content) in enumerate(documents):
+        cached = notes_cache.get(notes_cache_key(content, subject))
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
 
-@app.route("/")
+    if len(pending) > 1:
+        prompt = notes_batch_prompt(
+            [(documents[i][0], documents[i][1][:NOTES_INPUT_CHARS]) for i in pending], subject)
+        try:
+            replies = extract_json(generate_text(prompt, route="notes"), "notes_batch") or []
+        except Exception as e:
+            print(f"Batched notes error: {e}")
+            replies = []
+        by_number = {
+            reply.get("document"): reply for reply in replies
+            if isinstance(reply.get("document"), int)
+        }
+        for number, i in enumerate(pending, start=1):
+            reply = by_number.get(number)
+            if reply is None and not by_number and len(replies) == len(pending):
+                reply = replies[number - 1]     # numbering left out; trust the order
+            if reply is None or not validate(reply, SCHEMAS["notes"]):
+                continue
+            notes = {key: value for key, value in reply.items() if key != "document"}
+            notes_cache.put(notes_cache_key(documents[i][1], subject), notes)
+            results[i] = notes
+
+    for i in pending:
+        if results[i] is None:
+            results[i] = generate_structured_notes(documents[i][1], subject)
+    return results
+
+# Fingerprinted assets never change under the same name
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def asset_url(name):
+    """URL of a static file: its fingerprinted build output if there is one"""
+    fingerprinted = asset_manifest.get(name)
+    return f"/static/{DIST}/{fingerprinted}" if fingerprinted else f"/static/{name}"
+
+
+@bp.app_context_processor
+def template_helpers():
+    return {"asset_url": asset_url}
+
+
+@bp.route("/")
 def home():
-    return render_template("index.html")
+    response = make_response(render_template("index.html"))
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
 
 
-@app.route("/static/<path:filename>")
+@bp.route("/static/<path:filename>")
 def static_files(filename):
-    return send_from_directory('static', filename)
+    """Static files. Fingerprinted build output (see assets.py) is cached
+    for a year and sent precompressed when the client accepts it; plain
+    files are revalidated on every use."""
+    if not filename.startswith(DIST + "/"):
+        response = send_from_directory('static', filename)
+        response.cache_control.no_cache = True
+        return response
+
+    available = [
+        encoding for encoding in ENCODINGS
+        if os.path.isfile(safe_join(STATIC_DIR, filename + SUFFIXES[encoding]) or "")
+    ]
+    encoding = choose_encoding(request.accept_encodings, available)
+    if encoding is None:
+        response = send_from_directory('static', filename, max_age=IMMUTABLE_MAX_AGE)
+    else:
+        response = send_from_directory(
+            'static', filename + SUFFIXES[encoding], max_age=IMMUTABLE_MAX_AGE,
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+        response.headers["Content-Encoding"] = encoding
+    if available:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def saved_file_text(blob_id):
+    """Extracted text of a saved upload; raises ValueError when there is none"""
+    def extract(path):
+        with metrics.timed("extract", "upload"):
+            return extract_file_content(path, EXTRACT_BUDGET)
 
-@app.route("/upload", methods=["POST"])
+    content = upload_store.text(blob_id, extract)
+    if not content:
+        raise ValueError("Could not extract content")
+    return content
+
+def document_text(file_key):
+    """Full extracted text of an uploaded file, as register_notes indexed it
+    (the stored note keeps only the start of it); "" when it is gone"""
+    note = store.get_note(file_key)
+    if note is None:
+        return ""
+    if note.get("blob_id"):
+        try:
+            return saved_file_text(note["blob_id"])
+        except (ValueError, OSError):
+            pass
+    return note.get("content", "")
+
+def prepare_saved_file(blob_id, subject):
+    """Extract and summarise one saved upload; returns (content, notes) for
+    register_notes, or raises ValueError when no content could be extracted.
+    """
+    content = saved_file_text(blob_id)
+    return content, generate_structured_notes(content, subject)
+
+def prepare_saved_batch(files, subject):
+    """prepare_saved_file for several small uploads [(blob_id, filename)]
+    sharing one notes call. Returns one entry per file, in order: its
+    (content, notes), or the exception that failed it."""
+    results = [None] * len(files)
+    extracted = []
+    for i, (blob_id, filename) in enumerate(files):
+        try:
+            extracted.append((i, saved_file_text(blob_id)))
+        except Exception as e:
+            results[i] = e
+    notes = generate_batch_notes([(files[i][1], content) for i, content in extracted], subject)
+    for (i, content), file_notes in zip(extracted, notes):
+        results[i] = (content, file_notes)
+    return results
+
+def plan_notes_batches(saved_files, sizes):
+    """Group saved uploads (indexes into saved_files) by notes call.
+
+    With Config.NOTES_BATCH, .txt and .json files of at most
+    NOTES_BATCH_FILE_CHARS bytes are packed together, up to
+    NOTES_BATCH_CHARS and NOTES_BATCH_MAX_FILES per group; every other
+    file is a group of its own.
+    """
+    groups = []
+    batch, batch_chars = [], 0
+    for index, (blob_id, filename) in enumerate(saved_files):
+        size = sizes.get(blob_id)
+        if not (Config.NOTES_BATCH and size is not None and size <= Config.NOTES_BATCH_FILE_CHARS
+                and filename.rsplit('.', 1)[-1].lower() in NOTES_BATCH_EXTENSIONS):
+            groups.append([index])
+            continue
+        if batch and (batch_chars + size > Config.NOTES_BATCH_CHARS or len(batch) >= Config.NOTES_BATCH_MAX_FILES):
+            groups.append(batch)
+            batch, batch_chars = [], 0
+        batch.append(index)
+        batch_chars += size
+    if batch:
+        groups.append(batch)
+    return groups
+
+def register_notes(session_id, blob_id, filename, subject, content, notes):
+    """Store the notes of an upload and add it to the session; raises
+    ValueError if the session was deleted while the upload was processed"""
+    file_key = f"{session_id}_{filename.replace('.', '_')}"
+    
+    added = store.add_note({
+        "id": file_key,
+        "filename": filename,
+        "subject": subject,
+        "content": content[:10000],
+        "content_hash": content_key(content[:10000], subject),
+        "structured_notes": notes,
+        "session_id": session_id,
+        "blob_id": blob_id,
+        "processed_at": datetime.now().isoformat(),
+        "file_size": len(content),
+        "file_type": filename.split('.')[-1].upper()
+    })
+    if not added:
+        # Deleted meanwhile: keep it deleted and free the upload it referenced
+        release_session_uploads(session_id)
+        raise ValueError("Session no longer exists")
+    
+    session_indexes.add_document(session_id, file_key, content)
+    print(f"Processed file: {file_key} for session: {session_id}")
+    
+    return {
+        "filename": filename,
+        "file_key": file_key,
+        "status": "success",
+        "notes_preview": notes.get("summary", "")[:200] + "..."
+    }
+
+def on_upload_done(job):
+    """Runs on an upload worker once every file of a job has finished"""
+    if Config.STUDY_PREFETCH and job["status"] == "completed":
+        prefetch_study_materials(job["session_id"])
+
+# Estimated tokens of one model call on top of the user's own input: the
+# prompt template, the context the app adds and a typical reply
+MODEL_CALL_TOKENS = {"chat": 800, "notes": 1200, "quiz": 2500, "flashcards": 2000}
+
+def chat_cost():
+    data = request.get_json(silent=True)
+    message = data.get("message", "") if isinstance(data, dict) else ""
+    return (estimate_tokens(str(message)) + Config.CHAT_CONTEXT_TOKENS + Config.CHAT_HISTORY_TOKENS
+            + Config.CHAT_SUMMARY_TOKENS + MODEL_CALL_TOKENS["chat"])
+
+def stream_size(stream):
+    """Size in bytes of an uploaded file's (seekable) stream, or None"""
+    try:
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+def upload_cost():
+    """One notes call per accepted file, on up to NOTES_INPUT_CHARS of it
+    (the file size standing in for its text length, at about four
+    characters a token like estimate_tokens); with Config.NOTES_MAP_REDUCE
+    a longer file costs a call per chunk plus the merge, each on its text"""
+    limit = Config.NOTES_MAX_CHARS if Config.NOTES_MAP_REDUCE else NOTES_INPUT_CHARS
+    tokens = 0
+    for file in request.files.getlist('file'):
+        if file and allowed_file(file.filename):
+            size = stream_size(file.stream)
+            size = NOTES_INPUT_CHARS if size is None else min(size, limit)
+            calls = 1
+            if size > NOTES_INPUT_CHARS:
+                calls += math.ceil(size / Config.NOTES_CHUNK_CHARS)
+            tokens += size // 4 + calls * MODEL_CALL_TOKENS["notes"]
+    return tokens
+
+def admit(route, cost):
+    """Charge a request's estimated model tokens (``cost()``) to its session
+    and IP budgets before the view runs; if either is spent the request gets
+    a 429 with Retry-After before any extraction or model work. The charge
+    is given back when no model work was done: an error response or one
+    served from cache (X-Cache: HIT)."""
+    def decorator(view):
+        @functools.wraps(view)
+        def admitted(*args, **kwargs):
+            if budget is None:
+                return view(*args, **kwargs)
+            keys = [("ip", get_remote_address())]
+            session_id = request_session_id()
+            if session_id:
+                keys.append(("session", session_id))
+            tokens = cost()
+            wait = budget.charge(keys, tokens)
+            if wait > 0:
+                metrics.admission_rejections.inc(route=route)
+                retry_after = math.ceil(wait)
+                response = jsonify({
+                    "error": "Usage limit reached, please try again later.",
+                    "retry_after": retry_after
+                })
+                response.status_code = 429
+                response.headers["Retry-After"] = str(retry_after)
+                return response
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                budget.refund(keys, tokens)
+                raise
+            if response.status_code >= 400 or response.headers.get("X-Cache") == "HIT":
+                budget.refund(keys, tokens)
+            else:
+                metrics.admission_tokens.inc(tokens, route=route)
+            return response
+        return admitted
+    return decorator
+
+@bp.route("/upload", methods=["POST"])
 @limiter.limit("20 per minute")
+@admit("upload", upload_cost)
 def upload_file():
     if 'file' not in request.files:
         return jsonify({"error": "No file uploaded", "status": "error"}), 400
@@ -184,59 +685,92 @@ def upload_file():
     print(f"Upload - Session ID: {session_id}")  # Debug logging
     
     # Initialize session if not exists
-    if session_id not in sessions:
-        sessions[session_id] = {
-            "id": session_id,
-            "created_at": datetime.now().isoformat(),
-            "message_history": [],
-            "files": [],
-            "preferences": {}
-        }
+    get_or_create_session(session_id)
     
-    processed_files = []
+    # Files must be saved inside the request; processing can happen later
+    saved_files = []
     failed_files = []
+    sizes = {}
     
     for file in files:
         if file and allowed_file(file.filename):
             try:
                 filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}_{filename}")
-                file.save(filepath)
-                
-                content = extract_file_content(filepath)
-                if content:
-                    notes = generate_structured_notes(content, subject)
-                    file_key = f"{session_id}_{filename.replace('.', '_')}"
-                    
-                    processed_notes[file_key] = {
-                        "id": file_key,
-                        "filename": filename,
-                        "subject": subject,
-                        "content": content[:10000],
-                        "structured_notes": notes,
-                        "session_id": session_id,
-                        "processed_at": datetime.now().isoformat(),
-                        "file_size": len(content),
-                        "file_type": filename.split('.')[-1].upper()
-                    }
-                    
-                    sessions[session_id]["files"].append(file_key)
-                    processed_files.append({
-                        "filename": filename,
-                        "status": "success",
-                        "notes_preview": notes.get("summary", "")[:200] + "..."
-                    })
-                    print(f"Processed file: {file_key} for session: {session_id}")
-                else:
-                    failed_files.append({"filename": filename, "error": "Could not extract content"})
-                    
+                size = stream_size(file.stream)
+                with metrics.timed("save", "upload"):
+                    blob_id = upload_store.save(
+                        file.stream, filename, before_commit=lambda blob_id: store.add_blob_ref(session_id, blob_id)
+                    )
+                saved_files.append((blob_id, filename))
+                sizes[blob_id] = size
             except Exception as e:
-                print(f"File processing error: {e}")
+                print(f"File save error: {e}")
                 failed_files.append({"filename": file.filename, "error": str(e)})
         else:
             failed_files.append({"filename": file.filename, "error": "Invalid file type"})
     
+    if not saved_files:
+        return jsonify({
+            "error": "No files could be processed",
+            "status": "error",
+            "failed_files": failed_files
+        }), 400
+    
+    if Config.UPLOAD_ASYNC:
+        # Files are summarised in parallel but registered in upload order
+        job_id = upload_jobs.create(
+            session_id,
+            [filename for _, filename in saved_files] + [f["filename"] for f in failed_files],
+            on_done=on_upload_done,
+            commit=lambda index, prepared: register_notes(session_id, *saved_files[index], subject, *prepared)
+        )
+        for group in plan_notes_batches(saved_files, sizes):
+            if len(group) == 1:
+                upload_jobs.submit(job_id, group[0], prepare_saved_file, saved_files[group[0]][0], subject)
+            else:
+                upload_jobs.submit_batch(
+                    job_id, group, prepare_saved_batch, [saved_files[i] for i in group], subject)
+        for index, failed in enumerate(failed_files, start=len(saved_files)):
+            upload_jobs.fail(job_id, index, failed["error"])
+        
+        return jsonify({
+            "message": f"Processing {len(saved_files)} file(s)",
+            "status": "accepted",
+            "job_id": job_id,
+            "status_url": f"/upload/jobs/{job_id}",
+            "failed_files": failed_files,
+            "session_id": session_id
+        }), 202
+    
+    prepared = [None] * len(saved_files)
+    for group in plan_notes_batches(saved_files, sizes):
+        if len(group) == 1:
+            try:
+                results = [prepare_saved_file(saved_files[group[0]][0], subject)]
+            except Exception as e:
+                results = [e]
+        else:
+            results = prepare_saved_batch([saved_files[i] for i in group], subject)
+        for index, result in zip(group, results):
+            prepared[index] = result
+    
+    # Registered in upload order, whatever order the batches ran in
+    processed_files = []
+    for (blob_id, filename), result in zip(saved_files, prepared):
+        if not isinstance(result, Exception):
+            try:
+                result = register_notes(session_id, blob_id, filename, subject, *result)
+            except Exception as e:
+                result = e
+        if isinstance(result, Exception):
+            print(f"File processing error: {result}")
+            failed_files.append({"filename": filename, "error": str(result)})
+        else:
+            processed_files.append(result)
+    
     if processed_files:
+        if Config.STUDY_PREFETCH:
+            upload_jobs.defer(prefetch_study_materials, session_id)
         return jsonify({
             "message": f"Successfully processed {len(processed_files)} file(s)",
             "status": "success",
@@ -251,41 +785,51 @@ def upload_file():
             "failed_files": failed_files
         }), 400
 
-@app.route("/chat", methods=["POST"])
-@limiter.limit("30 per minute")
-def chat():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-            
-        user_message = data.get("message", "").strip()
-        session_id = data.get("session_id") or request.headers.get('X-Session-ID', str(uuid.uuid4()))
-        
-        print(f"Chat - Session ID: {session_id}, Message: {user_message[:50]}...")  # Debug logging
-        
-        # Initialize session if not exists
-        if session_id not in sessions:
-            sessions[session_id] = {
-                "id": session_id,
-                "created_at": datetime.now().isoformat(),
-                "message_history": [],
-                "files": [],
-                "preferences": {}
-            }
-        
-        if not user_message:
-            return jsonify({
-                "response": "Please enter a message to start our conversation! 😊",
-                "message_id": str(uuid.uuid4()),
-                "timestamp": datetime.now().isoformat(),
-                "session_id": session_id
-            })
-        
-        # Build enhanced context
-        context = build_enhanced_context(session_id, user_message)
-        
-        prompt = f"""
+@bp.route("/upload/jobs/<job_id>", methods=["GET"])
+@limiter.exempt     # polled every second while an upload is processed
+def upload_job_status(job_id):
+    """Report per-file progress of a background upload job"""
+    job = upload_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    if job["done"]:
+        processed = len(job["processed_files"])
+        if processed:
+            job["message"] = f"Successfully processed {processed} file(s)"
+        else:
+            job["error"] = "No files could be processed"
+    return jsonify(job)
+
+def get_or_create_session(session_id):
+    """Return the session dict, creating an empty one if needed.
+
+    A new session is tagged with the client's X-Owner-ID so /sessions can
+    list one owner's sessions.
+    """
+    return store.get_or_create_session(session_id, owner=request.headers.get('X-Owner-ID'))
+
+def build_chat_prompt(context, user_message, streaming=False):
+    """Assemble the chat prompt; streaming replies put the answer first"""
+    if streaming:
+        response_format = f"""Response format:
+Write your detailed response first, as plain Markdown (not JSON).
+Then, on its own line, write {STREAM_META_MARKER} followed by this JSON:
+{{
+    "follow_ups": ["Follow-up question 1?", "Follow-up question 2?", "Follow-up question 3?"],
+    "confidence": 0.95,
+    "topics": ["topic1", "topic2"]
+}}"""
+    else:
+        response_format = """Response format:
+{
+    "response": "Your detailed response here...",
+    "follow_ups": ["Follow-up question 1?", "Follow-up question 2?", "Follow-up question 3?"],
+    "confidence": 0.95,
+    "topics": ["topic1", "topic2"]
+}"""
+
+    return f"""
 You are EduBot, an advanced AI study assistant. You're helpful, encouraging, and educational.
 
 Session Context:
@@ -308,42 +852,67 @@ Instructions:
 6. Format lists and code properly
 7. Keep responses conversational but informative
 
-Response format:
-{{
-    "response": "Your detailed response here...",
-    "follow_ups": ["Follow-up question 1?", "Follow-up question 2?", "Follow-up question 3?"],
-    "confidence": 0.95,
-    "topics": ["topic1", "topic2"]
-}}
+{response_format}
 """
+
+def record_exchange(session_id, user_message, response_data):
+    """Append a user/assistant message pair to the session history"""
+    user_msg = {
+        "id": str(uuid.uuid4()),
+        "role": "user",
+        "content": user_message,
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    bot_msg = {
+        "id": str(uuid.uuid4()),
+        "role": "assistant",
+        "content": response_data["response"],
+        "timestamp": datetime.now().isoformat(),
+        "follow_ups": response_data.get("follow_ups", []),
+        "confidence": response_data.get("confidence", 0.9),
+        "topics": response_data.get("topics", [])
+    }
+    
+    # Update session history, keeping only the last 50 messages
+    store.append_messages(session_id, [user_msg, bot_msg], keep=50)
+    chat_contexts.add_messages(session_id, [user_msg, bot_msg])
+    
+    return bot_msg
+
+@bp.route("/chat", methods=["POST"])
+@limiter.limit("30 per minute")
+@admit("chat", chat_cost)
+def chat():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+            
+        user_message = data.get("message", "").strip()
+        session_id = data.get("session_id") or request.headers.get('X-Session-ID', str(uuid.uuid4()))
         
-        response = model.generate_content(prompt)
-        response_data = parse_enhanced_response(response.text)
+        print(f"Chat - Session ID: {session_id}, Message: {user_message[:50]}...")  # Debug logging
         
-        # Create message objects
-        user_msg = {
-            "id": str(uuid.uuid4()),
-            "role": "user",
-            "content": user_message,
-            "timestamp": datetime.now().isoformat()
-        }
+        # Initialize session if not exists
+        get_or_create_session(session_id)
         
-        bot_msg = {
-            "id": str(uuid.uuid4()),
-            "role": "assistant",
-            "content": response_data["response"],
-            "timestamp": datetime.now().isoformat(),
-            "follow_ups": response_data.get("follow_ups", []),
-            "confidence": response_data.get("confidence", 0.9),
-            "topics": response_data.get("topics", [])
-        }
+        if not user_message:
+            return jsonify({
+                "response": "Please enter a message to start our conversation! 😊",
+                "message_id": str(uuid.uuid4()),
+                "timestamp": datetime.now().isoformat(),
+                "session_id": session_id
+            })
+        
+        # Build enhanced context
+        context = build_enhanced_context(session_id, user_message)
+        prompt = build_chat_prompt(context, user_message)
         
-        # Update session history
-        sessions[session_id]["message_history"].extend([user_msg, bot_msg])
+        response_text = generate_text(prompt, route="chat")
+        response_data = parse_enhanced_response(response_text)
         
-        # Keep only last 50 messages to prevent memory issues
-        if len(sessions[session_id]["message_history"]) > 50:
-            sessions[session_id]["message_history"] = sessions[session_id]["message_history"][-50:]
+        bot_msg = record_exchange(session_id, user_message, response_data)
         
         return jsonify({
             "response": format_gemini_response(response_data["response"]),
@@ -363,37 +932,168 @@ Response format:
             "timestamp": datetime.now().isoformat()
         }), 500
 
+def sse_event(event, data):
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def split_stream_meta(text, meta_scanner=None):
+    """Split a finished streamed reply into (answer, metadata dict).
+
+    meta_scanner, if given, has already been fed the text after the marker
+    and is only asked for a truncated trailing value.
+    """
+    if STREAM_META_MARKER not in text:
+        # The model ignored the streaming format; parse it like a normal reply
+        response_data = parse_enhanced_response(text)
+        return response_data.get("response", text), response_data
+    answer, meta_text = text.split(STREAM_META_MARKER, 1)
+    if meta_scanner is None:
+        meta_scanner = JSONScanner()
+        candidates = meta_scanner.feed(meta_text)
+    else:
+        candidates = []
+    # Metadata that is not valid JSON leaves only the fallback follow-ups
+    meta = first_valid(candidates + meta_scanner.finish(), "chat_meta")
+    if meta is None:
+        metrics.parse_failures.inc(schema="chat_meta")
+    return answer.strip(), meta or {}
+
+@bp.route("/chat/stream", methods=["POST"])
+@limiter.limit("30 per minute")
+@admit("chat_stream", chat_cost)
+def chat_stream():
+    """Streaming variant of /chat using Server-Sent Events.
+
+    Emits ``token`` events while the model generates, then a single ``done``
+    event carrying the formatted HTML, follow-ups, confidence and topics.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    
+    user_message = data.get("message", "").strip()
+    session_id = data.get("session_id") or request.headers.get('X-Session-ID', str(uuid.uuid4()))
+    
+    print(f"Chat stream - Session ID: {session_id}, Message: {user_message[:50]}...")  # Debug logging
+    
+    get_or_create_session(session_id)
+    
+    if not user_message:
+        return jsonify({
+            "response": "Please enter a message to start our conversation! 😊",
+            "message_id": str(uuid.uuid4()),
+            "timestamp": datetime.now().isoformat(),
+            "session_id": session_id
+        })
+    
+    context = build_enhanced_context(session_id, user_message)
+    prompt = build_chat_prompt(context, user_message, streaming=True)
+    
+    def generate_events():
+        parts = []
+        sent = 0
+        holdback = len(STREAM_META_MARKER) - 1
+        meta_scanner = None
+        meta = None
+        chunks = stream_text(prompt, route="chat")
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                if meta_scanner is not None:
+                    meta = first_valid(meta_scanner.feed(chunk), "chat_meta")
+                    if meta is not None:
+                        # Metadata complete; don't wait for trailing output
+                        break
+                    continue
+                text = ''.join(parts)
+                marker_at = text.find(STREAM_META_MARKER)
+                if marker_at != -1:
+                    meta_scanner = JSONScanner()
+                    meta = first_valid(meta_scanner.feed(text[marker_at + len(STREAM_META_MARKER):]), "chat_meta")
+                    end = marker_at
+                else:
+                    # Hold back a possible partial marker at the end of the buffer
+                    end = max(sent, len(text) - holdback)
+                if end > sent:
+                    yield sse_event("token", {"text": text[sent:end]})
+                    sent = end
+                if meta is not None:
+                    break
+            chunks.close()
+            
+            if meta is not None:
+                answer = ''.join(parts).split(STREAM_META_MARKER, 1)[0].strip()
+            else:
+                answer, meta = split_stream_meta(''.join(parts), meta_scanner)
+            response_data = {
+                "response": answer,
+                "follow_ups": meta.get("follow_ups") or generate_fallback_followups(answer),
+                "confidence": meta.get("confidence", 0.9),
+                "topics": meta.get("topics", [])
+            }
+            bot_msg = record_exchange(session_id, user_message, response_data)
+            
+            yield sse_event("done", {
+                "response": format_gemini_response(answer),
+                "follow_ups": response_data["follow_ups"],
+                "confidence": response_data["confidence"],
+                "topics": response_data["topics"],
+                "message_id": bot_msg["id"],
+                "timestamp": bot_msg["timestamp"],
+                "session_id": session_id
+            })
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield sse_event("error", {
+                "response": "I apologize, but I encountered an issue processing your request. Please try again! 🤖",
+                "error": True,
+                "message_id": str(uuid.uuid4()),
+                "timestamp": datetime.now().isoformat()
+            })
+    
+    return Response(generate_events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 def build_enhanced_context(session_id, current_message):
     """Build comprehensive context for better responses"""
-    session = sessions.get(session_id, {})
-    
-    # Recent conversation history (last 10 messages)
-    recent_history = ""
-    history = session.get("message_history", [])[-10:]
-    for msg in history:
-        role = "You" if msg["role"] == "user" else "EduBot"
-        recent_history += f"{role}: {msg['content'][:200]}...\n"
-    
-    # Session summary
-    session_summary = f"""
-Session started: {session.get('created_at', 'Unknown')}
-Messages exchanged: {len(session.get('message_history', []))}
-Files uploaded: {len(session.get('files', []))}
-"""
+    with metrics.timed("context", "chat"):
+        return _build_enhanced_context(session_id, current_message)
+
+def _build_enhanced_context(session_id, current_message):
+    session = store.get_session(session_id) or {}
+    
+    # Session summary and recent turns within the history token budget;
+    # older turns are folded into a rolling summary
+    session_summary, recent_history = chat_contexts.render(session_id, session)
     
-    # Notes summary from uploaded files
+    # Passages from uploaded files that best match the question
     notes_summary = ""
     session_files = session.get("files", [])
-    for file_key in session_files:
-        if file_key in processed_notes:
-            note = processed_notes[file_key]
+    # Files may have been uploaded through another worker process, or the
+    # session's index evicted; either way it is rebuilt from the same text
+    session_indexes.sync(session_id, session_files, document_text)
+    passages = session_indexes.top_chunks(
+        session_id, current_message, Config.CHAT_CONTEXT_TOKENS, Config.CHAT_CONTEXT_TOP_K
+    )
+    for file_key, text in passages:
+        note = store.get_note(file_key)
+        if note:
             notes_summary += f"""
-File: {note['filename']} ({note['subject']})
-Summary: {note.get('structured_notes', {}).get('summary', 'No summary available')[:300]}...
-Key Points: {', '.join(note.get('structured_notes', {}).get('key_points', [])[:3])}
+From {note['filename']} ({note['subject']}):
+{text}
 ---
 """
     
+    # Nothing matched; just list what is available so the model can refer to it
+    if not notes_summary:
+        for file_key in session_files:
+            note = store.get_note(file_key)
+            if note:
+                title = note.get('structured_notes', {}).get('title', '')
+                notes_summary += f"File: {note['filename']} ({note['subject']}) {title}\n"
+    
     return {
         "session_summary": session_summary,
         "recent_history": recent_history or "No previous conversation",
@@ -402,32 +1102,18 @@ Key Points: {', '.join(note.get('structured_notes', {}).get('key_points', [])[:3
 
 def parse_enhanced_response(text):
     """Parse Gemini response with better error handling"""
-    try:
-        # Try to extract JSON from markdown code blocks
-        json_match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group(1))
-        
-        # Try to extract JSON from the text
-        json_match = re.search(r'\{.*\}', text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        
-        # Fallback: create structured response from plain text
-        return {
-            "response": text,
-            "follow_ups": generate_fallback_followups(text),
-            "confidence": 0.8,
-            "topics": []
-        }
-    except Exception as e:
-        print(f"Response parsing error: {e}")
-        return {
-            "response": text,
-            "follow_ups": ["Can you tell me more about this topic?", "What would you like to explore next?"],
-            "confidence": 0.7,
-            "topics": []
-        }
+    response_data = extract_json(text, "chat")
+    if response_data is not None:
+        return response_data
+    
+    # Fallback: create structured response from plain text
+    print("Response parsing error: no valid JSON in model reply")
+    return {
+        "response": text,
+        "follow_ups": generate_fallback_followups(text),
+        "confidence": 0.8,
+        "topics": []
+    }
 
 def generate_fallback_followups(text):
     """Generate follow-up questions when JSON parsing fails"""
@@ -438,63 +1124,35 @@ def generate_fallback_followups(text):
     ]
     return fallbacks
 
-@app.route("/generate_quiz", methods=["POST"])
-@limiter.limit("10 per hour")
-def generate_quiz():
-    try:
-        session_id = request.headers.get('X-Session-ID')
-        data = request.get_json() or {}
-        topic = data.get('topic', '')
-        difficulty = data.get('difficulty', 'intermediate')
-        num_questions = min(data.get('num_questions', 5), 10)
-        
-        print(f"Quiz generation - Session ID: {session_id}")
-        print(f"Available sessions: {list(sessions.keys())}")
-        print(f"Available processed notes: {list(processed_notes.keys())}")
-        
-        if not session_id or session_id not in sessions:
-            return jsonify({"error": "Invalid session. Please refresh and try again."}), 400
-        
-        # Get relevant notes for this session
-        session_files = sessions[session_id].get("files", [])
-        relevant_notes = []
-        
-        for file_key in session_files:
-            if file_key in processed_notes:
-                note = processed_notes[file_key]
-                if not topic or topic.lower() in note["subject"].lower():
-                    relevant_notes.append(note)
-        
-        # If no notes found in session files, search by session_id in processed_notes
-        if not relevant_notes:
-            print("No notes found in session files, searching by session_id...")
-            for file_key, note in processed_notes.items():
-                if note.get("session_id") == session_id:
-                    if not topic or topic.lower() in note["subject"].lower():
-                        relevant_notes.append(note)
-                        print(f"Found note by session_id: {file_key}")
-        
-        if not relevant_notes:
-            return jsonify({
-                "error": "No study materials found. Please upload some files first!",
-                "debug": {
-                    "session_id": session_id,
-                    "session_files": session_files,
-                    "available_notes": list(processed_notes.keys())
-                }
-            }), 400
-        
-        # Create comprehensive context for quiz generation
-        context = ""
-        for note in relevant_notes:
-            context += f"Subject: {note['subject']}\n"
-            context += f"Content: {note['content'][:2000]}...\n"
-            if 'structured_notes' in note:
-                sn = note['structured_notes']
-                context += f"Key Points: {', '.join(sn.get('key_points', []))}\n"
-                context += f"Concepts: {', '.join(sn.get('important_concepts', []))}\n\n"
-        
-        prompt = f"""Generate a {difficulty} level quiz with {num_questions} questions based on this study material:
+def note_hash(note):
+    """Hash of the note fields that go into quiz and flashcard prompts"""
+    return note.get("content_hash") or content_key(note["content"], note["subject"])
+
+def build_quiz(notes, topic, difficulty, num_questions):
+    """Quiz for a set of notes, reused from the study cache when the same
+    notes and parameters were asked for before.
+
+    Returns (quiz_data, cached); raises ValueError if the model reply holds
+    no valid quiz.
+    """
+    cache_key = study_key(
+        "quiz", [note_hash(note) for note in notes], topic, difficulty, num_questions, STUDY_PROMPT_VERSION
+    )
+    cached = study_cache.get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached), True
+    
+    # Create comprehensive context for quiz generation
+    context = ""
+    for note in notes:
+        context += f"Subject: {note['subject']}\n"
+        context += f"Content: {note['content'][:2000]}...\n"
+        if 'structured_notes' in note:
+            sn = note['structured_notes']
+            context += f"Key Points: {', '.join(sn.get('key_points', []))}\n"
+            context += f"Concepts: {', '.join(sn.get('important_concepts', []))}\n\n"
+    
+    prompt = f"""Generate a {difficulty} level quiz with {num_questions} questions based on this study material:
 
 {context}
 
@@ -525,42 +1183,145 @@ Format as JSON:
         }}
     ]
 }}"""
+    
+    response_text = generate_text(prompt, route="quiz")
+    
+    quiz_data = extract_json(response_text, "quiz")
+    if quiz_data is None:
+        raise ValueError("Invalid quiz format")
+    
+    quiz_data["generated_at"] = datetime.now().isoformat()
+    study_cache.put(cache_key, quiz_data)
+    return copy.deepcopy(quiz_data), False
+
+def build_flashcards(notes, topic, num_cards):
+    """Flashcard deck for a set of notes, reused from the study cache when
+    the same notes and parameters were asked for before.
+
+    Returns (flashcards, cached); raises ValueError if the model reply holds
+    no valid deck.
+    """
+    cache_key = study_key(
+        "flashcards", [note_hash(note) for note in notes], topic, "", num_cards, STUDY_PROMPT_VERSION
+    )
+    cached = study_cache.get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached), True
+    
+    # Build context
+    context = ""
+    for note in notes:
+        context += f"Subject: {note['subject']}\n"
+        context += f"Content: {note['content'][:3000]}...\n\n"
+    
+    prompt = f"""Create {num_cards} educational flashcards based on this material:
+
+{context}
+
+Topic focus: {topic or 'All available topics'}
+
+Requirements:
+1. Create {num_cards} flashcards
+2. Include term, definition, example, and study hint
+3. Cover key concepts, vocabulary, and important facts
+4. Make them useful for active recall
+5. Vary difficulty levels
+
+Format as JSON array:
+[
+    {{
+        "id": 1,
+        "term": "Key term or concept",
+        "definition": "Clear, concise definition",
+        "example": "Practical example or application",
+        "hint": "Memory aid or study tip",
+        "category": "Subject category",
+        "difficulty": "easy"
+    }}
+]"""
+    
+    response_text = generate_text(prompt, route="flashcards")
+    
+    # A non-empty array of card objects (possibly wrapped in an object)
+    flashcards = extract_json(response_text, "flashcards")
+    if flashcards is None:
+        raise ValueError("Could not parse flashcards")
+    
+    # Add metadata to each card
+    for i, card in enumerate(flashcards):
+        card["generated_at"] = datetime.now().isoformat()
+        if "id" not in card:
+            card["id"] = i + 1
+        # Ensure all optional fields exist (term and definition are required)
+        for field, default in [
+            ("example", "Example not provided"),
+            ("hint", "Study this concept carefully"),
+            ("category", "General"),
+            ("difficulty", "medium")
+        ]:
+            if field not in card:
+                card[field] = default
+    
+    study_cache.put(cache_key, flashcards)
+    return copy.deepcopy(flashcards), False
+
+def prefetch_study_materials(session_id):
+    """Generate the default quiz and flashcard deck for a session so opening
+    either tab is served from the study cache"""
+    notes = store.session_notes(session_id)
+    if not notes:
+        return
+    for name, build, params in (
+        ("quiz", build_quiz, DEFAULT_QUIZ),
+        ("flashcards", build_flashcards, DEFAULT_FLASHCARDS)
+    ):
+        try:
+            _, cached = build(notes, **params)
+            if not cached:
+                print(f"Prefetched {name} for session: {session_id}")
+        except Exception as e:
+            print(f"Prefetch {name} error for session {session_id}: {e}")
+
+def served_from_cache(response):
+    """Cached quiz/flashcard responses do not count against the rate limit"""
+    return response.headers.get("X-Cache") != "HIT"
+
+@bp.route("/generate_quiz", methods=["POST"])
+@limiter.limit("10 per hour", deduct_when=served_from_cache)
+@admit("quiz", lambda: MODEL_CALL_TOKENS["quiz"])
+def generate_quiz():
+    try:
+        session_id = request.headers.get('X-Session-ID')
+        data = request.get_json() or {}
+        topic = data.get('topic', DEFAULT_QUIZ["topic"])
+        difficulty = data.get('difficulty', DEFAULT_QUIZ["difficulty"])
+        num_questions = min(data.get('num_questions', DEFAULT_QUIZ["num_questions"]), 10)
         
-        response = model.generate_content(prompt)
-        
-        # Enhanced JSON parsing with multiple methods
-        quiz_data = None
-        
-        # Method 1: Extract from code blocks
-        json_match = re.search(r'```json\n(.*?)\n```', response.text, re.DOTALL)
-        if json_match:
-            try:
-                quiz_data = json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                pass
+        print(f"Quiz generation - Session ID: {session_id}")
         
-        # Method 2: Extract JSON object from text
-        if not quiz_data:
-            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-            if json_match:
-                try:
-                    quiz_data = json.loads(json_match.group())
-                except json.JSONDecodeError:
-                    pass
+        session = store.get_session(session_id) if session_id else None
+        if not session:
+            return jsonify({"error": "Invalid session. Please refresh and try again."}), 400
         
-        # Method 3: Use existing parser
-        if not quiz_data:
-            quiz_data = parse_enhanced_response(response.text)
+        # Get relevant notes for this session (by subject when a topic is given)
+        relevant_notes = store.session_notes(session_id, topic)
+        if not relevant_notes:
+            return jsonify({
+                "error": "No study materials found. Please upload some files first!",
+                "debug": {
+                    "session_id": session_id,
+                    "session_files": session.get("files", [])
+                }
+            }), 400
         
-        # Ensure proper structure
-        if not quiz_data or "questions" not in quiz_data:
-            raise ValueError("Invalid quiz format")
+        quiz_data, cached = build_quiz(relevant_notes, topic, difficulty, num_questions)
         
         # Add metadata
-        quiz_data["generated_at"] = datetime.now().isoformat()
         quiz_data["session_id"] = session_id
         
-        return jsonify(quiz_data)
+        response = jsonify(quiz_data)
+        response.headers["X-Cache"] = "HIT" if cached else "MISS"
+        return response
         
     except Exception as e:
         print(f"Quiz generation error: {e}")
@@ -569,136 +1330,45 @@ Format as JSON:
             "details": str(e)
         }), 500
 
-@app.route("/generate_flashcards", methods=["POST"])
-@limiter.limit("10 per hour")
+@bp.route("/generate_flashcards", methods=["POST"])
+@limiter.limit("10 per hour", deduct_when=served_from_cache)
+@admit("flashcards", lambda: MODEL_CALL_TOKENS["flashcards"])
 def generate_flashcards():
     try:
         session_id = request.headers.get('X-Session-ID')
         data = request.get_json() or {}
-        topic = data.get("topic", "")
-        num_cards = min(data.get("num_cards", 10), 20)
+        topic = data.get("topic", DEFAULT_FLASHCARDS["topic"])
+        num_cards = min(data.get("num_cards", DEFAULT_FLASHCARDS["num_cards"]), 20)
         
         print(f"Flashcard generation - Session ID: {session_id}")
-        print(f"Available sessions: {list(sessions.keys())}")
-        print(f"Available processed notes: {list(processed_notes.keys())}")
         
-        if not session_id or session_id not in sessions:
+        session = store.get_session(session_id) if session_id else None
+        if not session:
             return jsonify({"error": "Invalid session"}), 400
         
-        # Get relevant notes
-        session_files = sessions[session_id].get("files", [])
-        relevant_notes = []
-        
-        for file_key in session_files:
-            if file_key in processed_notes:
-                note = processed_notes[file_key]
-                if not topic or topic.lower() in note["subject"].lower():
-                    relevant_notes.append(note)
-        
-        # If no notes found in session files, search by session_id in processed_notes
-        if not relevant_notes:
-            print("No notes found in session files, searching by session_id...")
-            for file_key, note in processed_notes.items():
-                if note.get("session_id") == session_id:
-                    if not topic or topic.lower() in note["subject"].lower():
-                        relevant_notes.append(note)
-                        print(f"Found note by session_id: {file_key}")
-        
+        # Get relevant notes (by subject when a topic is given)
+        relevant_notes = store.session_notes(session_id, topic)
         if not relevant_notes:
             return jsonify({
                 "error": "No study materials found for flashcard generation",
                 "debug": {
                     "session_id": session_id,
-                    "session_files": session_files,
-                    "available_notes": list(processed_notes.keys())
+                    "session_files": session.get("files", [])
                 }
             }), 400
         
-        # Build context
-        context = ""
-        for note in relevant_notes:
-            context += f"Subject: {note['subject']}\n"
-            context += f"Content: {note['content'][:3000]}...\n\n"
-        
-        prompt = f"""Create {num_cards} educational flashcards based on this material:
-
-{context}
-
-Topic focus: {topic or 'All available topics'}
-
-Requirements:
-1. Create {num_cards} flashcards
-2. Include term, definition, example, and study hint
-3. Cover key concepts, vocabulary, and important facts
-4. Make them useful for active recall
-5. Vary difficulty levels
-
-Format as JSON array:
-[
-    {{
-        "id": 1,
-        "term": "Key term or concept",
-        "definition": "Clear, concise definition",
-        "example": "Practical example or application",
-        "hint": "Memory aid or study tip",
-        "category": "Subject category",
-        "difficulty": "easy"
-    }}
-]"""
-        
-        response = model.generate_content(prompt)
-        
-        # Enhanced JSON parsing for arrays
-        flashcards = None
-        
-        # Method 1: Extract from code blocks
-        json_match = re.search(r'```json\n(\[.*?\])\n```', response.text, re.DOTALL)
-        if json_match:
-            try:
-                flashcards = json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                pass
-        
-        # Method 2: Extract JSON array from text
-        if not flashcards:
-            json_match = re.search(r'\[.*?\]', response.text, re.DOTALL)
-            if json_match:
-                try:
-                    flashcards = json.loads(json_match.group())
-                except json.JSONDecodeError:
-                    pass
-        
-        if not flashcards:
-            raise ValueError("Could not parse flashcards")
-        
-        # Validate and fix flashcard structure
-        if not isinstance(flashcards, list):
-            raise ValueError("Flashcards must be an array")
-        
-        # Add metadata to each card
-        for i, card in enumerate(flashcards):
-            card["generated_at"] = datetime.now().isoformat()
+        flashcards, cached = build_flashcards(relevant_notes, topic, num_cards)
+        for card in flashcards:
             card["session_id"] = session_id
-            if "id" not in card:
-                card["id"] = i + 1
-            # Ensure all required fields exist
-            for field, default in [
-                ("term", f"Term {i + 1}"),
-                ("definition", "Definition not provided"),
-                ("example", "Example not provided"),
-                ("hint", "Study this concept carefully"),
-                ("category", "General"),
-                ("difficulty", "medium")
-            ]:
-                if field not in card:
-                    card[field] = default
         
-        return jsonify({
+        response = jsonify({
             "flashcards": flashcards,
             "total_cards": len(flashcards),
             "topic": topic or "Mixed Topics",
             "generated_at": datetime.now().isoformat()
         })
+        response.headers["X-Cache"] = "HIT" if cached else "MISS"
+        return response
         
     except Exception as e:
         print(f"Flashcard generation error: {e}")
@@ -707,54 +1377,70 @@ Format as JSON array:
             "details": str(e)
         }), 500
 
-@app.route("/sessions", methods=["GET"])
+@bp.route("/sessions", methods=["GET"])
 def list_sessions():
-    """Get all sessions with enhanced metadata"""
-    session_list = []
-    
-    for sid, session in sessions.items():
-        messages = session.get("message_history", [])
-        files = session.get("files", [])
-        
-        last_activity = session.get("created_at")                                                   
-        if messages:
-            last_activity = messages[-1].get("timestamp", last_activity)
-        
-        preview = "New session"
-        for msg in reversed(messages):
-            if msg.get("role") == "user":
-                preview = msg.get("content", "")[:50] + "..." if len(msg.get("content", "")) > 50 else msg.get("content", "")
-                break
-        
-        session_list.append({
-            "id": sid,
-            "created_at": session["created_at"],
-            "last_activity": last_activity,
-            "message_count": len(messages),
-            "file_count": len(files),
-            "preview": preview,
-            "has_files": len(files) > 0
-        })
+    """List sessions with metadata, most recently active first, one page at a time.
+
+    ``owner`` (default: the X-Owner-ID header) limits the list to one
+    owner's sessions; ``limit`` sets the page size and ``cursor`` (the
+    ``next_cursor`` of the previous page) continues after it.
+    """
+    owner = request.args.get("owner") or request.headers.get("X-Owner-ID")
+    try:
+        limit = int(request.args.get("limit", Config.SESSIONS_PAGE_SIZE))
+        limit = max(1, min(limit, Config.SESSIONS_PAGE_MAX))
+        cursor = request.args.get("cursor")
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    session_list.sort(key=lambda x: x["last_activity"], reverse=True)
+    session_list, next_key = store.session_page(owner, limit, before)
     
-    return jsonify({
+    response = jsonify({
         "sessions": session_list,
-        "total_sessions": len(session_list)
+        "total_sessions": store.count_owner_sessions(owner) if owner else store.count_sessions(),
+        "next_cursor": encode_cursor(next_key) if next_key else None
     })
+    # A page mixes many sessions, so its validator is a hash of the body
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def set_validators(response, etag, modified_at):
+    """Weak ETag and Last-Modified, revalidated by the client on every use"""
+    response.set_etag(etag, weak=True)
+    response.last_modified = datetime.fromtimestamp(modified_at, timezone.utc)
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
 
-@app.route("/session/<session_id>", methods=["GET"])
+@bp.route("/session/<session_id>", methods=["GET"])
 def get_session(session_id):
-    """Get detailed session information"""
-    if session_id not in sessions:
+    """Get detailed session information.
+
+    Responses carry an ETag and Last-Modified from the session's version
+    (store.session_version); a matching If-None-Match or If-Modified-Since
+    gets a 304 without loading the session or its notes.
+    """
+    # Read the version first: the body loaded below is at least that new
+    version = store.session_version(session_id)
+    if version is None:
+        return jsonify({"error": "Session not found"}), 404
+    etag = f"v{version[0]}.{int(version[1] * 1000)}"
+    if not is_resource_modified(
+            request.environ, etag=etag, last_modified=datetime.fromtimestamp(version[1], timezone.utc)):
+        return set_validators(Response(status=304), etag, version[1])
+
+    session = store.get_session(session_id)
+    if not session:
         return jsonify({"error": "Session not found"}), 404
-    
-    session = sessions[session_id]
     
     session_files = []
     for file_key in session.get("files", []):
-        if file_key in processed_notes:
-            note = processed_notes[file_key]
+        note = store.get_note(file_key)
+        if note:
             session_files.append({
                 "id": file_key,
                 "filename": note["filename"],
@@ -764,39 +1450,124 @@ def get_session(session_id):
                 "summary": note.get("structured_notes", {}).get("summary", "")[:200] + "..."
             })
     
-    return jsonify({
+    return set_validators(jsonify({
         "session": {
             **session,
             "files_detail": session_files
         }
-    })
+    }), etag, version[1])
 
-@app.route("/session/<session_id>", methods=["DELETE"])
+@bp.route("/session/<session_id>", methods=["DELETE"])
 def delete_session(session_id):
     """Delete a session and its associated data"""
-    if session_id not in sessions:
+    if not store.delete_session(session_id):
         return jsonify({"error": "Session not found"}), 404
     
-    session_files = sessions[session_id].get("files", [])
-    for file_key in session_files:
-        if file_key in processed_notes:
-            del processed_notes[file_key]
-    
-    del sessions[session_id]
+    chat_contexts.drop(session_id)
+    session_indexes.drop(session_id)
+    release_session_uploads(session_id)
     
     return jsonify({"message": "Session deleted successfully"})
 
-@app.route("/health", methods=["GET"])
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@bp.after_app_request
+def observe_request_time(response):
+    started = g.get("request_started")
+    if started is not None:
+        metrics.http_request_seconds.observe(
+            time.perf_counter() - started,
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=str(response.status_code)
+        )
+    return response
+
+@bp.after_app_request
+def compress_json(response):
+    # Registered after observe_request_time, so it runs first and its
+    # time is part of the request's measured latency
+    return compress_response(
+        response, request.accept_encodings, Config.COMPRESS_MIN_BYTES,
+        Config.COMPRESS_GZIP_LEVEL, Config.COMPRESS_BROTLI_QUALITY)
+
+@bp.route("/metrics", methods=["GET"])
+@limiter.exempt
+def metrics_endpoint():
+    """Prometheus text-format metrics for this worker process"""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/health", methods=["GET"])
+@limiter.exempt
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "active_sessions": len(sessions),
-        "processed_files": len(processed_notes)
+        "active_sessions": store.count_sessions(),
+        "processed_files": store.count_notes(),
+        "store": store.stats(),
+        "notes_cache": notes_cache.stats(),
+        "study_cache": study_cache.stats(),
+        "uploads": upload_store.stats(),
+        "upload_jobs": upload_jobs.stats(),
+        "retrieval_index": session_indexes.stats(),
+        "model_dispatch": dispatcher.stats(),
+        "chat_contexts": chat_contexts.stats(),
+        "admission": budget.stats() if budget else None,
+        "startup": startup
     })
 
 
+class RecordJSONProvider(DefaultJSONProvider):
+    """Serializes store records (messages, notes) exactly like the dicts they hold"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+
+def create_app():
+    """Build the Flask app.
+
+    Only Flask itself and the routes are set up here; the model client and
+    the PDF library are loaded on first use. Under gunicorn with
+    preload_app, the app is built once in the master and forked workers
+    share it copy-on-write (see gunicorn.conf.py).
+
+    The app is configured from the environment: Config is read when this
+    module is imported, and the store, caches, job pool and budgets above
+    are built from it then, so set the environment before importing.
+    """
+    # Static files are served by static_files() (fingerprinted assets, caching headers)
+    flask_app = Flask(__name__, static_folder=None)
+    flask_app.json = RecordJSONProvider(flask_app)
+    flask_app.config.from_object(Config)
+    flask_app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    # Enable CORS for modern frontend
+    CORS(flask_app)
+    limiter.init_app(flask_app)
+    flask_app.register_blueprint(bp)
+
+    if startup["import_seconds"] is None:
+        startup["import_seconds"] = round(time.perf_counter() - _import_started, 4)
+        print(f"EduBot app ready in {startup['import_seconds'] * 1000:.0f} ms (pid {startup['pid']})")
+    return flask_app
+
+
+def record_worker_start(seconds, preloaded):
+    """Called by the gunicorn post_worker_init hook with the time from fork
+    (or worker start) until the worker could serve requests"""
+    startup.update(pid=os.getpid(), worker_ready_seconds=round(seconds, 4), preloaded=preloaded)
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
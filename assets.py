@@ -0,0 +1,90 @@
+"""Build step for static assets: fingerprinted, precompressed copies.
+
+    python assets.py
+
+copies every file in static/ to static/dist/ as name.<content hash>.ext,
+with .gz (and .br when the brotli package is installed) versions next to
+it, and writes static/dist/manifest.json mapping original names to the
+fingerprinted ones. The content behind a fingerprinted name never
+changes, so the app serves those with a year-long immutable
+Cache-Control and picks the precompressed variant instead of
+compressing on every request. Run it on each deploy (the procfile does);
+without a build the app links and serves the plain files.
+"""
+import hashlib
+import json
+import os
+
+from compression import ENCODINGS, SUFFIXES, compress
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST = "dist"
+MANIFEST = "manifest.json"
+
+# Text assets worth precompressing (images and fonts are compressed already)
+COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json", ".txt", ".map"}
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build(static_dir=STATIC_DIR):
+    """Write static_dir/dist/ and its manifest; returns the manifest.
+
+    Outputs that already exist are left alone (same name, same content) and
+    outputs of files that changed or were removed are deleted.
+    """
+    dist = os.path.join(static_dir, DIST)
+    manifest = {}
+    outputs = {MANIFEST}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(name)
+            target = manifest[name] = f"{stem}.{fingerprint(data)}{ext}"
+            variants = {target: None}
+            if ext in COMPRESSIBLE:
+                variants.update({target + SUFFIXES[encoding]: encoding for encoding in ENCODINGS})
+            for variant, encoding in variants.items():
+                outputs.add(variant)
+                out = os.path.join(dist, variant)
+                if not os.path.exists(out):
+                    # Build time, so spend the CPU on the smallest output
+                    _write(out, compress(data, encoding, gzip_level=9, brotli_quality=11) if encoding else data)
+
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    for root, _, files in os.walk(dist):
+        for filename in files:
+            path = os.path.join(root, filename)
+            if os.path.relpath(path, dist).replace(os.sep, "/") not in outputs:
+                os.remove(path)
+    return manifest
+
+
+def load_manifest(static_dir=STATIC_DIR):
+    """Original name -> fingerprinted name; empty when assets were not built"""
+    try:
+        with open(os.path.join(static_dir, DIST, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+if __name__ == "__main__":
+    built = build()
+    for original, fingerprinted in sorted(built.items()):
+        print(f"{original} -> {DIST}/{fingerprinted}")
+    print(f"Built {len(built)} assets ({', '.join(ENCODINGS)} precompressed)")
@@ -0,0 +1,91 @@
+"""Micro-benchmark: chat reply formatting (Markdown -> HTML).
+
+Compares the single-pass renderer used by format_gemini_response with the
+previous multi-pass regex implementation on long, list-heavy replies.
+
+    python benchmarks/bench_format.py [--repeat N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown_render import render_markdown  # noqa: E402
+
+
+def legacy_format(text):
+    """The multi-pass formatter that render_markdown replaced"""
+    text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', text)
+    text = re.sub(r'\*(.*?)\*', r'<em>\1</em>', text)
+    text = re.sub(r'^### (.*?)$', r'<h3>\1</h3>', text, flags=re.MULTILINE)
+    text = re.sub(r'^## (.*?)$', r'<h2>\1</h2>', text, flags=re.MULTILINE)
+    text = re.sub(r'^# (.*?)$', r'<h1>\1</h1>', text, flags=re.MULTILINE)
+    text = re.sub(r'```(.*?)```', r'<code>\1</code>', text, flags=re.DOTALL)
+    text = re.sub(r'`(.*?)`', r'<code>\1</code>', text)
+
+    lines = text.split('\n')
+    formatted_lines, in_list = [], False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith(('- ', '* ', '• ')):
+            if not in_list:
+                formatted_lines.append('<ul class="message-list">')
+                in_list = True
+            formatted_lines.append(f'<li>{stripped[2:]}</li>')
+        elif stripped.startswith(tuple(f'{i}. ' for i in range(1, 10))):
+            if not in_list:
+                formatted_lines.append('<ol class="message-list">')
+                in_list = True
+            formatted_lines.append(f'<li>{stripped[3:]}</li>')
+        else:
+            if in_list:
+                formatted_lines.append('</ul>' if '- ' in text or '* ' in text else '</ol>')
+                in_list = False
+            if stripped:
+                formatted_lines.append(f'<p>{line}</p>')
+            else:
+                formatted_lines.append('<br>')
+    if in_list:
+        formatted_lines.append('</ul>')
+    return '\n'.join(formatted_lines)
+
+
+def sample_reply(sections):
+    """A long tutoring-style reply with headings, lists, emphasis and code"""
+    parts = []
+    for s in range(sections):
+        parts.append(f"## Part {s + 1}: **Key idea** number {s}")
+        parts.append(f"This section explains *why* the `step_{s}` matters for the exam.")
+        parts.append("")
+        for i in range(1, 8):
+            parts.append(f"{i}. Point {i} with **bold** and *italic* text about topic {s}")
+        parts.append("")
+        for i in range(4):
+            parts.append(f"- Detail {i}: see `formula_{i}` and remember the **rule**")
+        parts.append("```")
+        parts.append(f"result = compute({s}) * 2")
+        parts.append("```")
+        parts.append("")
+    return "\n".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'sections':>8} {'chars':>8} {'legacy ms':>10} {'single-pass ms':>15} {'speedup':>8}")
+    for sections in (1, 5, 20, 80):
+        text = sample_reply(sections)
+        number = max(1, 400 // sections)
+        legacy = min(timeit.repeat(lambda: legacy_format(text), number=number, repeat=args.repeat)) / number
+        current = min(timeit.repeat(lambda: render_markdown(text), number=number, repeat=args.repeat)) / number
+        print(f"{sections:>8} {len(text):>8} {legacy * 1000:>10.3f} {current * 1000:>15.3f} "
+              f"{legacy / current:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Memory benchmark: chat messages and notes as plain dicts vs compact records.
+
+Fills the in-memory store with simulated sessions (chat history plus
+processed notes) and reports the Python heap they take (tracemalloc),
+with messages and notes held as plain dicts (the previous layout), as
+slotted records, and as records with zlib-compressed note content. Read
+costs (get_session, note content access) are timed as well.
+
+    python benchmarks/bench_memory.py [--sessions 2000] [--messages 20] [--notes 2]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from fixtures import chat_question, lecture_text, pick_subject
+from store import MemoryStore
+
+
+def sample_session(seed, messages, notes):
+    """(session_id, message dicts, note dicts) shaped like the app's records"""
+    session_id = f"session-{seed:06d}"
+    started = datetime(2026, 1, 1) + timedelta(minutes=seed)
+    history = []
+    for turn in range(messages // 2):
+        at = started + timedelta(seconds=turn * 30, microseconds=seed * 7 + turn)
+        history.append({
+            "id": str(uuid.uuid4()),
+            "role": "user",
+            "content": chat_question(seed, turn),
+            "timestamp": at.isoformat()
+        })
+        history.append({
+            "id": str(uuid.uuid4()),
+            "role": "assistant",
+            "content": lecture_text(seed + turn, paragraphs=2, sentences=4),
+            "timestamp": (at + timedelta(seconds=2)).isoformat(),
+            "follow_ups": [chat_question(seed, turn + 100 + i) for i in range(3)],
+            "confidence": 0.9,
+            "topics": [pick_subject(seed)]
+        })
+    subject = pick_subject(seed)
+    note_dicts = []
+    for i in range(notes):
+        content = lecture_text(seed * 10 + i, paragraphs=40)[:10000]
+        note_dicts.append({
+            "id": f"{session_id}_notes{i}_txt",
+            "filename": f"notes{i}.txt",
+            "subject": subject,
+            "content": content,
+            "content_hash": uuid.uuid4().hex,
+            "structured_notes": {
+                "title": f"{subject} notes",
+                "summary": content[:300],
+                "key_points": [content[j * 80:(j + 1) * 80] for j in range(6)],
+                "important_concepts": [f"{subject} concept {j}" for j in range(4)],
+                "study_tips": ["Summarise each section in your own words", "Use spaced repetition"],
+                "potential_questions": [chat_question(seed, 200 + j) for j in range(3)],
+                "difficulty_level": "Intermediate",
+                "estimated_study_time": "30 minutes"
+            },
+            "session_id": session_id,
+            "blob_id": uuid.uuid4().hex + ".txt",
+            "processed_at": (started + timedelta(seconds=i)).isoformat(),
+            "file_size": len(content),
+            "file_type": "TXT"
+        })
+    return session_id, history, note_dicts
+
+
+def fill_dicts(samples):
+    """The previous layout: sessions and notes as plain nested dicts"""
+    sessions, notes = {}, {}
+    for session_id, history, note_dicts in samples:
+        sessions[session_id] = {
+            "id": session_id, "created_at": history[0]["timestamp"], "message_history": history,
+            "files": [note["id"] for note in note_dicts], "preferences": {}
+        }
+        for note in note_dicts:
+            notes[note["id"]] = note
+    return sessions, notes
+
+
+def fill_store(samples, compress):
+    store = MemoryStore(max_bytes=1 << 40, max_sessions=10 ** 7, compress=compress)
+    for session_id, history, note_dicts in samples:
+        store.append_messages(session_id, history, keep=len(history))
+        for note in note_dicts:
+            store.put_note(note)
+            store.add_file(session_id, note["id"])
+    return store
+
+
+def heap_bytes(build, args):
+    """Heap still held after generating the sessions and passing them to build()"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    samples = (sample_session(seed, args.messages, args.notes) for seed in range(args.sessions))
+    result = build(samples)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20, help="messages per session")
+    parser.add_argument("--notes", type=int, default=2, help="notes per session")
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sessions, {args.messages} messages and {args.notes} notes each")
+    print(f"\n{'layout':<22} {'heap MB':>9} {'per session KB':>15} {'saving':>8}")
+    baseline = None
+    stores = {}
+    for name, build in (
+        ("dicts (previous)", fill_dicts),
+        ("records", lambda s: fill_store(s, compress=False)),
+        ("records + zlib", lambda s: fill_store(s, compress=True)),
+    ):
+        size, result = heap_bytes(build, args)
+        baseline = baseline or size
+        stores[name] = result
+        print(f"{name:<22} {size / 2 ** 20:>9.1f} {size / args.sessions / 1024:>15.2f} "
+              f"{(1 - size / baseline) * 100:>7.0f}%")
+
+    print(f"\n{'read (per call)':<38} {'records us':>11} {'records + zlib us':>18}")
+    session_ids = list(stores["records"]._sessions)[:200]
+    for label, read in (
+        ("get_session", lambda store, sid: store.get_session(sid)),
+        ("session_notes + content", lambda store, sid: [n["content"] for n in store.session_notes(sid)]),
+        ("session_notes + structured_notes", lambda store, sid: [n["structured_notes"] for n in store.session_notes(sid)]),
+    ):
+        timings = []
+        for name in ("records", "records + zlib"):
+            store = stores[name]
+            started = time.perf_counter()
+            for sid in session_ids:
+                read(store, sid)
+            timings.append((time.perf_counter() - started) / len(session_ids) * 1e6)
+        print(f"{label:<38} {timings[0]:>11.1f} {timings[1]:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Micro-benchmarks: reply formatting, PDF and slide extraction and chat context build.
+
+    python benchmarks/bench_micro.py [--repeat N] [--only format|pdf|pptx|context]
+                                     [--label NAME] [--compare results/OTHER.json]
+
+Times are the best of --repeat runs. Results are written to
+benchmarks/results/ as JSON like the load test's.
+"""
+import argparse
+import json
+import os
+import tempfile
+import timeit
+from datetime import datetime
+
+from bench_format import sample_reply
+from fixtures import ROOT, chat_question, lecture_text, load_app, make_pdf, make_pptx
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def best_ms(fn, repeat, number=None):
+    """Best per-call time of fn in milliseconds"""
+    if number is None:
+        # Aim for about 0.2s per repeat
+        single = timeit.timeit(fn, number=1)
+        number = max(1, int(0.2 / max(single, 1e-6)))
+    return round(min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1000, 4)
+
+
+def bench_format(app_module, repeat):
+    results = {}
+    for sections in (1, 5, 20, 80):
+        text = sample_reply(sections)
+        results[f"format_gemini_response/{len(text)}_chars"] = best_ms(
+            lambda: app_module.format_gemini_response(text), repeat
+        )
+    return results
+
+
+def bench_pdf(app_module, repeat):
+    from extractors import extract_text_from_pdf
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="edubot-pdf-")
+    for pages in (5, 50, 200):
+        path = os.path.join(workdir, f"lecture-{pages}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(pages, seed=pages))
+        for budget in (None, 15000):
+            name = f"extract_text_from_pdf/{pages}_pages/{'budget_' + str(budget) if budget else 'full'}"
+            results[name] = best_ms(lambda: extract_text_from_pdf(path, budget), repeat, number=1)
+    return results
+
+
+def bench_pptx(app_module, repeat):
+    from extractors import extract_file_content
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="edubot-pptx-")
+    for slides in (20, 200, 2000):
+        path = os.path.join(workdir, f"lecture-{slides}.pptx")
+        make_pptx(path, slides, seed=slides)
+        for budget in (0, 15000):
+            name = f"extract_file_content/{slides}_slides/{'budget_' + str(budget) if budget else 'full'}"
+            results[name] = best_ms(lambda: extract_file_content(path, budget), repeat, number=1)
+    return results
+
+
+def bench_context(app_module, repeat):
+    results = {}
+    for documents, turns in ((1, 0), (5, 20), (20, 100)):
+        session_id = f"context-{documents}-{turns}"
+        app_module.store.get_or_create_session(session_id)
+        for seed in range(documents):
+            file_key = f"{session_id}_doc{seed}"
+            content = lecture_text(seed, paragraphs=30)
+            app_module.store.put_note({
+                "id": file_key, "filename": f"doc{seed}.txt", "subject": "Bench", "content": content[:10000],
+                "structured_notes": {"title": f"Doc {seed}"}, "session_id": session_id
+            })
+            app_module.session_indexes.add_document(session_id, file_key, content)
+            app_module.store.add_file(session_id, file_key)
+        for turn in range(turns):
+            app_module.record_exchange(session_id, chat_question(turn, turn), {
+                "response": lecture_text(turn, paragraphs=1), "follow_ups": [], "confidence": 0.9, "topics": []
+            })
+        question = chat_question(documents, turns)
+        results[f"build_enhanced_context/{documents}_docs/{turns}_turns"] = best_ms(
+            lambda: app_module.build_enhanced_context(session_id, question), repeat
+        )
+    return results
+
+
+BENCHMARKS = {"format": bench_format, "pdf": bench_pdf, "pptx": bench_pptx, "context": bench_context}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", choices=sorted(BENCHMARKS))
+    parser.add_argument("--label", default=datetime.now().strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+    previous = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("results", {})
+
+    app_module = load_app()
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if args.only in (None, name):
+            results.update(bench(app_module, args.repeat))
+
+    print(f"\n{'benchmark':<58} {'ms':>10} {'change':>8}")
+    for name, ms in results.items():
+        old = previous.get(name)
+        change = f"{(ms - old) / old * 100:+.0f}%" if old else ""
+        print(f"{name:<58} {ms:>10.3f} {change:>8}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"micro-{args.label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"label": args.label, "timestamp": datetime.now().isoformat(), "results": results}, f, indent=2)
+    print(f"\nSaved {os.path.relpath(path, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Deterministic study-material fixtures and app setup shared by the benchmarks.
+
+Fixtures are generated rather than checked in: lecture-style text, JSON
+notes, multi-page PDFs (a minimal, dependency-free PDF writer) and slide
+decks (the few zipped XML parts a .pptx reader needs) whose
+wording depends on a seed, so each simulated student uploads different
+material unless a benchmark asks for duplicates.
+"""
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SUBJECTS = {
+    "Biology": ["photosynthesis", "cell respiration", "mitochondria", "enzymes", "osmosis",
+                "DNA replication", "natural selection", "homeostasis"],
+    "Physics": ["momentum", "kinetic energy", "electric fields", "wave interference",
+                "thermodynamics", "Newton's laws", "circular motion", "radioactive decay"],
+    "History": ["the industrial revolution", "the printing press", "trade routes",
+                "the cold war", "colonial empires", "the french revolution", "urbanisation"],
+    "Mathematics": ["derivatives", "integrals", "probability", "matrices", "limits",
+                    "vectors", "sequences and series", "complex numbers"],
+}
+
+TEMPLATES = [
+    "{Topic} is one of the central ideas in {subject} and appears in most exam papers.",
+    "To understand {topic}, start from the definition and work through a simple example.",
+    "A common mistake is to confuse {topic} with {other}; compare how each one is measured.",
+    "In the lecture we saw that {topic} depends on {other} under ideal conditions.",
+    "Practice questions on {topic} usually ask you to explain a process step by step.",
+    "Remember that {topic} can be summarised in a diagram linking cause and effect.",
+    "The textbook chapter on {topic} includes three worked problems worth revisiting.",
+    "Historically, the study of {topic} changed how scientists approached {other}.",
+]
+
+QUESTIONS = [
+    "What is {topic}?",
+    "Can you explain how {topic} relates to {other}?",
+    "Give me an example of {topic} for the exam",
+    "What are common mistakes with {topic}?",
+    "Summarise the key points about {topic}",
+]
+
+
+def pick_subject(seed):
+    names = sorted(SUBJECTS)
+    return names[seed % len(names)]
+
+
+def lecture_text(seed, paragraphs=12, sentences=6):
+    """Lecture notes on one subject; the same seed gives the same text"""
+    rng = random.Random(seed)
+    subject = pick_subject(seed)
+    topics = SUBJECTS[subject]
+    out = [f"{subject} lecture notes (set {seed})", ""]
+    for p in range(paragraphs):
+        topic = topics[p % len(topics)]
+        lines = []
+        for _ in range(sentences):
+            other = rng.choice([t for t in topics if t != topic])
+            lines.append(rng.choice(TEMPLATES).format(
+                Topic=topic[0].upper() + topic[1:], topic=topic, other=other, subject=subject
+            ))
+        out.append(" ".join(lines))
+        out.append("")
+    return "\n".join(out)
+
+
+def notes_json(seed, sections=8):
+    """A JSON export of revision notes"""
+    subject = pick_subject(seed)
+    topics = SUBJECTS[subject]
+    return json.dumps({
+        "subject": subject,
+        "sections": [
+            {"heading": topics[i % len(topics)], "body": lecture_text(seed + i, paragraphs=1)}
+            for i in range(sections)
+        ]
+    })
+
+
+def chat_question(seed, turn):
+    rng = random.Random(seed * 1000 + turn)
+    topics = SUBJECTS[pick_subject(seed)]
+    topic, other = rng.sample(topics, 2)
+    return rng.choice(QUESTIONS).format(topic=topic, other=other)
+
+
+def _pdf_string(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages, seed=0, lines_per_page=45):
+    """Bytes of a text PDF with `pages` pages of lecture notes"""
+    words = lecture_text(seed, paragraphs=max(4, pages // 2)).split()
+    streams = []
+    at = 0
+    for _ in range(pages):
+        lines = []
+        for _ in range(lines_per_page):
+            line = words[at % len(words):at % len(words) + 12]
+            at += 12
+            lines.append(f"({_pdf_string(' '.join(line))}) '")
+        streams.append("BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(lines) + " ET")
+
+    body = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    next_id = 4
+    for stream in streams:
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        kids.append(f"{page_id} 0 R")
+        body[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                         f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        body[content_id] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+    body[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id in sorted(body):
+        offsets[obj_id] = len(out)
+        out += f"{obj_id} 0 obj\n{body[obj_id]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {next_id}\n0000000000 65535 f \n".encode()
+    for obj_id in range(1, next_id):
+        out += f"{offsets[obj_id]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+PPTX_NS = ('xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+           'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+           'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"')
+
+
+def make_pptx(path, slides, seed=0, bullets=6):
+    """Write a .pptx of `slides` slides, each a title and bullet points"""
+    sentences = lecture_text(seed, paragraphs=max(4, slides // 4)).split(". ")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as pptx:
+        for number in range(1, slides + 1):
+            lines = [f"Slide {number}"] + [
+                sentences[(number * bullets + i) % len(sentences)] for i in range(bullets)]
+            paragraphs = "".join(f"<a:p><a:r><a:t>{escape(line)}</a:t></a:r></a:p>" for line in lines)
+            pptx.writestr(f"ppt/slides/slide{number}.xml", (
+                f"<p:sld {PPTX_NS}><p:cSld><p:spTree><p:sp><p:txBody>{paragraphs}"
+                "</p:txBody></p:sp></p:spTree></p:cSld></p:sld>"))
+        pptx.writestr("ppt/_rels/presentation.xml.rels", (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(f'<Relationship Id="rId{n}" Target="slides/slide{n}.xml"/>' for n in range(1, slides + 1))
+            + "</Relationships>"))
+        pptx.writestr("ppt/presentation.xml", (
+            f"<p:presentation {PPTX_NS}><p:sldIdLst>"
+            + "".join(f'<p:sldId id="{255 + n}" r:id="rId{n}"/>' for n in range(1, slides + 1))
+            + "</p:sldIdLst></p:presentation>"))
+
+
+def load_app(workdir=None, **env):
+    """Import the app against the fake model in a scratch directory.
+
+    Config is read at import time, so the environment is set first; values
+    already in the environment win, so a run can still be tuned from the
+    shell. Rate limits and token budgets are switched off: benchmarks
+    measure the work, not admission control.
+    """
+    defaults = {
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": "0",
+        "FAKE_LLM_JITTER": "0",
+        "UPLOAD_ASYNC": "false",
+        "ADMISSION_SESSION_TOKENS": "0",
+        "ADMISSION_IP_TOKENS": "0",
+    }
+    defaults.update({key: str(value) for key, value in env.items()})
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+    workdir = workdir or tempfile.mkdtemp(prefix="edubot-bench-")
+    os.chdir(workdir)
+    app_module = importlib.import_module("app")
+    app_module.limiter.enabled = False
+    return app_module
@@ -0,0 +1,230 @@
+"""Load test: every endpoint through the Flask test client against the fake model.
+
+Simulated students each get their own session and upload a PDF, lecture
+notes and a JSON export, then chat, stream a reply, generate a quiz and a
+flashcard deck and read their session (then revalidate it with its
+ETag, as a browser would) and the session list. Each phase
+runs at the given concurrency and reports throughput, p50/p95/p99 latency,
+errors and peak RSS. Results are written to benchmarks/results/ as JSON;
+--compare prints the change against an earlier run.
+
+    python benchmarks/load_test.py [--users 20] [--concurrency 8] [--latency 0.05]
+                                   [--jitter 0.05] [--chats 3] [--pdf-pages 30]
+                                   [--store memory|sqlite] [--label NAME]
+                                   [--compare results/OTHER.json] [--verbose]
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fixtures import ROOT, chat_question, lecture_text, load_app, make_pdf, notes_json, pick_subject
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class LoadTest:
+    def __init__(self, app_module, args):
+        self.app = app_module
+        self.client = app_module.app.test_client()
+        self.args = args
+        self.users = range(args.users)    # one seed (and session) per student
+        self.etags = {}     # seed -> ETag of the last /session response
+
+    def headers(self, seed):
+        return {"X-Session-ID": f"bench-{seed}", "X-Owner-ID": f"owner-{seed % 4}", "Accept-Encoding": "gzip, br"}
+
+    def upload(self, seed):
+        files = [
+            (io.BytesIO(make_pdf(self.args.pdf_pages, seed)), f"lecture-{seed}.pdf"),
+            (io.BytesIO(lecture_text(seed).encode("utf-8")), f"notes-{seed}.txt"),
+            (io.BytesIO(notes_json(seed).encode("utf-8")), f"export-{seed}.json"),
+        ]
+        return self.client.post("/upload", headers=self.headers(seed), data={
+            "file": files, "subject": pick_subject(seed)
+        }, content_type="multipart/form-data")
+
+    def chat(self, seed, turn):
+        return self.client.post("/chat", headers=self.headers(seed), json={
+            "message": chat_question(seed, turn), "session_id": f"bench-{seed}"
+        })
+
+    def chat_stream(self, seed):
+        response = self.client.post("/chat/stream", headers=self.headers(seed), json={
+            "message": chat_question(seed, 99), "session_id": f"bench-{seed}"
+        })
+        response.get_data()     # the phase measures the whole stream
+        return response
+
+    def quiz(self, seed):
+        return self.client.post("/generate_quiz", headers=self.headers(seed), json={
+            "difficulty": "intermediate", "num_questions": 5
+        })
+
+    def flashcards(self, seed):
+        return self.client.post("/generate_flashcards", headers=self.headers(seed), json={"num_cards": 10})
+
+    def session(self, seed):
+        response = self.client.get(f"/session/bench-{seed}", headers=self.headers(seed))
+        self.etags[seed] = response.headers.get("ETag")
+        return response
+
+    def session_revalidate(self, seed):
+        headers = self.headers(seed)
+        if self.etags.get(seed):
+            headers["If-None-Match"] = self.etags[seed]
+        return self.client.get(f"/session/bench-{seed}", headers=headers)
+
+    def sessions(self, seed):
+        return self.client.get("/sessions?limit=20", headers=self.headers(seed))
+
+    def phases(self):
+        chats = [(seed, turn) for turn in range(self.args.chats) for seed in self.users]
+        return [
+            ("upload", [(self.upload, (seed,)) for seed in self.users]),
+            ("chat", [(self.chat, call) for call in chats]),
+            ("chat_stream", [(self.chat_stream, (seed,)) for seed in self.users]),
+            ("quiz", [(self.quiz, (seed,)) for seed in self.users]),
+            ("quiz_repeat", [(self.quiz, (seed,)) for seed in self.users]),
+            ("flashcards", [(self.flashcards, (seed,)) for seed in self.users]),
+            ("session", [(self.session, (seed,)) for seed in self.users]),
+            ("session_304", [(self.session_revalidate, (seed,)) for seed in self.users]),
+            ("sessions", [(self.sessions, (seed,)) for seed in self.users]),
+        ]
+
+    def run_phase(self, calls):
+        def timed_call(call):
+            fn, call_args = call
+            started = time.perf_counter()
+            try:
+                status = fn(*call_args).status_code
+            except Exception as e:
+                print(f"Request error: {e}")
+                status = 0
+            return time.perf_counter() - started, status
+
+        # The app logs every request with print(); keep the report readable
+        output = sys.stdout if self.args.verbose else io.StringIO()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(output), ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            results = list(pool.map(timed_call, calls))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(seconds for seconds, _ in results)
+        return {
+            "requests": len(results),
+            "errors": sum(1 for _, status in results if not (200 <= status < 300 or status == 304)),
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            "peak_rss_mb": peak_rss_mb()
+        }
+
+    def run(self):
+        results = {}
+        print(f"{'phase':<12} {'reqs':>5} {'err':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'peak MB':>8}")
+        for name, calls in self.phases():
+            phase = results[name] = self.run_phase(calls)
+            print(f"{name:<12} {phase['requests']:>5} {phase['errors']:>4} {phase['throughput_rps']:>8.1f} "
+                  f"{phase['p50_ms']:>9.1f} {phase['p95_ms']:>9.1f} {phase['p99_ms']:>9.1f} "
+                  f"{phase['peak_rss_mb']:>8.1f}")
+        return results
+
+
+def compare(current, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous.get('label')} ({previous.get('git_revision') or 'unknown revision'}):")
+    print(f"{'phase':<12} {'req/s':>16} {'p50 ms':>18} {'p99 ms':>18}")
+
+    def change(old, new):
+        return f"{new:.1f} ({(new - old) / old * 100:+.0f}%)" if old else f"{new:.1f}"
+
+    for name, phase in current["phases"].items():
+        old = previous.get("phases", {}).get(name)
+        if not old:
+            continue
+        print(f"{name:<12} {change(old['throughput_rps'], phase['throughput_rps']):>16} "
+              f"{change(old['p50_ms'], phase['p50_ms']):>18} {change(old['p99_ms'], phase['p99_ms']):>18}")
+    print(f"{'peak RSS MB':<12} {change(previous.get('peak_rss_mb', 0), current['peak_rss_mb']):>16}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="extra per-prompt fake latency")
+    parser.add_argument("--chats", type=int, default=3, help="chat turns per user")
+    parser.add_argument("--pdf-pages", type=int, default=30)
+    parser.add_argument("--store", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--label", default=datetime.now().strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show the app's request logging")
+    args = parser.parse_args()
+    if args.compare:
+        args.compare = os.path.abspath(args.compare)
+
+    app_module = load_app(
+        FAKE_LLM_LATENCY=args.latency, FAKE_LLM_JITTER=args.jitter, SESSION_STORE=args.store
+    )
+    started = time.perf_counter()
+    phases = LoadTest(app_module, args).run()
+
+    result = {
+        "label": args.label,
+        "timestamp": datetime.now().isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("label", "compare", "verbose")},
+        "seconds": round(time.perf_counter() - started, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "phases": phases
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"load-{args.label}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nPeak RSS {result['peak_rss_mb']} MB; saved {os.path.relpath(path, ROOT)}")
+
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Content-Encoding negotiation and compression of API responses"""
+import gzip
+
+try:
+    import brotli
+except ImportError:     # optional; gzip only without it
+    brotli = None
+
+# Supported encodings, most preferred first
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# File suffix of each encoding's precompressed static assets (see assets.py)
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Only responses of these types are compressed on the fly; event streams
+# are left alone so every chunk reaches the client as soon as it is written
+COMPRESSIBLE_TYPES = {"application/json"}
+
+
+def choose_encoding(accept_encodings, available=ENCODINGS):
+    """The first of ``available`` the client accepts (a werkzeug Accept
+    object from request.accept_encodings), or None"""
+    for encoding in available:
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    if encoding == "gzip":
+        # mtime=0 keeps the output (and so any ETag over it) deterministic
+        return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_response(response, accept_encodings, min_bytes, gzip_level=6, brotli_quality=5):
+    """Compress a buffered JSON response in place with the best encoding
+    the client accepts; responses under ``min_bytes`` are sent as is"""
+    if (response.mimetype not in COMPRESSIBLE_TYPES or response.is_streamed
+            or response.direct_passthrough or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    if not min_bytes or response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+    response.set_data(compress(data, encoding, gzip_level, brotli_quality))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The compressed body is no longer byte-identical to the one the tag names
+        response.set_etag(etag, weak=True)
+    return response
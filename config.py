@@ -8,4 +8,111 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     ALLOWED_EXTENSIONS = {'pdf', 'txt', 'json', 'docx', 'pptx'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
-    RATE_LIMIT = "200 per day, 500 per hour"
\ No newline at end of file
+    RATE_LIMIT = "200 per day, 500 per hour"
+
+    # LLM backend: "gemini" or "fake" (deterministic local stand-in, no API key needed)
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+    LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+    # Per-route model overrides, e.g. "quiz=gemini-1.5-flash-8b,flashcards=gemini-1.5-flash-8b"
+    LLM_ROUTE_MODELS = os.getenv("LLM_ROUTE_MODELS", "")
+    # Fake backend tuning: base latency and extra deterministic jitter in seconds,
+    # plus an optional JSON file of canned responses keyed by route
+    FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+    FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0"))
+    FAKE_LLM_RESPONSES = os.getenv("FAKE_LLM_RESPONSES")
+    # Outbound model calls: concurrency cap (per process), queue order by route
+    # and how long a call may wait for a free slot before failing
+    MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "8"))
+    MODEL_ROUTE_PRIORITY = os.getenv("MODEL_ROUTE_PRIORITY", "chat,notes,quiz,flashcards")
+    MODEL_QUEUE_TIMEOUT = float(os.getenv("MODEL_QUEUE_TIMEOUT", "60"))
+    # Admission control: requests that call the model are charged their estimated
+    # tokens against a per-session and a per-IP budget (larger, since a campus NAT
+    # puts many students behind one address) refilled over ADMISSION_PERIOD;
+    # over budget gets a 429 with Retry-After before any work starts. 0 = no limit
+    ADMISSION_SESSION_TOKENS = int(os.getenv("ADMISSION_SESSION_TOKENS", "150000"))
+    ADMISSION_IP_TOKENS = int(os.getenv("ADMISSION_IP_TOKENS", "1500000"))
+    ADMISSION_PERIOD = int(os.getenv("ADMISSION_PERIOD", "3600"))  # seconds
+    # Budgets are shared by the workers through this SQLite file when SHARED_STATE is on
+    ADMISSION_DB_PATH = os.getenv("ADMISSION_DB_PATH", "cache/admission.db")
+    # flask-limiter request counters (per process by default; e.g. memcached://host:11211)
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+
+    # Share sessions, notes, upload jobs and the notes cache between gunicorn
+    # workers (forces the SQLite store); required when running more than one worker
+    SHARED_STATE = os.getenv("SHARED_STATE", "false").lower() == "true"
+
+    # Structured-notes cache: in-memory LRU size and optional on-disk tier
+    NOTES_CACHE_SIZE = int(os.getenv("NOTES_CACHE_SIZE", "256"))
+    NOTES_CACHE_DIR = os.getenv("NOTES_CACHE_DIR", "cache/notes" if SHARED_STATE else None)
+    NOTES_CACHE_DISK_BYTES = int(os.getenv("NOTES_CACHE_DISK_BYTES", str(64 * 1024 * 1024)))  # 0 = no limit
+
+    # Generated quizzes and flashcard decks, keyed by the notes they were built
+    # from plus topic/difficulty/count; entries expire after STUDY_CACHE_TTL
+    STUDY_CACHE_SIZE = int(os.getenv("STUDY_CACHE_SIZE", "256"))
+    STUDY_CACHE_TTL = int(os.getenv("STUDY_CACHE_TTL", str(24 * 3600)))  # seconds
+    STUDY_CACHE_DIR = os.getenv("STUDY_CACHE_DIR", "cache/study" if SHARED_STATE else None)
+    STUDY_CACHE_DISK_BYTES = int(os.getenv("STUDY_CACHE_DISK_BYTES", str(64 * 1024 * 1024)))  # 0 = no limit
+    # Generate the default quiz and flashcard deck in the background after an upload
+    STUDY_PREFETCH = os.getenv("STUDY_PREFETCH", "false").lower() == "true"
+
+    # Uploads are stored once per distinct content; "text" keeps only the
+    # extracted text and deletes the original file after extraction
+    UPLOAD_RETENTION = os.getenv("UPLOAD_RETENTION", "file")
+
+    # Process uploads on a background pool and return a job id immediately
+    UPLOAD_ASYNC = os.getenv("UPLOAD_ASYNC", "true").lower() == "true"
+    UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+    UPLOAD_JOB_RETENTION = int(os.getenv("UPLOAD_JOB_RETENTION", "3600"))  # seconds
+
+    # Opt-in: small .txt/.json files of one upload share a notes model call; files
+    # of up to NOTES_BATCH_FILE_CHARS bytes are packed up to NOTES_BATCH_CHARS
+    # and NOTES_BATCH_MAX_FILES per call
+    NOTES_BATCH = os.getenv("NOTES_BATCH", "false").lower() == "true"
+    NOTES_BATCH_FILE_CHARS = int(os.getenv("NOTES_BATCH_FILE_CHARS", "4000"))
+    NOTES_BATCH_CHARS = int(os.getenv("NOTES_BATCH_CHARS", "15000"))
+    NOTES_BATCH_MAX_FILES = int(os.getenv("NOTES_BATCH_MAX_FILES", "8"))
+
+    # Opt-in: documents longer than one notes call are split into chunks of
+    # about NOTES_CHUNK_CHARS, summarised NOTES_MAP_CONCURRENCY at a time and
+    # merged into one set of notes; up to NOTES_MAX_CHARS of a document is read
+    NOTES_MAP_REDUCE = os.getenv("NOTES_MAP_REDUCE", "false").lower() == "true"
+    NOTES_CHUNK_CHARS = int(os.getenv("NOTES_CHUNK_CHARS", "12000"))
+    NOTES_MAP_CONCURRENCY = int(os.getenv("NOTES_MAP_CONCURRENCY", "4"))
+    NOTES_MAX_CHARS = int(os.getenv("NOTES_MAX_CHARS", "200000"))
+
+    # Text extraction stops once this many characters are collected (0 = no limit)
+    EXTRACT_CHAR_BUDGET = int(os.getenv("EXTRACT_CHAR_BUDGET", "15000"))
+    # PDFs with at least this many pages are extracted on a process pool
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+    PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+
+    # Chat context: uploads are split into chunks and the best BM25 matches
+    # for the question are added to the prompt, up to this many tokens
+    RETRIEVAL_CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "800"))
+    CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1200"))
+    CHAT_CONTEXT_TOP_K = int(os.getenv("CHAT_CONTEXT_TOP_K", "6"))
+    # Chat history: recent turns kept verbatim up to CHAT_HISTORY_TOKENS (each
+    # capped at CHAT_MESSAGE_TOKENS), older turns folded into a rolling summary
+    CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "800"))
+    CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "200"))
+    CHAT_MESSAGE_TOKENS = int(os.getenv("CHAT_MESSAGE_TOKENS", "200"))
+
+    # Session/notes store: "memory" (LRU/TTL with a memory cap) or "sqlite" (persistent, WAL)
+    SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+    SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "edubot.db")
+    SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))  # seconds idle
+    MEMORY_STORE_MAX_BYTES = int(os.getenv("MEMORY_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+    MEMORY_STORE_MAX_SESSIONS = int(os.getenv("MEMORY_STORE_MAX_SESSIONS", "10000"))
+    # Keep note content and structured notes zlib-compressed in the memory store
+    MEMORY_STORE_COMPRESS = os.getenv("MEMORY_STORE_COMPRESS", "true").lower() == "true"
+
+    # /sessions page size (default and maximum for the ?limit= parameter)
+    SESSIONS_PAGE_SIZE = int(os.getenv("SESSIONS_PAGE_SIZE", "20"))
+    SESSIONS_PAGE_MAX = int(os.getenv("SESSIONS_PAGE_MAX", "100"))
+
+    # JSON responses of at least this many bytes are compressed (brotli when the
+    # optional brotli package is installed and accepted, else gzip); 0 disables
+    COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "5"))
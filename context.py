@@ -0,0 +1,143 @@
+"""Incremental, token-budgeted chat context per session"""
+import re
+import threading
+from collections import OrderedDict, deque
+
+from retrieval import estimate_tokens
+
+FIRST_SENTENCE_RE = re.compile(r"^(.+?[.!?])(\s|$)", re.DOTALL)
+MARKUP_RE = re.compile(r"[*_`#>]+")
+
+
+def _gist(text, limit=100):
+    """First sentence of a message, without Markdown, at most limit chars"""
+    text = " ".join(MARKUP_RE.sub("", text).split())
+    match = FIRST_SENTENCE_RE.match(text)
+    if match:
+        text = match.group(1)
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class ChatContext:
+    """Prompt context for one session, updated as messages arrive.
+
+    The most recent turns are kept verbatim (each capped at
+    ``message_tokens``) while they fit in ``history_tokens``. Older turns are
+    folded into a rolling summary of one-line gists, itself capped at
+    ``summary_tokens``. Adding a turn and rendering the context therefore
+    cost the same however long the session runs.
+    """
+
+    def __init__(self, created_at, history_tokens=800, summary_tokens=200, message_tokens=200):
+        self.created_at = created_at
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.message_chars = message_tokens * 4
+        self.message_count = 0
+        self.file_count = 0
+        self.last_message_id = None
+        self._turns = deque()           # (line, tokens, role, content)
+        self._turn_tokens = 0
+        self._summary = deque()         # (line, tokens)
+        self._summary_tokens = 0
+        self._rendered = None
+
+    def add_message(self, message):
+        role = "You" if message["role"] == "user" else "EduBot"
+        content = message["content"]
+        if len(content) > self.message_chars:
+            content = content[:self.message_chars] + "..."
+        line = f"{role}: {content}"
+        tokens = estimate_tokens(line)
+
+        self._turns.append((line, tokens, message["role"], content))
+        self._turn_tokens += tokens
+        self.message_count += 1
+        self.last_message_id = message.get("id")
+
+        # Fold the oldest turns into the summary until the window fits
+        while self._turn_tokens > self.history_tokens and len(self._turns) > 1:
+            _, old_tokens, old_role, old_content = self._turns.popleft()
+            self._turn_tokens -= old_tokens
+            self._fold(old_role, old_content)
+        self._rendered = None
+
+    def _fold(self, role, content):
+        prefix = "Student asked" if role == "user" else "EduBot explained"
+        line = f"- {prefix}: {_gist(content)}"
+        tokens = estimate_tokens(line)
+        self._summary.append((line, tokens))
+        self._summary_tokens += tokens
+        while self._summary_tokens > self.summary_tokens and len(self._summary) > 1:
+            self._summary_tokens -= self._summary.popleft()[1]
+
+    def set_file_count(self, count):
+        if count != self.file_count:
+            self.file_count = count
+            self._rendered = None
+
+    def render(self):
+        """Return (session_summary, recent_history) strings"""
+        if self._rendered is None:
+            session_summary = f"""
+Session started: {self.created_at}
+Messages exchanged: {self.message_count}
+Files uploaded: {self.file_count}
+"""
+            if self._summary:
+                session_summary += "Earlier in this session:\n"
+                session_summary += "\n".join(line for line, _ in self._summary) + "\n"
+            recent_history = "\n".join(turn[0] for turn in self._turns)
+            self._rendered = (session_summary, recent_history)
+        return self._rendered
+
+
+class ChatContexts:
+    """Per-session ChatContext objects, least recently used evicted first"""
+
+    def __init__(self, max_sessions=2000, **context_options):
+        self.max_sessions = max_sessions
+        self.context_options = context_options
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _build(self, session):
+        context = ChatContext(session.get("created_at", "Unknown"), **self.context_options)
+        for message in session.get("message_history", []):
+            context.add_message(message)
+        return context
+
+    def render(self, session_id, session):
+        """Render the session's context as (session_summary, recent_history).
+
+        The cached context is rebuilt from ``session`` when it is missing or
+        another process has written messages since it was last updated.
+        """
+        history = session.get("message_history", [])
+        last_id = history[-1].get("id") if history else None
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is None or context.last_message_id != last_id:
+                context = self._build(session)
+                self._contexts[session_id] = context
+                while len(self._contexts) > self.max_sessions:
+                    self._contexts.popitem(last=False)
+            self._contexts.move_to_end(session_id)
+            context.set_file_count(len(session.get("files", [])))
+            return context.render()
+
+    def add_messages(self, session_id, messages):
+        """Apply new messages to a cached context (no-op if not cached)"""
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is not None:
+                for message in messages:
+                    context.add_message(message)
+
+    def drop(self, session_id):
+        with self._lock:
+            self._contexts.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._contexts)}
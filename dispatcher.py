@@ -0,0 +1,180 @@
+"""Central dispatcher for outbound model calls"""
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+
+class QueueTimeout(Exception):
+    """A model call waited too long for a free slot"""
+
+
+class _Flight:
+    """An in-flight call that identical requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class ModelDispatcher:
+    """Bounds concurrent model calls, orders waiters by route priority and
+    coalesces identical in-flight prompts.
+
+    At most ``max_concurrency`` calls run at once. When all slots are busy,
+    callers queue and the freed slot goes to the waiting call with the best
+    route priority (then the oldest). A call whose (route, prompt) is already
+    running does not queue at all: it waits for and shares that result.
+    """
+
+    def __init__(self, max_concurrency=8, priorities=("chat", "notes", "quiz", "flashcards"),
+                 queue_timeout=60.0, sample_size=1000):
+        self.max_concurrency = max_concurrency
+        self.priorities = {route: rank for rank, route in enumerate(priorities)}
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = []      # heap of (priority, seq, event)
+        self._seq = itertools.count()
+        self._flights = {}
+        self._sample_size = sample_size
+        self._metrics = {}
+
+    def _route_metrics(self, route):
+        metrics = self._metrics.get(route)
+        if metrics is None:
+            metrics = self._metrics[route] = {
+                "calls": 0,
+                "coalesced": 0,
+                "errors": 0,
+                "queue_timeouts": 0,
+                "queue_times": deque(maxlen=self._sample_size)
+            }
+        return metrics
+
+    def _acquire(self, route):
+        """Wait for a call slot; returns the seconds spent queued"""
+        started = time.perf_counter()
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                return 0.0
+            event = threading.Event()
+            entry = [self.priorities.get(route, len(self.priorities)), next(self._seq), event]
+            heapq.heappush(self._waiters, entry)
+
+        if not event.wait(self.queue_timeout):
+            with self._lock:
+                if not event.is_set():
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._route_metrics(route)["queue_timeouts"] += 1
+                    raise QueueTimeout(f"Model queue wait exceeded {self.queue_timeout}s")
+            # The slot was handed over just as we timed out; keep it
+        return time.perf_counter() - started
+
+    def _release(self):
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the best waiter
+                heapq.heappop(self._waiters)[2].set()
+            else:
+                self._active -= 1
+
+    def _record(self, route, queued, error=False):
+        with self._lock:
+            metrics = self._route_metrics(route)
+            metrics["calls"] += 1
+            metrics["queue_times"].append(queued)
+            if error:
+                metrics["errors"] += 1
+
+    def run(self, route, prompt, fn):
+        """Run fn() for a prompt under the concurrency cap, sharing the result
+        with identical concurrent calls"""
+        key = (route, hashlib.sha1(prompt.encode('utf-8')).hexdigest())
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.waiters += 1
+                self._route_metrics(route)["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            queued = self._acquire(route)
+        except QueueTimeout as e:
+            self._finish(key, flight, error=e)
+            raise
+        try:
+            flight.result = fn()
+        except Exception as e:
+            self._record(route, queued, error=True)
+            self._finish(key, flight, error=e)
+            raise
+        finally:
+            self._release()
+        self._record(route, queued)
+        self._finish(key, flight)
+        return flight.result
+
+    def _finish(self, key, flight, error=None):
+        flight.error = error
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.done.set()
+
+    def stream(self, route, fn):
+        """Iterate the generator returned by fn() while holding a call slot.
+
+        Streams are never coalesced: each client consumes its own chunks.
+        """
+        queued = self._acquire(route)
+        error = False
+        try:
+            yield from fn()
+        except Exception:
+            error = True
+            raise
+        finally:
+            self._release()
+            self._record(route, queued, error=error)
+
+    def stats(self):
+        with self._lock:
+            routes = {}
+            for route, metrics in self._metrics.items():
+                samples = sorted(metrics["queue_times"])
+                routes[route] = {
+                    "calls": metrics["calls"],
+                    "coalesced": metrics["coalesced"],
+                    "errors": metrics["errors"],
+                    "queue_timeouts": metrics["queue_timeouts"],
+                    "queue_p50_ms": _percentile_ms(samples, 0.50),
+                    "queue_p99_ms": _percentile_ms(samples, 0.99),
+                    "queue_max_ms": round(samples[-1] * 1000, 1) if samples else 0.0
+                }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "queued": len(self._waiters),
+                "in_flight_prompts": len(self._flights),
+                "routes": routes
+            }
+
+
+def _percentile_ms(samples, fraction):
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+    return round(samples[index] * 1000, 1)
@@ -0,0 +1,317 @@
+"""Text extraction for uploaded study materials"""
+import json
+import multiprocessing
+import posixpath
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+from config import Config
+
+# Office Open XML namespaces
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+SLIDE_RE = re.compile(r"^ppt/slides/slide(\d+)\.xml$")
+# Characters of a JSON string literal up to its closing quote or next escape
+JSON_STRING_RE = re.compile(r'[^"\\]*')
+JSON_SPACE_RE = re.compile(r"[ \t\r\n]*")
+# Text is read this many characters at a time from JSON files
+JSON_READ_CHARS = 64 * 1024
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool():
+    """Lazily start the process pool used for large PDFs"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                # spawn avoids forking a multi-threaded web worker
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=Config.PDF_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pdf_pool
+
+
+def load_pdf_library():
+    """PyPDF2, imported on first use so processes that never read a PDF skip
+    it (the gunicorn master calls this to preload it for its workers)"""
+    import PyPDF2
+    return PyPDF2
+
+
+def iter_pdf_pages(reader, start=0, stop=None):
+    """Yield (page_number, text, seconds) for each page of an open reader"""
+    pages = reader.pages
+    stop = len(pages) if stop is None else min(stop, len(pages))
+    for index in range(start, stop):
+        started = time.perf_counter()
+        try:
+            text = pages[index].extract_text() or ""
+        except Exception as e:
+            print(f"PDF page {index + 1} error: {e}")
+            text = ""
+        yield index + 1, text, time.perf_counter() - started
+
+
+def _extract_page_range(filepath, start, stop):
+    """Worker-process entry point: extract pages [start, stop) of a PDF"""
+    reader = load_pdf_library().PdfReader(filepath)
+    return list(iter_pdf_pages(reader, start, stop))
+
+
+def _parallel_page_batches(filepath, first_page, page_count):
+    """Yield page results in order, extracting batches on the process pool.
+
+    Batches are submitted one wave (one per worker) at a time so the caller
+    can stop early without paying for the rest of the document.
+    """
+    pool = _get_pdf_pool()
+    batch = Config.PDF_PAGES_PER_TASK
+    starts = list(range(first_page, page_count, batch))
+    for wave_at in range(0, len(starts), Config.PDF_WORKERS):
+        futures = [
+            pool.submit(_extract_page_range, filepath, start, start + batch)
+            for start in starts[wave_at:wave_at + Config.PDF_WORKERS]
+        ]
+        for future in futures:
+            yield from future.result()
+
+
+def _pdf_page_results(pdf_file, reader, page_count, max_chars):
+    """Pick serial or process-pool extraction for a document"""
+    if not (isinstance(pdf_file, str) and Config.PDF_WORKERS > 1
+            and page_count >= Config.PDF_PARALLEL_MIN_PAGES):
+        yield from iter_pdf_pages(reader)
+        return
+
+    # Read the first batch here; with a character budget it is often enough
+    batch = Config.PDF_PAGES_PER_TASK
+    chars = 0
+    for result in iter_pdf_pages(reader, 0, batch):
+        chars += len(result[1])
+        yield result
+
+    if max_chars and chars:
+        pages_needed = (max_chars - chars) / (chars / batch)
+        if pages_needed < Config.PDF_PARALLEL_MIN_PAGES:
+            yield from iter_pdf_pages(reader, batch)
+            return
+    yield from _parallel_page_batches(pdf_file, batch, page_count)
+
+
+def extract_text_from_pdf(pdf_file, max_chars=None, stats=None):
+    """Extract PDF text page by page, stopping once max_chars is reached.
+
+    ``pdf_file`` is a path or a binary file object. Large PDFs given by path
+    are spread over a process pool. When ``stats`` is a dict it is filled with
+    the page count, pages read, per-page timings and whether extraction
+    stopped early.
+    """
+    parts = []
+    total = 0
+    page_times = []
+    page_count = 0
+    started = time.perf_counter()
+    try:
+        reader = load_pdf_library().PdfReader(pdf_file)
+        page_count = len(reader.pages)
+
+        for page_number, text, seconds in _pdf_page_results(pdf_file, reader, page_count, max_chars):
+            parts.append(text)
+            total += len(text)
+            page_times.append(round(seconds, 4))
+            if max_chars and total >= max_chars:
+                break
+    except Exception as e:
+        print(f"PDF error: {e}")
+
+    text = ''.join(parts)
+    if max_chars:
+        text = text[:max_chars]
+
+    if stats is not None:
+        stats.update({
+            "pages": page_count,
+            "pages_read": len(page_times),
+            "page_times": page_times,
+            "seconds": round(time.perf_counter() - started, 4),
+            "stopped_early": len(page_times) < page_count
+        })
+    return text
+
+
+def _join_pieces(pieces, max_chars, separator="\n"):
+    """Join non-blank pieces of text, stopping once max_chars is reached"""
+    parts = []
+    total = 0
+    for piece in pieces:
+        if not piece.strip():
+            continue
+        parts.append(piece)
+        total += len(piece) + len(separator)
+        if max_chars and total >= max_chars:
+            break
+    text = separator.join(parts)
+    return text[:max_chars] if max_chars else text
+
+
+def iter_xml_paragraphs(stream, paragraph, text, breaks):
+    """Yield the text of every ``paragraph`` element of an XML stream.
+
+    The XML is parsed incrementally and each element is dropped from the
+    tree as soon as it ends, so memory holds only the path to the current
+    element however large the document is. ``text`` is the tag holding
+    runs of text and ``breaks`` maps tags (tabs, line breaks) to the text
+    that stands in for them.
+    """
+    parts = []
+    path = []
+    for event, elem in ElementTree.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            path.append(elem)
+            continue
+        path.pop()
+        if elem.tag == text:
+            if elem.text:
+                parts.append(elem.text)
+        elif elem.tag in breaks:
+            parts.append(breaks[elem.tag])
+        elif elem.tag == paragraph:
+            yield "".join(parts)
+            parts = []
+        if path:
+            path[-1].remove(elem)
+
+
+def iter_docx_paragraphs(filepath):
+    """Paragraphs of a Word document's body, in order"""
+    with zipfile.ZipFile(filepath) as docx, docx.open("word/document.xml") as stream:
+        yield from iter_xml_paragraphs(stream, W_NS + "p", W_NS + "t", {
+            W_NS + "tab": "\t", W_NS + "br": "\n", W_NS + "cr": "\n"
+        })
+
+
+def _slide_names(pptx):
+    """Slide parts of a presentation in presentation order (file number
+    order when the presentation part cannot be read)"""
+    names = set(pptx.namelist())
+    try:
+        rels = ElementTree.fromstring(pptx.read("ppt/_rels/presentation.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target", "") for rel in rels}
+        presentation = ElementTree.fromstring(pptx.read("ppt/presentation.xml"))
+        ordered = []
+        for slide in presentation.iter(P_NS + "sldId"):
+            target = targets.get(slide.get(R_NS + "id"), "")
+            name = target[1:] if target.startswith("/") else posixpath.normpath(posixpath.join("ppt", target))
+            if name in names:
+                ordered.append(name)
+        if ordered:
+            return ordered
+    except (KeyError, ElementTree.ParseError):
+        pass
+    slides = [(int(match.group(1)), name) for name in names for match in [SLIDE_RE.match(name)] if match]
+    return [name for _, name in sorted(slides)]
+
+
+def iter_pptx_paragraphs(filepath):
+    """Paragraphs of every slide of a presentation; the first of each
+    slide after the first starts with a newline (a blank line between
+    slides once joined)"""
+    with zipfile.ZipFile(filepath) as pptx:
+        for number, name in enumerate(_slide_names(pptx)):
+            first = number > 0
+            with pptx.open(name) as stream:
+                for paragraph in iter_xml_paragraphs(stream, A_NS + "p", A_NS + "t", {A_NS + "br": "\n"}):
+                    if first and paragraph.strip():
+                        paragraph = "\n" + paragraph
+                        first = False
+                    yield paragraph
+
+
+def iter_json_strings(f):
+    """Yield the string values (not the keys) of a JSON text file as it is
+    read, without building the document. Malformed JSON is not rejected;
+    whatever looks like a string value is yielded."""
+    pending = None      # last string read, a value unless a colon follows
+    literal = None      # pieces of the string literal being read
+    carry = ""
+    while True:
+        chunk = f.read(JSON_READ_CHARS)
+        if not chunk:
+            break
+        chunk = carry + chunk
+        carry = ""
+        i, n = 0, len(chunk)
+        while i < n:
+            if literal is not None:
+                end = JSON_STRING_RE.match(chunk, i).end()
+                literal.append(chunk[i:end])
+                if end == n:
+                    i = n
+                elif chunk[end] == '"':
+                    try:
+                        pending = json.loads('"' + "".join(literal) + '"', strict=False)
+                    except ValueError:
+                        pending = None      # a bad escape; skip the string
+                    literal = None
+                    i = end + 1
+                elif end + 1 < n:
+                    literal.append(chunk[end:end + 2])      # an escape: backslash and the next character
+                    i = end + 2
+                else:
+                    carry = "\\"      # the escape continues in the next chunk
+                    i = n
+                continue
+            if pending is not None:
+                i = JSON_SPACE_RE.match(chunk, i).end()
+                if i == n:
+                    break
+                if chunk[i] != ":":
+                    yield pending
+                pending = None
+            quote = chunk.find('"', i)
+            if quote < 0:
+                break
+            literal = []
+            i = quote + 1
+    if pending is not None:
+        yield pending
+
+
+def extract_file_content(filepath, max_chars=None):
+    """Extract text from various file types"""
+    if max_chars is None:
+        max_chars = Config.EXTRACT_CHAR_BUDGET
+    try:
+        if filepath.endswith('.pdf'):
+            stats = {}
+            text = extract_text_from_pdf(filepath, max_chars, stats)
+            print(f"PDF extracted: {filepath} ({stats.get('pages_read', 0)}/{stats.get('pages', 0)} pages, "
+                  f"{stats.get('seconds', 0)}s)")
+            return text
+        elif filepath.endswith('.txt'):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return f.read(max_chars) if max_chars else f.read()
+        elif filepath.endswith('.json'):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                text = _join_pieces(iter_json_strings(f), max_chars)
+            # A lone surrogate escape ("\\ud800") cannot be saved as UTF-8
+            return text.encode('utf-8', 'replace').decode('utf-8')
+        elif filepath.endswith('.docx'):
+            return _join_pieces(iter_docx_paragraphs(filepath), max_chars)
+        elif filepath.endswith('.pptx'):
+            return _join_pieces(iter_pptx_paragraphs(filepath), max_chars)
+    except Exception as e:
+        print(f"Error extracting content: {e}")
+        return ""
+    return ""
@@ -0,0 +1,44 @@
+import os
+import time
+
+# More than one worker needs SHARED_STATE=true so every worker sees the same
+# sessions, notes and upload jobs; otherwise stay on a single process.
+shared_state = os.getenv("SHARED_STATE", "false").lower() == "true"
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(2 * (os.cpu_count() or 1) + 1, 8) if shared_state else 1)))
+# Threads keep streaming chat responses and job polling from blocking a worker
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Import the app (and the model SDK and PDF library, see when_ready) once in
+# the master; forked workers share those pages copy-on-write and start in
+# milliseconds instead of each importing everything again
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    started = time.perf_counter()
+    from extractors import load_pdf_library
+    from llm import load_backend_library
+    try:
+        load_pdf_library()
+        load_backend_library()
+    except ImportError as e:
+        server.log.warning("Preloading libraries failed: %s", e)
+    server.log.info("Preloaded model SDK and PDF library in %.0f ms", (time.perf_counter() - started) * 1000)
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    import app
+
+    seconds = time.perf_counter() - worker.forked_at
+    app.record_worker_start(seconds, worker.cfg.preload_app)
+    worker.log.info("Worker %s ready in %.1f ms (preload %s)", worker.pid, seconds * 1000,
+                    "on" if worker.cfg.preload_app else "off")
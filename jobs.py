@@ -0,0 +1,208 @@
+"""Background job pipeline for file uploads"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class UploadJobs:
+    """Tracks upload jobs and runs their files on a bounded thread pool.
+
+    Each job holds one entry per file with its own state
+    (``queued`` -> ``processing`` -> ``success``/``error``). Finished jobs are
+    kept for ``retention`` seconds so clients can still poll their result.
+    An ``on_done(job)`` callback given to create() runs on the worker pool
+    once the job's last file has finished.
+    With a ``commit(index, value)`` callback, what the workers return is
+    not yet the file's result: it is passed to commit in file order (file 0
+    first, whatever order the workers finish in) by whichever worker fills
+    the gap, and commit returns the result (or raises to fail the file).
+    Work runs in parallel while its effects (e.g. registering notes with
+    the session) keep the upload order.
+    With a shared ``store`` every state change is also published there, so
+    a status poll answered by another worker process sees the same job.
+    """
+
+    def __init__(self, max_workers=4, retention=3600, store=None):
+        self.retention = retention
+        self.store = store if store is not None and store.shared else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self._jobs = {}
+        self._ordered = {}      # job id -> files waiting for commit, for jobs with one
+        self._lock = threading.Lock()
+
+    def create(self, session_id, filenames, on_done=None, commit=None):
+        now = datetime.now().isoformat()
+        job = {
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now,
+            "files": [{"filename": name, "status": "queued"} for name in filenames],
+            "_finished_at": None,
+            "_on_done": on_done
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job["id"]] = job
+            if commit is not None:
+                self._ordered[job["id"]] = {
+                    "commit": commit, "next": 0, "total": len(filenames), "ready": {}, "lock": threading.Lock()
+                }
+            self._publish(job)
+        return job["id"]
+
+    def submit(self, job_id, index, fn, *args):
+        """Run fn(*args) for file ``index`` of a job on the worker pool.
+
+        fn returns the per-file result dict (or the value to commit), or
+        raises to mark the file failed.
+        """
+        self._executor.submit(self._run, job_id, index, fn, args)
+
+    def submit_batch(self, job_id, indexes, fn, *args):
+        """Run fn(*args) once for several files of a job (e.g. small files
+        sharing one model call).
+
+        fn returns one entry per index, in order: the file's result dict (or
+        the value to commit), or the exception that failed it.
+        """
+        self._executor.submit(self._run_batch, job_id, indexes, fn, args)
+
+    def defer(self, fn, *args):
+        """Run fn(*args) on the worker pool outside of any job"""
+        self._executor.submit(self._call, fn, args)
+
+    def _call(self, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Background task error: {e}")
+
+    def fail(self, job_id, index, error):
+        """Mark a file as failed without running it (e.g. invalid type)"""
+        self._finish(job_id, index, Exception(error))
+
+    def _run(self, job_id, index, fn, args):
+        self._update(job_id, index, {"status": "processing"})
+        try:
+            result = fn(*args)
+        except Exception as e:
+            print(f"Upload job {job_id} file {index} error: {e}")
+            result = e
+        self._finish(job_id, index, result)
+
+    def _run_batch(self, job_id, indexes, fn, args):
+        for index in indexes:
+            self._update(job_id, index, {"status": "processing"})
+        try:
+            results = fn(*args)
+        except Exception as e:
+            results = [e] * len(indexes)
+        for index, result in zip(indexes, results):
+            if isinstance(result, Exception):
+                print(f"Upload job {job_id} file {index} error: {result}")
+            self._finish(job_id, index, result)
+
+    def _finish(self, job_id, index, outcome):
+        """Report a file's outcome (its result or an exception), committing
+        it first, in file order, when the job has a commit callback"""
+        with self._lock:
+            ordered = self._ordered.get(job_id)
+        if ordered is None:
+            self._report(job_id, index, outcome)
+            return
+        with ordered["lock"]:
+            ordered["ready"][index] = outcome
+            while ordered["next"] in ordered["ready"]:
+                index = ordered["next"]
+                outcome = ordered["ready"].pop(index)
+                ordered["next"] += 1
+                if not isinstance(outcome, Exception):
+                    try:
+                        outcome = ordered["commit"](index, outcome)
+                    except Exception as e:
+                        print(f"Upload job {job_id} file {index} error: {e}")
+                        outcome = e
+                self._report(job_id, index, outcome)
+            if ordered["next"] >= ordered["total"]:
+                with self._lock:
+                    self._ordered.pop(job_id, None)
+
+    def _report(self, job_id, index, outcome):
+        if isinstance(outcome, Exception):
+            self._update(job_id, index, {"status": "error", "error": str(outcome)})
+        else:
+            self._update(job_id, index, {"status": "success", **outcome})
+
+    def _update(self, job_id, index, changes):
+        on_done = None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            job["files"][index].update(changes)
+            job["updated_at"] = datetime.now().isoformat()
+
+            states = [f["status"] for f in job["files"]]
+            if all(state in ("success", "error") for state in states):
+                job["status"] = "completed" if "success" in states else "failed"
+                job["_finished_at"] = time.monotonic()
+                on_done, job["_on_done"] = job["_on_done"], None
+            elif "processing" in states or "success" in states or "error" in states:
+                job["status"] = "processing"
+            self._publish(job)
+            snapshot = {k: v for k, v in job.items() if not k.startswith("_")}
+
+        if on_done is not None:
+            # Never on the caller's thread: fail() is called from request handlers
+            self._executor.submit(self._call, on_done, (snapshot,))
+
+    def _publish(self, job):
+        if self.store is not None:
+            try:
+                self.store.put_job({k: v for k, v in job.items() if not k.startswith("_")})
+            except Exception as e:
+                print(f"Upload job publish error: {e}")
+
+    def get(self, job_id):
+        """Return a snapshot of a job in the /upload response shape, or None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                files = [dict(f) for f in job["files"]]
+                snapshot = {k: v for k, v in job.items() if not k.startswith("_")}
+
+        if not job:
+            # Possibly started by another worker
+            snapshot = self.store.get_job(job_id) if self.store is not None else None
+            if not snapshot:
+                return None
+            files = snapshot["files"]
+
+        snapshot["files"] = files
+        snapshot["processed_files"] = [f for f in files if f["status"] == "success"]
+        snapshot["failed_files"] = [
+            {"filename": f["filename"], "error": f.get("error", "")}
+            for f in files if f["status"] == "error"
+        ]
+        snapshot["done"] = snapshot["status"] in ("completed", "failed")
+        return snapshot
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["_finished_at"] is not None and job["_finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None:
+            self.store.prune_jobs(self.retention)
+
+    def stats(self):
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job["_finished_at"] is None)
+            return {"tracked": len(self._jobs), "active": active}
@@ -0,0 +1,297 @@
+"""Robust JSON extraction from model replies"""
+import json
+import re
+
+import metrics
+
+# Characters that matter to the bracket scanner; everything else is skipped
+TOKEN_RE = re.compile(r'[\[\]{}",\\]')
+# A JSON string, or a comma that directly precedes a closing bracket
+STRING_OR_TRAILING_COMMA_RE = re.compile(r'("(?:\\.|[^"\\])*")|,(\s*[}\]])')
+
+CLOSERS = {"{": "}", "[": "]"}
+
+NUMBER = (int, float)
+
+# Per-endpoint schemas: expected type, required keys (all of "required", at
+# least one of "required_any"), types of known keys, and (for arrays) the
+# schema every item must match. Required keys are what keep a stray {...}
+# in the prose around the JSON from being taken for the reply.
+NOTES_SCHEMA = {
+    "type": dict,
+    "required": ("title", "summary"),
+    "fields": {
+            "title": str,
+            "summary": str,
+            "key_points": list,
+            "important_concepts": list,
+            "study_tips": list,
+            "potential_questions": list
+        }
+}
+
+SCHEMAS = {
+    "chat": {
+        "type": dict,
+        "required": ("response",),
+        "fields": {"response": str, "follow_ups": list, "confidence": NUMBER, "topics": list}
+    },
+    "chat_meta": {
+        "type": dict,
+        "required_any": ("response", "follow_ups", "topics"),
+        "fields": {"follow_ups": list, "confidence": NUMBER, "topics": list}
+    },
+    "notes": NOTES_SCHEMA,
+    # Partial notes of one section of a long document (no title)
+    "notes_section": {
+        "type": dict,
+        "required": ("summary",),
+        "fields": {"summary": str, "key_points": list, "important_concepts": list, "potential_questions": list}
+    },
+    "notes_batch": {
+        "type": list,
+        "min_items": 1,
+        "items": NOTES_SCHEMA
+    },
+    "quiz": {
+        "type": dict,
+        "required": ("questions",),
+        "fields": {"questions": list},
+        "nested": {
+            "questions": {
+                "type": list,
+                "min_items": 1,
+                "items": {
+                    "type": dict,
+                    "required": ("question", "options"),
+                    "fields": {"question": str, "options": list}
+                }
+            }
+        }
+    },
+    "flashcards": {
+        "type": list,
+        "min_items": 1,
+        "items": {
+            "type": dict,
+            "required": ("term", "definition"),
+            "fields": {"term": str, "definition": str}
+        }
+    }
+}
+
+
+class JSONScanner:
+    """Finds complete top-level JSON objects and arrays in text fed piece by piece.
+
+    The scanner tracks bracket depth, strings and escapes in one linear pass;
+    each feed() only looks at the new text, so a streamed reply can be fed
+    chunk by chunk and a value is available as soon as its closing bracket
+    arrives. Prose, code fences and other text around the JSON are ignored.
+    """
+
+    def __init__(self):
+        self._stack = []        # expected closing brackets of the open value
+        self._parts = []        # text of the open value from earlier chunks
+        self._in_string = False
+        self._escaped = -1      # absolute offset of a backslash-escaped char
+        self._offset = 0
+        self._start = 0         # absolute offset where the open value starts
+        self._last_comma = None  # (absolute offset, open brackets) of its last comma
+
+    def feed(self, text):
+        """Scan more text; returns the raw values completed by it"""
+        completed = []
+        base = self._offset
+        self._offset += len(text)
+        start = 0 if self._stack else None
+
+        while text is not None:
+            replay = None
+            for match in TOKEN_RE.finditer(text):
+                at = match.start()
+                if base + at == self._escaped:
+                    continue
+                char = match.group()
+                if not self._stack:
+                    if char in CLOSERS:
+                        self._stack.append(CLOSERS[char])
+                        self._start = base + at
+                        self._last_comma = None
+                        start = at
+                    continue
+                if self._in_string:
+                    if char == "\\":
+                        self._escaped = base + at + 1
+                    elif char == '"':
+                        self._in_string = False
+                    continue
+                if char == '"':
+                    self._in_string = True
+                elif char == ",":
+                    self._last_comma = (base + at, tuple(self._stack))
+                elif char in CLOSERS:
+                    self._stack.append(CLOSERS[char])
+                elif char in "}]":
+                    if char != self._stack[-1]:
+                        # Mismatched bracket: the opener was prose, not JSON;
+                        # scan again from just after it
+                        replay = "".join(self._parts)[1:] + text[start:] if self._parts else text[start + 1:]
+                        break
+                    self._stack.pop()
+                    if not self._stack:
+                        completed.append("".join(self._parts) + text[start:at + 1])
+                        self._parts = []
+                        start = None
+            if replay is not None:
+                base = self._start + 1
+                self._reset()
+                start = None
+            elif self._stack:
+                self._parts.append(text[start:])
+            text = replay
+        return completed
+
+    def _reset(self):
+        self._stack = []
+        self._parts = []
+        self._in_string = False
+        self._last_comma = None
+
+    def finish(self):
+        """Return closed-off versions of a value left open at the end of the
+        text (possibly none).
+
+        Replies cut short by the output token limit usually end inside the
+        JSON. The first candidate closes the open string and brackets; the
+        second drops everything after the last complete element, for replies
+        cut inside a key or value.
+        """
+        if not self._stack:
+            return []
+        text = "".join(self._parts)
+        closed = text + '"' if self._in_string else text
+        candidates = [closed.rstrip().rstrip(",:") + "".join(reversed(self._stack))]
+        if self._last_comma is not None:
+            offset, stack = self._last_comma
+            candidates.append(text[:offset - self._start] + "".join(reversed(stack)))
+        self._reset()
+        return candidates
+
+
+def repair(text):
+    """Fix common model JSON faults: trailing commas before } or ]"""
+    return STRING_OR_TRAILING_COMMA_RE.sub(lambda m: m.group(1) or m.group(2), text)
+
+
+def loads_lenient(text):
+    """json.loads that tolerates raw control characters and trailing commas;
+    returns None if the text still does not parse"""
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+    try:
+        return json.loads(repair(text), strict=False)
+    except ValueError:
+        return None
+
+
+def validate(value, schema):
+    """True if value matches a schema from SCHEMAS"""
+    if not isinstance(value, schema["type"]):
+        return False
+    if isinstance(value, dict):
+        for key in schema.get("required", ()):
+            if key not in value:
+                return False
+        any_of = schema.get("required_any")
+        if any_of and not any(key in value for key in any_of):
+            return False
+        for key, expected in schema.get("fields", {}).items():
+            if key in value and not isinstance(value[key], expected):
+                return False
+        for key, nested in schema.get("nested", {}).items():
+            if key in value and not validate(value[key], nested):
+                return False
+    else:
+        if len(value) < schema.get("min_items", 0):
+            return False
+        items = schema.get("items")
+        if items and not all(validate(item, items) for item in value):
+            return False
+    return True
+
+
+def _match(value, schema):
+    """The value, or an array it wraps (e.g. {"flashcards": [...]}), that
+    matches schema; None if neither does"""
+    if schema is None or validate(value, schema):
+        return value
+    if isinstance(value, dict) and schema["type"] is list:
+        for inner in value.values():
+            if isinstance(inner, list) and validate(inner, schema):
+                return inner
+    return None
+
+
+def first_valid(candidates, schema=None):
+    """Parse raw candidates in order and return the first matching value.
+
+    A candidate that does not parse or match may have started at a bracket
+    in the prose (":-[" or "[1" left open swallows everything after it), so
+    the text after its opening bracket is scanned again, before the next
+    candidate, for the values inside it.
+    """
+    if isinstance(schema, str):
+        schema = SCHEMAS[schema]
+    pending = list(reversed(candidates))
+    while pending:
+        candidate = pending.pop()
+        value = loads_lenient(candidate)
+        if value is not None:
+            value = _match(value, schema)
+            if value is not None:
+                return value
+        scanner = JSONScanner()
+        inner = scanner.feed(candidate[1:]) + scanner.finish()
+        pending.extend(reversed(inner))
+    return None
+
+
+def extract_json(text, schema=None):
+    """Return the first JSON value in text that matches schema (a SCHEMAS
+    name or dict), or None"""
+    label = schema if isinstance(schema, str) else ""
+    with metrics.timed("parse", label):
+        scanner = JSONScanner()
+        value = first_valid(scanner.feed(text) + scanner.finish(), schema)
+    if value is None:
+        metrics.parse_failures.inc(schema=label)
+    return value
+
+
+# Replies the scanner has to get right: run ``python json_extract.py``
+CHECKS = [
+    ('Here you go: {"title": "T", "summary": "S"}', {"title": "T", "summary": "S"}),
+    ('```json\n{"title": "T", "summary": "S", "key_points": ["a",]}\n```',
+     {"title": "T", "summary": "S", "key_points": ["a"]}),
+    ('Use {"x": 1} like this: {"title": "T", "summary": "S"}', {"title": "T", "summary": "S"}),
+    ('Sure :-[ here you go {"title":"T","summary":"S"}', {"title": "T", "summary": "S"}),
+    ('Note (see [1 here) {"title":"T","summary":"S"}', {"title": "T", "summary": "S"}),
+    ('A [ list {"title":"T","summary":"S"} } then', {"title": "T", "summary": "S"}),
+    ('{"title": "T", "summary": "S cut', {"title": "T", "summary": "S cut"}),
+    ("No JSON here [at all", None),
+]
+
+
+if __name__ == "__main__":
+    for reply, expected in CHECKS:
+        whole = extract_json(reply, "notes")
+        scanner = JSONScanner()
+        streamed = []
+        for i in range(0, len(reply), 3):
+            streamed += scanner.feed(reply[i:i + 3])
+        streamed = first_valid(streamed + scanner.finish(), "notes")
+        assert whole == streamed == expected, (reply, whole, streamed)
+    print(f"{len(CHECKS)} scanner checks passed")
@@ -0,0 +1,304 @@
+"""Pluggable LLM backends used by the EduBot routes"""
+import hashlib
+import json
+import re
+import threading
+import time
+
+import metrics
+from config import Config
+from dispatcher import ModelDispatcher
+from retrieval import estimate_tokens
+
+# Routes that talk to the model; each one can be pointed at its own model
+ROUTES = ("chat", "notes", "quiz", "flashcards")
+
+# Separates the streamed answer from its trailing JSON metadata
+STREAM_META_MARKER = "<<<META>>>"
+
+
+class LLMBackend:
+    """Interface every model backend implements"""
+    name = "base"
+
+    def generate(self, prompt, route="chat"):
+        """Return the full model response text for a prompt"""
+        raise NotImplementedError
+
+    def stream(self, prompt, route="chat"):
+        """Yield the response text in chunks as it is generated"""
+        yield self.generate(prompt, route=route)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini backend (the production default)"""
+    name = "gemini"
+
+    def __init__(self, model_name, api_key=None):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or Config.GEMINI_API_KEY)
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt, route="chat"):
+        return self._model.generate_content(prompt).text
+
+    def stream(self, prompt, route="chat"):
+        for chunk in self._model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata) raise on .text
+                continue
+            if text:
+                yield text
+
+
+class FakeBackend(LLMBackend):
+    """Deterministic local stand-in for load tests and offline development.
+
+    Responses are either canned per route (loaded from a JSON file) or built
+    from templates that follow the JSON shape each route expects. Latency is
+    a fixed delay plus a jitter derived from the prompt hash, so the same
+    prompt always takes the same time and returns the same text.
+    """
+    name = "fake"
+
+    def __init__(self, latency=0.0, jitter=0.0, responses=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.responses = responses or {}
+
+    @classmethod
+    def from_config(cls):
+        responses = {}
+        if Config.FAKE_LLM_RESPONSES:
+            with open(Config.FAKE_LLM_RESPONSES, 'r', encoding='utf-8') as f:
+                responses = json.load(f)
+        return cls(Config.FAKE_LLM_LATENCY, Config.FAKE_LLM_JITTER, responses)
+
+    def _digest(self, prompt):
+        return hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+
+    def _delay(self, digest):
+        if self.jitter:
+            return self.latency + self.jitter * (int(digest[:8], 16) / 0xFFFFFFFF)
+        return self.latency
+
+    def generate(self, prompt, route="chat"):
+        digest = self._digest(prompt)
+        delay = self._delay(digest)
+        if delay > 0:
+            time.sleep(delay)
+        return self._respond(prompt, route, digest)
+
+    def stream(self, prompt, route="chat"):
+        """Stream the same text as generate(): a fifth of the delay passes
+        before the first chunk, the rest is spread over the remaining chunks"""
+        digest = self._digest(prompt)
+        delay = self._delay(digest)
+        chunks = re.findall(r'\S+\s*|\s+', self._respond(prompt, route, digest))
+        if delay > 0:
+            time.sleep(delay * 0.2)
+        per_chunk = delay * 0.8 / max(len(chunks), 1)
+        for chunk in chunks:
+            yield chunk
+            if per_chunk:
+                time.sleep(per_chunk)
+
+    def _respond(self, prompt, route, digest):
+        canned = self.responses.get(route)
+        if canned is not None:
+            if not isinstance(canned, str):
+                canned = json.dumps(canned)
+            return canned.replace("{digest}", digest[:8]).replace("{prompt_chars}", str(len(prompt)))
+
+        builder = getattr(self, f"_fake_{route}", self._fake_chat)
+        return builder(prompt, digest[:8])
+
+    def _fake_chat(self, prompt, tag):
+        match = re.search(r'^Current Question: (.*)$', prompt, re.MULTILINE)
+        question = match.group(1).strip() if match else "your question"
+        answer = (
+            f"Here is an explanation of **{question}** (ref {tag}).\n\n"
+            "Key ideas:\n"
+            "- The **core concept** and why it matters\n"
+            "- A worked example that applies it\n"
+            "- Common mistakes to avoid\n\n"
+            "Review your uploaded notes and try the practice questions to reinforce this."
+        )
+        meta = {
+            "follow_ups": [
+                f"Can you give another example of {question.rstrip('?')}?",
+                "How does this connect to the rest of the topic?",
+                "What should I review next?"
+            ],
+            "confidence": 0.9,
+            "topics": [question[:40]]
+        }
+        if STREAM_META_MARKER in prompt:
+            return f"{answer}\n{STREAM_META_MARKER}\n{json.dumps(meta)}"
+        return json.dumps({"response": answer, **meta})
+
+    def _fake_notes(self, prompt, tag):
+        match = re.search(r'^Subject: (.*)$', prompt, re.MULTILINE)
+        subject = match.group(1).strip() if match else "General Studies"
+        documents = re.findall(r'^=== DOCUMENT (\d+): (.*) ===$', prompt, re.MULTILINE)
+        if documents:
+            # Batched prompt: one notes object per document
+            return json.dumps([
+                {"document": int(number), **self._fake_note(f"{subject}: {filename}", tag)}
+                for number, filename in documents
+            ])
+        return json.dumps(self._fake_note(subject, tag))
+
+    def _fake_note(self, subject, tag):
+        return {
+            "title": f"{subject} notes ({tag})",
+            "summary": f"A structured overview of the uploaded {subject} material.",
+            "key_points": [f"{subject} key point {i}" for i in range(1, 6)],
+            "important_concepts": [f"{subject} concept {i}" for i in range(1, 4)],
+            "study_tips": ["Summarise each section in your own words", "Use spaced repetition"],
+            "potential_questions": [f"What is the main idea of {subject}?"],
+            "difficulty_level": "Intermediate",
+            "estimated_study_time": "30 minutes"
+        }
+
+    def _fake_quiz(self, prompt, tag):
+        match = re.search(r'with (\d+) questions', prompt)
+        count = int(match.group(1)) if match else 5
+        return json.dumps({
+            "quiz_title": f"Quiz {tag}",
+            "difficulty": "intermediate",
+            "total_questions": count,
+            "estimated_time": "5 minutes",
+            "questions": [
+                {
+                    "id": i,
+                    "question": f"Sample question {i}?",
+                    "options": ["Option A", "Option B", "Option C", "Option D"],
+                    "correct_answer": i % 4,
+                    "explanation": f"Option {'ABCD'[i % 4]} is correct for question {i}.",
+                    "topic": "General",
+                    "difficulty": "medium"
+                }
+                for i in range(1, count + 1)
+            ]
+        })
+
+    def _fake_flashcards(self, prompt, tag):
+        match = re.search(r'Create (\d+) educational flashcards', prompt)
+        count = int(match.group(1)) if match else 10
+        return json.dumps([
+            {
+                "id": i,
+                "term": f"Term {i} ({tag})",
+                "definition": f"Definition of term {i}",
+                "example": f"Example usage of term {i}",
+                "hint": "Link it to something you already know",
+                "category": "General",
+                "difficulty": "medium"
+            }
+            for i in range(1, count + 1)
+        ])
+
+
+def parse_route_models(spec):
+    """Parse "route=model,route=model" into a dict"""
+    route_models = {}
+    for item in (spec or "").split(','):
+        if '=' in item:
+            route, model_name = item.split('=', 1)
+            route_models[route.strip()] = model_name.strip()
+    return route_models
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def load_backend_library():
+    """Import the configured backend's SDK without creating a client.
+
+    Clients are built on first use (get_backend), so a missing API key
+    never stops the app from starting; the gunicorn master calls this to
+    preload the SDK for its workers.
+    """
+    if Config.LLM_BACKEND == "gemini":
+        import google.generativeai  # noqa: F401
+
+
+def model_for_route(route):
+    return parse_route_models(Config.LLM_ROUTE_MODELS).get(route, Config.LLM_MODEL)
+
+
+def get_backend(route="chat"):
+    """Return the (lazily created) backend that serves a route"""
+    backend_name = Config.LLM_BACKEND
+    model_name = model_for_route(route)
+    key = (backend_name, model_name)
+
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                if backend_name == "fake":
+                    backend = FakeBackend.from_config()
+                elif backend_name == "gemini":
+                    backend = GeminiBackend(model_name)
+                else:
+                    raise ValueError(f"Unknown LLM backend: {backend_name}")
+                _backends[key] = backend
+    return backend
+
+
+def set_backend(backend, route=None):
+    """Install a backend instance directly (used by benchmarks and tooling)"""
+    with _backends_lock:
+        if route is None:
+            _backends.clear()
+            for r in ROUTES:
+                _backends[(Config.LLM_BACKEND, model_for_route(r))] = backend
+        else:
+            _backends[(Config.LLM_BACKEND, model_for_route(route))] = backend
+
+
+# Every model call goes through one dispatcher: bounded concurrency, route
+# priority (chat first) and coalescing of identical in-flight prompts
+dispatcher = ModelDispatcher(
+    max_concurrency=Config.MODEL_MAX_CONCURRENCY,
+    priorities=[r.strip() for r in Config.MODEL_ROUTE_PRIORITY.split(',')],
+    queue_timeout=Config.MODEL_QUEUE_TIMEOUT
+)
+
+
+def generate_text(prompt, route="chat"):
+    """Run a prompt through the backend configured for a route"""
+    backend = get_backend(route)
+    metrics.model_tokens.inc(estimate_tokens(prompt), route=route, direction="in")
+    with metrics.timed("model", route):
+        text = dispatcher.run(route, prompt, lambda: backend.generate(prompt, route=route))
+    metrics.model_tokens.inc(estimate_tokens(text or ""), route=route, direction="out")
+    return text
+
+
+def _measured_stream(chunks, route):
+    """Pass chunks through, recording the whole stream as one model call"""
+    received = []
+    try:
+        with metrics.timed("model", route):
+            for chunk in chunks:
+                received.append(chunk)
+                yield chunk
+    finally:
+        chunks.close()
+        metrics.model_tokens.inc(estimate_tokens("".join(received)), route=route, direction="out")
+
+
+def stream_text(prompt, route="chat"):
+    """Stream a prompt through the backend configured for a route"""
+    backend = get_backend(route)
+    metrics.model_tokens.inc(estimate_tokens(prompt), route=route, direction="in")
+    return _measured_stream(dispatcher.stream(route, lambda: backend.stream(prompt, route=route)), route)
@@ -0,0 +1,106 @@
+"""Single-pass Markdown to HTML renderer for chat replies"""
+import html
+import re
+
+FENCE_RE = re.compile(r"^\s*```\s*([\w+-]*)")
+HEADING_RE = re.compile(r"^\s*(#{1,3})\s+(.*?)\s*#*\s*$")
+LIST_ITEM_RE = re.compile(r"^([ \t]*)(?:([-*•])|(\d{1,9})[.)])\s+(.*)$")
+INLINE_RE = re.compile(
+    r"`([^`\n]+)`"                              # inline code
+    r"|\*\*(?=\S)(.+?)(?<=\S)\*\*"              # **strong**
+    r"|\*(?=[^\s*])(.+?)(?<=[^\s*])\*"          # *emphasis*
+)
+
+LIST_CLASS = "message-list"
+
+
+def _inline_match(match):
+    code, strong, emphasis = match.groups()
+    if code is not None:
+        return f"<code>{code}</code>"
+    if strong is not None:
+        return f"<strong>{INLINE_RE.sub(_inline_match, strong)}</strong>"
+    return f"<em>{INLINE_RE.sub(_inline_match, emphasis)}</em>"
+
+
+def render_inline(text):
+    """Escape a line of text and render code, strong and emphasis spans"""
+    return INLINE_RE.sub(_inline_match, html.escape(text, quote=False))
+
+
+def _indent_width(prefix):
+    return len(prefix.expandtabs(4))
+
+
+def _code_block(lines):
+    return "<pre><code>" + html.escape("\n".join(lines), quote=False) + "</code></pre>"
+
+
+def render_markdown(text):
+    """Render model Markdown as HTML for the chat UI.
+
+    Lines are processed once, in order: fenced code becomes ``<pre><code>``,
+    ``#``-``###`` headings become ``<h1>``-``<h3>``, bullet and numbered items
+    become ``message-list`` lists (nested by indentation, numbered lists keep
+    their start number), other lines become ``<p>`` and blank lines ``<br>``.
+    All text is HTML-escaped before any markup is added.
+    """
+    out = []
+    lists = []          # open lists, innermost last: (indent, tag)
+    code_lines = None   # lines of the open fenced block, if any
+
+    def close_lists(indent=-1):
+        while lists and lists[-1][0] > indent:
+            out.append(f"</li></{lists.pop()[1]}>")
+
+    for line in text.split("\n"):
+        if code_lines is not None:
+            if FENCE_RE.match(line):
+                out.append(_code_block(code_lines))
+                code_lines = None
+            else:
+                code_lines.append(line)
+            continue
+
+        item = LIST_ITEM_RE.match(line)
+        if item:
+            prefix, bullet, number, body = item.groups()
+            indent = _indent_width(prefix)
+            tag = "ul" if bullet else "ol"
+            close_lists(indent)
+            if lists and lists[-1][0] == indent and lists[-1][1] != tag:
+                # Same level, different list type: start a new list
+                out.append(f"</li></{lists.pop()[1]}>")
+            if lists and lists[-1][0] == indent:
+                out.append("</li>")
+            else:
+                start = f' start="{int(number)}"' if number and int(number) != 1 else ""
+                out.append(f'<{tag} class="{LIST_CLASS}"{start}>')
+                lists.append((indent, tag))
+            out.append(f"<li>{render_inline(body)}")
+            continue
+
+        stripped = line.strip()
+        if lists and stripped and _indent_width(line[:len(line) - len(line.lstrip())]) > lists[-1][0]:
+            # Indented continuation of the current list item
+            out.append(f"<br>{render_inline(stripped)}")
+            continue
+        close_lists()
+
+        if FENCE_RE.match(line):
+            code_lines = []
+            continue
+        heading = HEADING_RE.match(line)
+        if heading:
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{render_inline(heading.group(2))}</h{level}>")
+        elif stripped:
+            out.append(f"<p>{render_inline(stripped)}</p>")
+        else:
+            out.append("<br>")
+
+    close_lists()
+    if code_lines is not None:
+        # Unterminated fence (e.g. a truncated reply)
+        out.append(_code_block(code_lines))
+    return "\n".join(out)
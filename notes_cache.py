@@ -0,0 +1,189 @@
+"""Content-addressed caches for generated study notes, quizzes and flashcards"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(content, subject="", prompt_version=""):
+    """Hash the exact model input together with the subject and prompt version"""
+    digest = hashlib.sha256()
+    for part in (prompt_version, subject, content):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def study_key(kind, content_hashes, topic="", difficulty="", count=0, prompt_version=""):
+    """Key for a generated quiz or flashcard deck: the hashes of the notes it
+    was built from plus the request parameters"""
+    params = f"{kind}|{topic.strip().lower()}|{difficulty.strip().lower()}|{count}"
+    return content_key("\n".join(sorted(content_hashes)), params, prompt_version)
+
+
+class NotesCache:
+    """LRU cache of structured notes keyed by content hash.
+
+    The in-memory tier holds at most ``max_entries`` results and evicts the
+    least recently used one. When ``disk_dir`` is set, every result is also
+    written there as JSON so it survives restarts and is shared by workers;
+    a memory miss falls through to disk and promotes the entry. With
+    ``ttl`` (seconds) entries older than that count as misses in both tiers.
+
+    The disk tier is kept under ``max_disk_bytes`` (0 = no limit) by
+    deleting the least recently used files, by access time, which a disk
+    hit sets explicitly; the modification time stays the write time the
+    TTL is measured from. Other workers write to the same directory, so
+    its size is rescanned every ``disk_scan_interval`` seconds as well as
+    whenever this process's own writes would pass the limit.
+    """
+
+    # Seconds between rescans of the disk tier's size
+    disk_scan_interval = 60
+    # A prune deletes down to this fraction of max_disk_bytes
+    disk_low_water = 0.9
+
+    def __init__(self, max_entries=256, disk_dir=None, ttl=None, max_disk_bytes=0):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = None     # size of the disk tier at the last scan plus later writes
+        self._disk_scanned_at = 0.0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and stored_at < time.time() - self.ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, *entry)
+        return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value, time.time())
+        self._write_disk(key, value)
+
+    def _store(self, key, value, stored_at):
+        self._entries[key] = (value, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key):
+        """Return (value, stored_at) from the disk tier, or None"""
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if self._expired(stored_at):
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            if self.max_disk_bytes:
+                os.utime(path, (time.time(), stored_at))
+            return value, stored_at
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Notes cache write error: {e}")
+            return
+        if self.max_disk_bytes:
+            self._bound_disk(size)
+
+    def _bound_disk(self, written):
+        with self._disk_lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += written
+            if (self._disk_bytes is not None and self._disk_bytes <= self.max_disk_bytes
+                    and time.monotonic() - self._disk_scanned_at < self.disk_scan_interval):
+                return
+            self._disk_scanned_at = time.monotonic()
+            files = []
+            for root, _, names in os.walk(self.disk_dir):
+                for name in names:
+                    if not name.endswith(".json"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_atime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            if total > self.max_disk_bytes:
+                files.sort()
+                for _, size, path in files:
+                    if total <= self.max_disk_bytes * self.disk_low_water:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    self.disk_evictions += 1
+            self._disk_bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "disk_tier": bool(self.disk_dir),
+                "max_disk_bytes": self.max_disk_bytes,
+                "disk_bytes": self._disk_bytes,
+                "disk_evictions": self.disk_evictions
+            }
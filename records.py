@@ -0,0 +1,231 @@
+"""Compact in-memory records for chat messages and processed notes"""
+import json
+import sys
+import uuid
+import zlib
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Shorter text is kept as is; compressing it saves little
+COMPRESS_MIN_CHARS = 256
+
+_MISSING = object()
+
+
+def _same(value, compress=False):
+    return value
+
+
+def _intern(value, compress=False):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _pack_timestamp(value, compress=False):
+    """ISO timestamp without a timezone -> integer microseconds since the
+    epoch; anything that would not round-trip exactly is kept as is"""
+    if isinstance(value, str):
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        if moment.tzinfo is None and moment.isoformat() == value:
+            return (moment - EPOCH) // MICROSECOND
+    return value
+
+
+def _unpack_timestamp(value):
+    if isinstance(value, int):
+        return (EPOCH + timedelta(microseconds=value)).isoformat()
+    return value
+
+
+def _pack_uuid(value, compress=False):
+    """Canonical UUID string -> its 16 bytes"""
+    if isinstance(value, str) and len(value) == 36:
+        try:
+            packed = uuid.UUID(value)
+        except ValueError:
+            return value
+        if str(packed) == value:
+            return packed.bytes
+    return value
+
+
+def _unpack_uuid(value):
+    if isinstance(value, bytes):
+        h = value.hex()     # same as str(uuid.UUID(bytes=value)), without the object
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    return value
+
+
+def _pack_list(value, compress=False):
+    return tuple(_intern(item) for item in value) if isinstance(value, list) else value
+
+
+def _unpack_list(value):
+    return list(value) if isinstance(value, tuple) else value
+
+
+def _pack_text(value, compress=False):
+    if compress and isinstance(value, str) and len(value) >= COMPRESS_MIN_CHARS:
+        return zlib.compress(value.encode("utf-8"))
+    return value
+
+
+def _unpack_text(value):
+    return zlib.decompress(value).decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _pack_json(value, compress=False):
+    """Nested dicts/lists -> one compact JSON string (or compressed bytes)"""
+    if not isinstance(value, (dict, list)):
+        return value
+    try:
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return value
+    packed = _pack_text(text, compress)
+    return packed if isinstance(packed, bytes) else _JSON(text)
+
+
+def _unpack_json(value):
+    if isinstance(value, bytes):
+        return json.loads(zlib.decompress(value).decode("utf-8"))
+    if isinstance(value, _JSON):
+        return json.loads(value)
+    return value
+
+
+class _JSON(str):
+    """Marks a string holding serialized JSON (as opposed to a plain value)"""
+    __slots__ = ()
+
+
+def _deep_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(_deep_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in value.items())
+    return size
+
+
+class Record(Mapping):
+    """Read-only mapping over a dict's data, stored in slots.
+
+    Known keys (FIELDS, each with a pack and unpack function) are kept in
+    a compact form: interned strings, integer timestamps, UUID bytes, tuples
+    and compressed text. Any other key goes to a small overflow dict.
+    Reading a key unpacks just that value, and to_dict() gives back a dict
+    that serializes to the same JSON as the original.
+    """
+    __slots__ = ("_extra",)
+    FIELDS = {}
+    _codecs = {}    # key -> (slot name, pack, unpack), built from FIELDS
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._codecs = {key: ("_" + key, pack, unpack) for key, (pack, unpack) in cls.FIELDS.items()}
+
+    def __init__(self, data, compress=False):
+        extra = None
+        codecs = self._codecs
+        for key, value in data.items():
+            codec = codecs.get(key)
+            if codec is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+            else:
+                setattr(self, codec[0], codec[1](value, compress))
+        self._extra = extra
+
+    def __getitem__(self, key):
+        codec = self._codecs.get(key)
+        if codec is None:
+            if self._extra is not None and key in self._extra:
+                return self._extra[key]
+            raise KeyError(key)
+        value = getattr(self, codec[0], _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return codec[2](value)
+
+    def __contains__(self, key):
+        codec = self._codecs.get(key)
+        if codec is not None:
+            return hasattr(self, codec[0])
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key, codec in self._codecs.items():
+            if hasattr(self, codec[0]):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self):
+        data = {}
+        for key, (slot, _, unpack) in self._codecs.items():
+            value = getattr(self, slot, _MISSING)
+            if value is not _MISSING:
+                data[key] = unpack(value)
+        if self._extra is not None:
+            data.update(self._extra)
+        return data
+
+    def nbytes(self):
+        """Approximate memory held by this record"""
+        size = sys.getsizeof(self) + _deep_size(self._extra)
+        for slot, _, _ in self._codecs.values():
+            value = getattr(self, slot, None)
+            if value is not None:
+                size += _deep_size(value)
+        return size
+
+
+def _slots(fields):
+    return tuple("_" + key for key in fields)
+
+
+class Message(Record):
+    """One chat message (user or assistant)"""
+    FIELDS = {
+        "id": (_pack_uuid, _unpack_uuid),
+        "role": (_intern, _same),
+        "content": (_same, _same),
+        "timestamp": (_pack_timestamp, _unpack_timestamp),
+        "follow_ups": (_pack_list, _unpack_list),
+        "confidence": (_same, _same),
+        "topics": (_pack_list, _unpack_list),
+    }
+    __slots__ = _slots(FIELDS)
+
+
+class Note(Record):
+    """Processed notes of one uploaded file; with compress=True the raw
+    content and structured notes are zlib-compressed and only decompressed
+    when read"""
+    FIELDS = {
+        "id": (_intern, _same),
+        "filename": (_same, _same),
+        "subject": (_intern, _same),
+        "content": (_pack_text, _unpack_text),
+        "content_hash": (_same, _same),
+        "structured_notes": (_pack_json, _unpack_json),
+        "session_id": (_intern, _same),
+        "blob_id": (_same, _same),
+        "processed_at": (_pack_timestamp, _unpack_timestamp),
+        "file_size": (_same, _same),
+        "file_type": (_intern, _same),
+    }
+    __slots__ = _slots(FIELDS)
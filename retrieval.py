@@ -0,0 +1,239 @@
+"""Chunked BM25 retrieval over a session's uploaded notes"""
+import math
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my of on or so than that the their them then there these they this to was we what
+when where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lower-case word tokens without stopwords"""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    """Rough model token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def chunk_text(text, chunk_chars=800):
+    """Split text into chunks of whole sentences, at most chunk_chars each"""
+    chunks = []
+    current = []
+    size = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        for sentence in SENTENCE_RE.split(paragraph.strip()):
+            sentence = " ".join(sentence.split())
+            while len(sentence) > chunk_chars:
+                # Hard-split run-on text (e.g. PDF extraction without punctuation)
+                cut = sentence.rfind(" ", 0, chunk_chars)
+                cut = cut if cut > 0 else chunk_chars
+                if current:
+                    chunks.append(" ".join(current))
+                    current, size = [], 0
+                chunks.append(sentence[:cut])
+                sentence = sentence[cut:].strip()
+            if not sentence:
+                continue
+            if size + len(sentence) > chunk_chars and current:
+                chunks.append(" ".join(current))
+                current, size = [], 0
+            current.append(sentence)
+            size += len(sentence) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def content_chunks(text, target_chars=12000):
+    """Split text at sentence ends into chunks of about target_chars, with
+    boundaries chosen by content: a chunk ends after a sentence whose hash
+    hits, once it holds half the target (and at twice the target in any
+    case). Unlike chunk_text, an edit only changes the chunks around it;
+    the others come out identical, so per-chunk work (cached summaries)
+    can be reused. The text is kept as is, whitespace included."""
+    min_chars, max_chars = target_chars // 2, target_chars * 2
+    # About one hit per target_chars / 2 of prose with ~120-character sentences
+    modulus = max(1, target_chars // 240)
+    chunks = []
+    start = sentence_start = 0
+    for match in SENTENCE_RE.finditer(text):
+        if match.end() - start > max_chars and sentence_start > start:
+            # No hit in time: end the chunk at the previous sentence
+            chunks.append(text[start:sentence_start])
+            start = sentence_start
+        sentence = text[sentence_start:match.start()]
+        sentence_start = match.end()
+        if match.end() - start >= min_chars and zlib.crc32(sentence.encode("utf-8")) % modulus == 0:
+            chunks.append(text[start:match.end()])
+            start = match.end()
+    if len(text) - start > max_chars and sentence_start > start:
+        chunks.append(text[start:sentence_start])
+        start = sentence_start
+    chunks.append(text[start:])
+
+    sized = []
+    for chunk in chunks:
+        while len(chunk) > max_chars:
+            # Run-on text (e.g. PDF extraction without punctuation) is cut at a space
+            cut = chunk.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            sized.append(chunk[:cut])
+            chunk = chunk[cut:]
+        sized.append(chunk)
+    return [chunk for chunk in sized if chunk.strip()]
+
+
+class BM25Index:
+    """Incremental Okapi BM25 index over text chunks"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = []        # (source, text)
+        self.lengths = []
+        self.postings = {}      # term -> [(chunk_index, term_frequency)]
+        self.total_length = 0
+
+    def add(self, source, chunks):
+        for text in chunks:
+            terms = tokenize(text)
+            index = len(self.chunks)
+            self.chunks.append((source, text))
+            self.lengths.append(len(terms))
+            self.total_length += len(terms)
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, []).append((index, tf))
+
+    def search(self, query, k=5):
+        """Return up to k (score, source, text) results, best first"""
+        if not self.chunks:
+            return []
+        n = len(self.chunks)
+        avg_length = self.total_length / n or 1
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, tf in postings:
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[index] / avg_length)
+                scores[index] = scores.get(index, 0.0) + idf * tf * (self.k1 + 1) / norm
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, *self.chunks[index]) for index, score in best]
+
+
+class SessionIndexes:
+    """One BM25 index per session, filled as uploads are processed.
+
+    At most ``max_sessions`` sessions are indexed, least recently used
+    evicted first; sync() rebuilds an evicted session's index on its next
+    chat.
+    """
+
+    def __init__(self, chunk_chars=800, max_sessions=2000):
+        self.chunk_chars = chunk_chars
+        self.max_sessions = max_sessions
+        self._indexes = {}
+        self._documents = OrderedDict()     # session_id -> {source: chunks}, least recently used first
+        self._lock = threading.Lock()
+
+    def _use(self, session_id):
+        """The session's documents, created if missing and marked as recently used"""
+        documents = self._documents.get(session_id)
+        if documents is None:
+            documents = self._documents[session_id] = {}
+            while len(self._documents) > self.max_sessions:
+                evicted, _ = self._documents.popitem(last=False)
+                self._indexes.pop(evicted, None)
+        self._documents.move_to_end(session_id)
+        return documents
+
+    def add_document(self, session_id, source, text):
+        """Chunk and index a document, replacing an earlier version of it"""
+        chunks = chunk_text(text, self.chunk_chars)
+        with self._lock:
+            documents = self._use(session_id)
+            previous = documents.get(source)
+            if previous == chunks:
+                return
+            documents[source] = chunks
+            if previous is None:
+                self._indexes.setdefault(session_id, BM25Index()).add(source, chunks)
+            else:
+                # A re-uploaded file changed; rebuild this session's index
+                index = BM25Index()
+                for doc_source, doc_chunks in documents.items():
+                    index.add(doc_source, doc_chunks)
+                self._indexes[session_id] = index
+
+    def has(self, session_id):
+        return session_id in self._indexes
+
+    def sync(self, session_id, sources, load_text):
+        """Make a session's index cover exactly ``sources``.
+
+        A document missing from the index (uploaded through another worker
+        process, or its session evicted here) is loaded with
+        load_text(source), and documents no longer in the session are
+        dropped.
+        """
+        with self._lock:
+            known = set(self._use(session_id))
+        wanted = set(sources)
+        if known == wanted:
+            return
+
+        for source in wanted - known:
+            text = load_text(source)
+            if text:
+                self.add_document(session_id, source, text)
+
+        stale = known - wanted
+        if stale:
+            with self._lock:
+                documents = self._use(session_id)
+                for source in stale:
+                    documents.pop(source, None)
+                index = BM25Index()
+                for doc_source, doc_chunks in documents.items():
+                    index.add(doc_source, doc_chunks)
+                self._indexes[session_id] = index
+
+    def top_chunks(self, session_id, query, token_budget, k=8):
+        """Best-matching chunks for a query that together fit token_budget"""
+        with self._lock:
+            index = self._indexes.get(session_id)
+            results = index.search(query, k) if index else []
+
+        selected = []
+        used = 0
+        for score, source, text in results:
+            cost = estimate_tokens(text)
+            if used + cost > token_budget:
+                continue
+            selected.append((source, text))
+            used += cost
+        return selected
+
+    def drop(self, session_id):
+        with self._lock:
+            self._indexes.pop(session_id, None)
+            self._documents.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._indexes),
+                "chunks": sum(len(index.chunks) for index in self._indexes.values())
+            }
@@ -2,6 +2,7 @@
 class EduBotApp {
     constructor() {
         this.currentSessionId = localStorage.getItem('sessionId') || this.generateSessionId();
+        this.ownerId = localStorage.getItem('ownerId') || this.generateOwnerId();
         this.isTyping = false;
         this.uploadedFiles = new Map();
         this.messageHistory = [];
@@ -85,6 +86,13 @@ class EduBotApp {
         return id;
     }
 
+    generateOwnerId() {
+        // Identifies this browser so the history only lists its own sessions
+        const id = 'owner-' + Math.random().toString(36).substr(2, 9) + Date.now().toString(36);
+        localStorage.setItem('ownerId', id);
+        return id;
+    }
+
     loadTheme() {
         const savedTheme = localStorage.getItem('theme') || 'dark';
         if (savedTheme === 'light') {
@@ -149,45 +157,190 @@ class EduBotApp {
         const typingIndicator = this.showTypingIndicator();
 
         try {
-            const response = await fetch('/chat', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-Session-ID': this.currentSessionId
-                },
-                body: JSON.stringify({
-                    message: message,
-                    session_id: this.currentSessionId
-                })
-            });
-
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
+            if (window.ReadableStream && window.TextDecoder) {
+                await this.streamChat(message, typingIndicator);
+            } else {
+                await this.requestChat(message, typingIndicator);
             }
+        } catch (error) {
+            console.error('Chat error:', error);
+            this.removeTypingIndicator(typingIndicator);
+            this.isTyping = false;
+            this.addMessage('Connection error. Please check your internet and try again.', 'assistant');
+        }
+    }
 
-            const data = await response.json();
+    async requestChat(message, typingIndicator) {
+        const response = await fetch('/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Session-ID': this.currentSessionId,
+                'X-Owner-ID': this.ownerId
+            },
+            body: JSON.stringify({
+                message: message,
+                session_id: this.currentSessionId
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const data = await response.json();
 
-            // Remove typing indicator
+        // Remove typing indicator
+        this.removeTypingIndicator(typingIndicator);
+        this.isTyping = false;
+
+        if (data.error) {
+            this.addMessage('Sorry, I encountered an error. Please try again! 🤖', 'assistant');
+        } else {
+            this.updateSessionId(data.session_id);
+            this.addMessage(data.response, 'assistant', data.follow_ups);
+        }
+    }
+
+    async streamChat(message, typingIndicator) {
+        const response = await fetch('/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Session-ID': this.currentSessionId,
+                'X-Owner-ID': this.ownerId
+            },
+            body: JSON.stringify({
+                message: message,
+                session_id: this.currentSessionId
+            })
+        });
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        // Empty messages get a plain JSON reply instead of a stream
+        if (!(response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+            const data = await response.json();
             this.removeTypingIndicator(typingIndicator);
             this.isTyping = false;
+            this.addMessage(data.response, 'assistant');
+            return;
+        }
 
-            if (data.error) {
-                this.addMessage('Sorry, I encountered an error. Please try again! 🤖', 'assistant');
-            } else {
-                // Update session ID if provided
-                if (data.session_id) {
-                    this.currentSessionId = data.session_id;
-                    localStorage.setItem('sessionId', data.session_id);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamed = null;
+        let finished = false;
+
+        while (!finished) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = this.parseSseEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (!event) continue;
+
+                if (event.type === 'token') {
+                    if (!streamed) {
+                        this.removeTypingIndicator(typingIndicator);
+                        streamed = this.addStreamingMessage();
+                    }
+                    streamed.text.textContent += event.data.text;
+                    this.scrollToBottom();
+                } else if (event.type === 'done') {
+                    this.removeTypingIndicator(typingIndicator);
+                    this.updateSessionId(event.data.session_id);
+                    if (streamed) {
+                        this.finishStreamingMessage(streamed, event.data.response, event.data.follow_ups);
+                    } else {
+                        this.addMessage(event.data.response, 'assistant', event.data.follow_ups);
+                    }
+                    finished = true;
+                } else if (event.type === 'error') {
+                    this.removeTypingIndicator(typingIndicator);
+                    if (streamed) streamed.div.remove();
+                    this.addMessage('Sorry, I encountered an error. Please try again! 🤖', 'assistant');
+                    finished = true;
                 }
-                this.addMessage(data.response, 'assistant', data.follow_ups);
             }
+        }
 
-        } catch (error) {
-            console.error('Chat error:', error);
+        if (!finished) {
             this.removeTypingIndicator(typingIndicator);
-            this.isTyping = false;
+            if (streamed) streamed.div.remove();
             this.addMessage('Connection error. Please check your internet and try again.', 'assistant');
         }
+        this.isTyping = false;
+    }
+
+    parseSseEvent(raw) {
+        let type = 'message';
+        const dataLines = [];
+        raw.split('\n').forEach(line => {
+            if (line.startsWith('event:')) {
+                type = line.slice(6).trim();
+            } else if (line.startsWith('data:')) {
+                dataLines.push(line.slice(5).trim());
+            }
+        });
+        if (dataLines.length === 0) return null;
+        try {
+            return { type, data: JSON.parse(dataLines.join('\n')) };
+        } catch (error) {
+            console.error('Bad stream event:', error);
+            return null;
+        }
+    }
+
+    updateSessionId(sessionId) {
+        // Update session ID if provided
+        if (sessionId) {
+            this.currentSessionId = sessionId;
+            localStorage.setItem('sessionId', sessionId);
+        }
+    }
+
+    addStreamingMessage() {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message message-assistant';
+        messageDiv.setAttribute('data-message-id', Date.now());
+        messageDiv.innerHTML = `
+            <div class="message-avatar">
+                <div class="avatar-gradient"></div>
+                <span>✨</span>
+            </div>
+            <div class="message-content"><p class="streaming-text"></p></div>
+        `;
+
+        const welcomeMessage = this.chatMessages.querySelector('.welcome-message');
+        if (welcomeMessage && this.messageHistory.length === 0) {
+            welcomeMessage.remove();
+        }
+
+        this.chatMessages.appendChild(messageDiv);
+        this.scrollToBottom();
+        return {
+            div: messageDiv,
+            content: messageDiv.querySelector('.message-content'),
+            text: messageDiv.querySelector('.streaming-text')
+        };
+    }
+
+    finishStreamingMessage(streamed, content, followUps = []) {
+        // Swap the raw streamed text for the server-rendered HTML
+        streamed.content.innerHTML = `
+            ${content}
+            ${followUps.length > 0 ? this.createFollowUps(followUps) : ''}
+        `;
+        this.scrollToBottom();
+        this.messageHistory.push({ role: 'assistant', content, timestamp: new Date().toISOString() });
     }
 
     addMessage(content, role, followUps = []) {
@@ -337,7 +490,8 @@ class EduBotApp {
             const response = await fetch('/upload', {
                 method: 'POST',
                 headers: {
-                    'X-Session-ID': this.currentSessionId
+                    'X-Session-ID': this.currentSessionId,
+                    'X-Owner-ID': this.ownerId
                 },
                 body: formData
             });
@@ -346,15 +500,15 @@ class EduBotApp {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
-            const data = await response.json();
+            let data = await response.json();
+            this.updateSessionId(data.session_id);
 
-            // Update session ID if provided
-            if (data.session_id) {
-                this.currentSessionId = data.session_id;
-                localStorage.setItem('sessionId', data.session_id);
+            // Uploads are processed in the background by default; poll until done
+            if (response.status === 202 && data.job_id) {
+                data = await this.waitForUploadJob(data.status_url || `/upload/jobs/${data.job_id}`);
             }
 
-            if (data.status === 'success') {
+            if (data.status === 'success' || (data.processed_files && data.processed_files.length > 0)) {
                 this.showUploadSuccess(data);
                 this.addMessage(
                     `Great! I've processed ${data.processed_files.length} file(s). What would you like to know about them?`,
@@ -376,6 +530,49 @@ class EduBotApp {
         }
     }
 
+    async waitForUploadJob(statusUrl) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+
+            const response = await fetch(statusUrl);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            const job = await response.json();
+            this.showUploadProgress(job);
+            if (job.done) {
+                return job;
+            }
+        }
+    }
+
+    showUploadProgress(job) {
+        if (this.filePreview) {
+            job.files.forEach(file => {
+                const item = this.filePreview.querySelector(`[data-filename="${CSS.escape(file.filename)}"]`);
+                const statusText = item && item.querySelector('.status-text');
+                if (statusText) {
+                    statusText.textContent = {
+                        queued: 'Queued...',
+                        processing: 'Processing...',
+                        success: 'Done',
+                        error: file.error || 'Failed'
+                    }[file.status] || file.status;
+                }
+            });
+        }
+
+        if (this.uploadStatus) {
+            const finished = job.files.filter(f => f.status === 'success' || f.status === 'error').length;
+            this.uploadStatus.innerHTML = `
+                <div class="upload-status info">
+                    ⏳ Processed ${finished} of ${job.files.length} file(s)...
+                </div>
+            `;
+        }
+    }
+
     showUploadSuccess(data) {
         if (!this.uploadStatus) return;
         
@@ -417,7 +614,8 @@ class EduBotApp {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'X-Session-ID': this.currentSessionId
+                    'X-Session-ID': this.currentSessionId,
+                    'X-Owner-ID': this.ownerId
                 },
                 body: JSON.stringify({ topic, difficulty, num_questions: 5 })
             });
@@ -578,7 +776,8 @@ class EduBotApp {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'X-Session-ID': this.currentSessionId
+                    'X-Session-ID': this.currentSessionId,
+                    'X-Owner-ID': this.ownerId
                 },
                 body: JSON.stringify({ topic, num_cards: Math.min(numCards, 20) })
             });
@@ -676,7 +875,9 @@ class EduBotApp {
 
     async loadSessionHistory() {
         try {
-            const response = await fetch('/sessions');
+            const response = await fetch('/sessions', {
+                headers: { 'X-Owner-ID': this.ownerId }
+            });
             if (response.ok) {
                 const data = await response.json();
                 this.displaySessionHistory(data.sessions);
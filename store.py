@@ -0,0 +1,946 @@
+"""Session and processed-notes storage"""
+import base64
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from records import Message, Note
+
+
+def new_session(session_id):
+    return {
+        "id": session_id,
+        "created_at": datetime.now().isoformat(),
+        "message_history": [],
+        "files": [],
+        "preferences": {}
+    }
+
+
+def subject_key(subject):
+    """Normalised subject used for topic lookups ("  Cell Biology" == "cell biology")"""
+    return " ".join((subject or "").casefold().split())
+
+
+def message_preview(message):
+    """Session-list preview text for a user message"""
+    content = message.get("content", "")
+    return content[:50] + "..." if len(content) > 50 else content
+
+
+def encode_cursor(key):
+    """Opaque page cursor for an (activity, session_id) position"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor"""
+    try:
+        activity, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(activity), str(session_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def approx_size(obj):
+    """Approximate memory cost of a record by its serialized size"""
+    if hasattr(obj, "nbytes"):
+        return obj.nbytes()
+    return len(json.dumps(obj, default=str))
+
+
+class SessionStore:
+    """Interface for storing sessions and the notes of their uploaded files.
+
+    Session dicts keep the shape the API has always returned (``id``,
+    ``created_at``, ``message_history``, ``files``, ``preferences``). Records
+    returned by the store are read-only views: change them through the
+    store methods so every implementation sees the update.
+
+    Notes are indexed by session and, within a session, by normalised
+    subject, so finding a session's notes for a topic never scans the notes
+    of other sessions. Each session also has a summary (last activity,
+    message and file counts, preview) that is updated as it is written and
+    kept in last-activity order, overall and per owner, so listing one page
+    of sessions costs the same however many sessions exist.
+    """
+
+    # True when every worker process sees the same data
+    shared = False
+
+    def __init__(self):
+        self._evict_callbacks = []
+
+    def on_evict(self, callback):
+        """Register callback(session_id) for sessions removed by TTL or size limits"""
+        self._evict_callbacks.append(callback)
+
+    def _notify_evicted(self, session_ids):
+        for session_id in session_ids:
+            for callback in self._evict_callbacks:
+                try:
+                    callback(session_id)
+                except Exception as e:
+                    print(f"Evict callback error: {e}")
+
+    def get_session(self, session_id):
+        raise NotImplementedError
+
+    def get_or_create_session(self, session_id, owner=None):
+        """Return a session, creating it if needed; ``owner`` is recorded
+        for a new session (or one created without an owner)"""
+        raise NotImplementedError
+
+    def append_messages(self, session_id, messages, keep=50):
+        """Append messages, keeping only the most recent ``keep``"""
+        raise NotImplementedError
+
+    def add_file(self, session_id, file_key):
+        raise NotImplementedError
+
+    def session_version(self, session_id):
+        """(version, modified_at) of a session, or None if it does not exist.
+
+        The version goes up whenever the session's messages, files or notes
+        change; with the modification time (epoch seconds) it identifies
+        what get_session and session_notes return, for HTTP validators.
+        """
+        raise NotImplementedError
+
+    def session_page(self, owner=None, limit=20, before=None):
+        """One page of session summaries, most recently active first.
+
+        ``before`` is the (activity, session_id) key of the last summary of
+        the previous page. Returns (summaries, next_key), next_key being None
+        on the last page.
+        """
+        raise NotImplementedError
+
+    def count_owner_sessions(self, owner):
+        raise NotImplementedError
+
+    def delete_session(self, session_id):
+        """Delete a session and its notes; returns False if it did not exist"""
+        raise NotImplementedError
+
+    def get_note(self, file_key):
+        raise NotImplementedError
+
+    def put_note(self, note):
+        raise NotImplementedError
+
+    def add_note(self, note):
+        """put_note plus add_file for note["session_id"], in one step and
+        only if that session still exists (it may have been deleted while
+        the upload was processed); returns False, storing nothing, if not"""
+        raise NotImplementedError
+
+    def session_notes(self, session_id, subject=None):
+        """Notes uploaded to a session in upload order, optionally only those
+        whose subject matches ``subject`` (compared via subject_key)"""
+        raise NotImplementedError
+
+    def add_blob_ref(self, session_id, blob_id):
+        """Record that a session uses an uploaded file (see UploadStore)"""
+        raise NotImplementedError
+
+    def release_blob_refs(self, session_id):
+        """Drop a session's file references; returns the blob ids that no
+        session references any more"""
+        raise NotImplementedError
+
+    def delete_if_unreferenced(self, blob_id, delete):
+        """Call delete(blob_id) if no session references the file, holding
+        the lock add_blob_ref takes: an upload of the same content racing
+        with it either keeps the file or finds it gone and stores it again"""
+        raise NotImplementedError
+
+    def put_job(self, job):
+        """Publish upload-job state for other workers (shared stores only)"""
+
+    def get_job(self, job_id):
+        return None
+
+    def prune_jobs(self, max_age):
+        pass
+
+    def count_sessions(self):
+        raise NotImplementedError
+
+    def count_notes(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class _ActivityIndex:
+    """(activity, session_id) keys in sorted order, seekable by key"""
+
+    def __init__(self):
+        self._keys = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        bisect.insort(self._keys, key)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def before(self, key=None):
+        """Keys older than ``key`` (all keys if None), newest first"""
+        i = bisect.bisect_left(self._keys, key) if key is not None else len(self._keys)
+        while i > 0:
+            i -= 1
+            yield self._keys[i]
+
+
+class MemoryStore(SessionStore):
+    """In-process store with LRU/TTL eviction and a memory cap.
+
+    Sessions are kept in least-recently-used order. A session (with its
+    notes) is evicted once it has been idle for ``ttl`` seconds, or when the
+    approximate size of all records exceeds ``max_bytes`` or the number of
+    sessions exceeds ``max_sessions``.
+
+    Messages and notes are held as compact records (see records.py); with
+    ``compress`` the content and structured notes of each note are kept
+    zlib-compressed until read.
+    """
+    name = "memory"
+
+    def __init__(self, ttl=7 * 24 * 3600, max_bytes=256 * 1024 * 1024, max_sessions=10000, compress=True):
+        super().__init__()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.compress = compress
+        self._sessions = OrderedDict()
+        self._touched = {}
+        self._notes = {}
+        self._note_index = {}   # session_id -> {subject_key: [note ids]}
+        self._summaries = {}    # session_id -> session-list summary
+        self._activity = {}     # session_id -> (activity, session_id)
+        self._owners = {}       # session_id -> owner
+        self._versions = {}     # session_id -> (version, modified_at)
+        self._by_activity = _ActivityIndex()
+        self._by_owner = {}     # owner -> _ActivityIndex
+        self._blob_refs = {}    # blob_id -> {session ids}
+        self._session_blobs = {}  # session_id -> {blob ids}
+        self._sizes = {}        # session_id -> approximate bytes incl. notes
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+    def _touch(self, session_id):
+        self._sessions.move_to_end(session_id)
+        self._touched[session_id] = time.monotonic()
+
+    def _add_size(self, session_id, size):
+        self._sizes[session_id] = self._sizes.get(session_id, 0) + size
+        self._total_bytes += size
+
+    def _remove(self, session_id):
+        self._sessions.pop(session_id)
+        for note_ids in self._note_index.pop(session_id, {}).values():
+            for note_id in note_ids:
+                self._notes.pop(note_id, None)
+        self._touched.pop(session_id, None)
+        self._total_bytes -= self._sizes.pop(session_id, 0)
+        self._summaries.pop(session_id, None)
+        self._unindex_activity(session_id)
+        self._owners.pop(session_id, None)
+        self._versions.pop(session_id, None)
+
+    def _bump(self, session_id):
+        version = self._versions.get(session_id, (0, 0))[0]
+        self._versions[session_id] = (version + 1, time.time())
+
+    def _unindex_activity(self, session_id):
+        key = self._activity.pop(session_id, None)
+        if key is not None:
+            self._by_activity.remove(key)
+            owner = self._owners.get(session_id)
+            if owner is not None:
+                self._by_owner[owner].remove(key)
+                if not self._by_owner[owner]:
+                    del self._by_owner[owner]
+
+    def _mark_active(self, session_id, key=None):
+        """Move a session to the newest position of the activity indexes
+        (or re-index it at ``key``)"""
+        self._unindex_activity(session_id)
+        key = key or (time.time(), session_id)
+        self._activity[session_id] = key
+        self._by_activity.add(key)
+        owner = self._owners.get(session_id)
+        if owner is not None:
+            self._by_owner.setdefault(owner, _ActivityIndex()).add(key)
+
+    def _evict(self):
+        """Drop expired sessions, then least recently used ones over the caps"""
+        evicted = []
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            over_limit = (self._total_bytes > self.max_bytes
+                          or len(self._sessions) > self.max_sessions)
+            if self._touched[oldest] >= cutoff and not over_limit:
+                break
+            if len(self._sessions) == 1 and not self._touched[oldest] < cutoff:
+                # Never evict the only (currently active) session for size alone
+                break
+            self._remove(oldest)
+            evicted.append(oldest)
+        return evicted
+
+    def _view(self, session):
+        """A snapshot of a session; messages stay records (read-only mappings)"""
+        view = dict(session)
+        view["message_history"] = list(session["message_history"])
+        view["files"] = list(session["files"])
+        return view
+
+    def _get(self, session_id):
+        """The stored session (marked as recently used), or None if it is
+        missing or expired"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self._touched[session_id] >= time.monotonic() - self.ttl:
+                self._touch(session_id)
+                return session
+            self._remove(session_id)
+        self._notify_evicted([session_id])
+        return None
+
+    def get_session(self, session_id):
+        session = self._get(session_id)
+        if session is None:
+            return None
+        with self._lock:
+            return self._view(session)
+
+    def get_or_create_session(self, session_id, owner=None):
+        session = self._get_or_create(session_id, owner)
+        with self._lock:
+            return self._view(session)
+
+    def _get_or_create(self, session_id, owner=None):
+        session = self._get(session_id)
+        if session is not None:
+            if owner and self._owners.get(session_id) is None:
+                with self._lock:
+                    if session_id in self._sessions and self._owners.get(session_id) is None:
+                        key = self._activity.get(session_id)
+                        self._unindex_activity(session_id)
+                        self._owners[session_id] = owner
+                        self._mark_active(session_id, key)
+            return session
+        with self._lock:
+            if session_id not in self._sessions:
+                session = new_session(session_id)
+                self._sessions[session_id] = session
+                self._add_size(session_id, approx_size(session))
+                self._summaries[session_id] = {
+                    "id": session_id,
+                    "created_at": session["created_at"],
+                    "last_activity": session["created_at"],
+                    "message_count": 0,
+                    "file_count": 0,
+                    "preview": "New session",
+                    "has_files": False
+                }
+                if owner:
+                    self._owners[session_id] = owner
+                self._bump(session_id)
+                self._mark_active(session_id)
+            self._touch(session_id)
+            session = self._sessions[session_id]
+            evicted = self._evict()
+        self._notify_evicted(evicted)
+        return session
+
+    def append_messages(self, session_id, messages, keep=50):
+        self._get_or_create(session_id)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            records = [Message(message) for message in messages]
+            history = session["message_history"]
+            history.extend(records)
+            size = sum(approx_size(record) for record in records)
+            if len(history) > keep:
+                dropped = history[:-keep]
+                size -= sum(approx_size(record) for record in dropped)
+                session["message_history"] = history[-keep:]
+            self._add_size(session_id, size)
+            self._touch(session_id)
+
+            summary = self._summaries[session_id]
+            summary["message_count"] = len(session["message_history"])
+            if messages:
+                summary["last_activity"] = messages[-1].get("timestamp", summary["last_activity"])
+            for message in reversed(messages):
+                if message.get("role") == "user":
+                    summary["preview"] = message_preview(message)
+                    break
+            self._bump(session_id)
+            self._mark_active(session_id)
+            evicted = self._evict()
+        self._notify_evicted(evicted)
+
+    def add_file(self, session_id, file_key):
+        self._get_or_create(session_id)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._add_file(session_id, session, file_key)
+
+    def _add_file(self, session_id, session, file_key):
+        if file_key not in session["files"]:
+            session["files"].append(file_key)
+            summary = self._summaries[session_id]
+            summary["file_count"] = len(session["files"])
+            summary["has_files"] = True
+            self._bump(session_id)
+
+    def session_version(self, session_id):
+        if self._get(session_id) is None:
+            return None
+        with self._lock:
+            return self._versions.get(session_id)
+
+    def session_page(self, owner=None, limit=20, before=None):
+        with self._lock:
+            index = self._by_activity if owner is None else self._by_owner.get(owner)
+            if index is None:
+                return [], None
+            cutoff = time.monotonic() - self.ttl
+            page = []
+            for key in index.before(before):
+                if self._touched[key[1]] < cutoff:
+                    continue    # expired, not yet evicted
+                if len(page) == limit:
+                    return page, self._activity[page[-1]["id"]]
+                page.append(dict(self._summaries[key[1]]))
+            return page, None
+
+    def count_owner_sessions(self, owner):
+        with self._lock:
+            index = self._by_owner.get(owner)
+            return len(index) if index is not None else 0
+
+    def delete_session(self, session_id):
+        with self._lock:
+            if session_id not in self._sessions:
+                return False
+            self._remove(session_id)
+            return True
+
+    def get_note(self, file_key):
+        with self._lock:
+            return self._notes.get(file_key)
+
+    def put_note(self, note):
+        note = Note(note, compress=self.compress)
+        with self._lock:
+            self._put_note(note)
+            evicted = self._evict()
+        self._notify_evicted(evicted)
+
+    def _put_note(self, note):
+        session_id = note.get("session_id")
+        previous = self._notes.get(note["id"])
+        self._notes[note["id"]] = note
+        if previous is not None:
+            self._unindex(previous)
+        self._note_index.setdefault(session_id, {}).setdefault(
+            subject_key(note.get("subject")), []).append(note["id"])
+        if session_id in self._sessions:
+            size = approx_size(note) - (approx_size(previous) if previous else 0)
+            self._add_size(session_id, size)
+            self._bump(session_id)
+
+    def add_note(self, note):
+        session_id = note.get("session_id")
+        if self._get(session_id) is None:
+            return False
+        note = Note(note, compress=self.compress)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            self._put_note(note)
+            self._add_file(session_id, session, note["id"])
+            evicted = self._evict()
+        self._notify_evicted(evicted)
+        return True
+
+    def _unindex(self, note):
+        subjects = self._note_index.get(note.get("session_id"), {})
+        note_ids = subjects.get(subject_key(note.get("subject")), [])
+        if note["id"] in note_ids:
+            note_ids.remove(note["id"])
+
+    def session_notes(self, session_id, subject=None):
+        with self._lock:
+            subjects = self._note_index.get(session_id, {})
+            if subject:
+                note_ids = subjects.get(subject_key(subject), [])
+            else:
+                note_ids = [note_id for ids in subjects.values() for note_id in ids]
+            notes = [self._notes[note_id] for note_id in note_ids if note_id in self._notes]
+            order = {note_id: i for i, note_id in enumerate(self._sessions.get(session_id, {}).get("files", []))}
+            return sorted(notes, key=lambda note: order.get(note["id"], len(order)))
+
+    def add_blob_ref(self, session_id, blob_id):
+        with self._lock:
+            self._blob_refs.setdefault(blob_id, set()).add(session_id)
+            self._session_blobs.setdefault(session_id, set()).add(blob_id)
+
+    def release_blob_refs(self, session_id):
+        with self._lock:
+            orphaned = []
+            for blob_id in self._session_blobs.pop(session_id, ()):
+                sessions = self._blob_refs.get(blob_id)
+                sessions.discard(session_id)
+                if not sessions:
+                    del self._blob_refs[blob_id]
+                    orphaned.append(blob_id)
+            return orphaned
+
+    def delete_if_unreferenced(self, blob_id, delete):
+        with self._lock:
+            if not self._blob_refs.get(blob_id):
+                delete(blob_id)
+
+    def count_sessions(self):
+        return len(self._sessions)
+
+    def count_notes(self):
+        return len(self._notes)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.name,
+                "sessions": len(self._sessions),
+                "notes": len(self._notes),
+                "uploads": len(self._blob_refs),
+                "approx_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+class SQLiteStore(SessionStore):
+    """SQLite-backed store so sessions and notes survive restarts.
+
+    The database runs in WAL mode with a busy timeout, so several gunicorn
+    workers (and their threads) can share one file: readers never block the
+    writer, every read of a session happens in one transaction so it sees a
+    consistent snapshot, and read-modify-write updates take the write lock
+    up front with ``BEGIN IMMEDIATE``. Sessions idle for longer than ``ttl``
+    seconds are purged, checked at most once per ``sweep_interval`` seconds
+    on writes.
+    """
+    name = "sqlite"
+    shared = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        last_activity REAL NOT NULL,
+        preferences TEXT NOT NULL DEFAULT '{}',
+        owner TEXT,
+        activity_at REAL NOT NULL DEFAULT 0,
+        last_message_at TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        file_count INTEGER NOT NULL DEFAULT 0,
+        preview TEXT NOT NULL DEFAULT 'New session',
+        version INTEGER NOT NULL DEFAULT 0,
+        modified_at REAL NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS sessions_last_activity ON sessions(last_activity);
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+    CREATE TABLE IF NOT EXISTS session_files (
+        session_id TEXT NOT NULL,
+        file_key TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        PRIMARY KEY (session_id, file_key)
+    );
+    CREATE TABLE IF NOT EXISTS notes (
+        id TEXT PRIMARY KEY,
+        session_id TEXT,
+        subject_key TEXT NOT NULL DEFAULT '',
+        data TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS blob_refs (
+        blob_id TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        PRIMARY KEY (blob_id, session_id)
+    );
+    CREATE INDEX IF NOT EXISTS blob_refs_session ON blob_refs(session_id);
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        updated REAL NOT NULL,
+        data TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, sweep_interval=60, busy_timeout=30):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        self._migrate(conn)
+
+    SUMMARY_COLUMNS = {
+        "owner": "TEXT",
+        "activity_at": "REAL NOT NULL DEFAULT 0",
+        "last_message_at": "TEXT",
+        "message_count": "INTEGER NOT NULL DEFAULT 0",
+        "file_count": "INTEGER NOT NULL DEFAULT 0",
+        "preview": "TEXT NOT NULL DEFAULT 'New session'",
+        "version": "INTEGER NOT NULL DEFAULT 0",
+        "modified_at": "REAL NOT NULL DEFAULT 0"
+    }
+
+    def _migrate(self, conn):
+        """Bring databases created by older versions up to the current schema"""
+        columns = [r["name"] for r in conn.execute("PRAGMA table_info(sessions)")]
+        missing = [name for name in self.SUMMARY_COLUMNS if name not in columns]
+        if missing:
+            with self._transaction(write=True) as tx:
+                for name in missing:
+                    tx.execute(f"ALTER TABLE sessions ADD COLUMN {name} {self.SUMMARY_COLUMNS[name]}")
+                for row in tx.execute("SELECT * FROM sessions").fetchall():
+                    session = self._load_session(tx, row)
+                    self._update_summary(tx, session["id"], session["message_history"], activity=row["last_activity"])
+                if "modified_at" in missing:
+                    tx.execute("UPDATE sessions SET modified_at = last_activity")
+
+        columns = [r["name"] for r in conn.execute("PRAGMA table_info(notes)")]
+        if "subject_key" not in columns:
+            with self._transaction(write=True) as tx:
+                tx.execute("ALTER TABLE notes ADD COLUMN subject_key TEXT NOT NULL DEFAULT ''")
+                rows = tx.execute("SELECT id, data FROM notes").fetchall()
+                tx.executemany(
+                    "UPDATE notes SET subject_key = ? WHERE id = ?",
+                    [(subject_key(json.loads(r["data"]).get("subject")), r["id"]) for r in rows])
+        conn.executescript("""
+        DROP INDEX IF EXISTS notes_session;
+        CREATE INDEX IF NOT EXISTS notes_session_subject ON notes(session_id, subject_key);
+        CREATE INDEX IF NOT EXISTS sessions_activity ON sessions(activity_at, id);
+        CREATE INDEX IF NOT EXISTS sessions_owner_activity ON sessions(owner, activity_at, id);
+        """)
+
+    def _conn(self):
+        """One connection per thread and process.
+
+        sqlite3 connections must not be shared between threads, nor used in
+        a forked child (gunicorn workers forked from a preloaded app).
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self, write=False):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _load_session(self, conn, row):
+        messages = [
+            json.loads(r["data"]) for r in conn.execute(
+                "SELECT data FROM messages WHERE session_id = ? ORDER BY id", (row["id"],))
+        ]
+        files = [
+            r["file_key"] for r in conn.execute(
+                "SELECT file_key FROM session_files WHERE session_id = ? ORDER BY position", (row["id"],))
+        ]
+        return {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "message_history": messages,
+            "files": files,
+            "preferences": json.loads(row["preferences"])
+        }
+
+    def _touch(self, conn, session_id):
+        conn.execute("UPDATE sessions SET last_activity = ? WHERE id = ?", (time.time(), session_id))
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        cutoff = time.time() - self.ttl
+        with self._transaction(write=True) as conn:
+            expired = [r["id"] for r in conn.execute(
+                "SELECT id FROM sessions WHERE last_activity < ?", (cutoff,))]
+            for session_id in expired:
+                self._delete(conn, session_id)
+        self._notify_evicted(expired)
+
+    def _delete(self, conn, session_id):
+        conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM notes WHERE session_id = ?", (session_id,))
+        conn.execute("DELETE FROM session_files WHERE session_id = ?", (session_id,))
+        return conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def get_session(self, session_id):
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM sessions WHERE id = ? AND last_activity >= ?",
+                (session_id, time.time() - self.ttl)).fetchone()
+            return self._load_session(conn, row) if row else None
+
+    def _ensure(self, conn, session_id, owner=None):
+        """Create the session row if missing and mark it active"""
+        now = time.time()
+        conn.execute(
+            """INSERT OR IGNORE INTO sessions (id, created_at, last_activity, activity_at, owner, version, modified_at)
+               VALUES (?, ?, ?, ?, ?, 1, ?)""",
+            (session_id, datetime.now().isoformat(), now, now, owner, now))
+        self._touch(conn, session_id)
+        if owner:
+            conn.execute("UPDATE sessions SET owner = ? WHERE id = ? AND owner IS NULL", (owner, session_id))
+
+    def _bump(self, conn, session_id):
+        conn.execute(
+            "UPDATE sessions SET version = version + 1, modified_at = ? WHERE id = ?", (time.time(), session_id))
+
+    def _update_summary(self, conn, session_id, new_messages, activity=None):
+        """Refresh the session-list summary after messages were written"""
+        conn.execute(
+            """UPDATE sessions SET activity_at = ?,
+                   message_count = (SELECT COUNT(*) FROM messages WHERE session_id = ?),
+                   file_count = (SELECT COUNT(*) FROM session_files WHERE session_id = ?)
+               WHERE id = ?""",
+            (activity or time.time(), session_id, session_id, session_id))
+        if new_messages:
+            timestamp = new_messages[-1].get("timestamp")
+            if timestamp:
+                conn.execute("UPDATE sessions SET last_message_at = ? WHERE id = ?", (timestamp, session_id))
+        for message in reversed(new_messages):
+            if message.get("role") == "user":
+                conn.execute(
+                    "UPDATE sessions SET preview = ? WHERE id = ?", (message_preview(message), session_id))
+                break
+
+    def get_or_create_session(self, session_id, owner=None):
+        self._sweep()
+        with self._transaction(write=True) as conn:
+            self._ensure(conn, session_id, owner)
+            row = conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            return self._load_session(conn, row)
+
+    def append_messages(self, session_id, messages, keep=50):
+        self._sweep()
+        with self._transaction(write=True) as conn:
+            self._ensure(conn, session_id)
+            conn.executemany(
+                "INSERT INTO messages (session_id, data) VALUES (?, ?)",
+                [(session_id, json.dumps(m)) for m in messages])
+            conn.execute(
+                """DELETE FROM messages WHERE session_id = ? AND id NOT IN (
+                       SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)""",
+                (session_id, session_id, keep))
+            self._update_summary(conn, session_id, messages)
+            self._bump(conn, session_id)
+
+    def add_file(self, session_id, file_key):
+        with self._transaction(write=True) as conn:
+            self._ensure(conn, session_id)
+            self._add_file(conn, session_id, file_key)
+
+    def _add_file(self, conn, session_id, file_key):
+        added = conn.execute(
+            """INSERT OR IGNORE INTO session_files (session_id, file_key, position)
+               SELECT ?, ?, COALESCE(MAX(position), -1) + 1 FROM session_files WHERE session_id = ?""",
+            (session_id, file_key, session_id)).rowcount
+        if added:
+            conn.execute(
+                "UPDATE sessions SET file_count = (SELECT COUNT(*) FROM session_files WHERE session_id = ?) WHERE id = ?",
+                (session_id, session_id))
+            self._bump(conn, session_id)
+
+    def session_version(self, session_id):
+        row = self._conn().execute(
+            "SELECT version, modified_at FROM sessions WHERE id = ? AND last_activity >= ?",
+            (session_id, time.time() - self.ttl)).fetchone()
+        return (row["version"], row["modified_at"]) if row else None
+
+    def session_page(self, owner=None, limit=20, before=None):
+        query = """SELECT id, created_at, activity_at, last_message_at, message_count, file_count, preview
+                   FROM sessions WHERE last_activity >= ?"""
+        params = [time.time() - self.ttl]
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        if before is not None:
+            query += " AND (activity_at, id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY activity_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        rows = self._conn().execute(query, params).fetchall()
+        page = [{
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "last_activity": row["last_message_at"] or row["created_at"],
+            "message_count": row["message_count"],
+            "file_count": row["file_count"],
+            "preview": row["preview"],
+            "has_files": row["file_count"] > 0
+        } for row in rows[:limit]]
+        next_key = (rows[limit - 1]["activity_at"], rows[limit - 1]["id"]) if len(rows) > limit else None
+        return page, next_key
+
+    def count_owner_sessions(self, owner):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE owner = ?", (owner,)).fetchone()[0]
+
+    def delete_session(self, session_id):
+        with self._transaction(write=True) as conn:
+            return self._delete(conn, session_id)
+
+    def get_note(self, file_key):
+        row = self._conn().execute("SELECT data FROM notes WHERE id = ?", (file_key,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def put_note(self, note):
+        with self._transaction(write=True) as conn:
+            self._put_note(conn, note)
+
+    def _put_note(self, conn, note):
+        conn.execute(
+            "INSERT OR REPLACE INTO notes (id, session_id, subject_key, data) VALUES (?, ?, ?, ?)",
+            (note["id"], note.get("session_id"), subject_key(note.get("subject")), json.dumps(note)))
+        self._bump(conn, note.get("session_id"))
+
+    def add_note(self, note):
+        session_id = note.get("session_id")
+        with self._transaction(write=True) as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sessions WHERE id = ? AND last_activity >= ?",
+                (session_id, time.time() - self.ttl)).fetchone()
+            if exists is None:
+                return False
+            self._touch(conn, session_id)
+            self._put_note(conn, note)
+            self._add_file(conn, session_id, note["id"])
+        return True
+
+    def session_notes(self, session_id, subject=None):
+        query = """SELECT n.data FROM notes n
+                   LEFT JOIN session_files f ON f.session_id = n.session_id AND f.file_key = n.id
+                   WHERE n.session_id = ?"""
+        params = [session_id]
+        if subject:
+            query += " AND n.subject_key = ?"
+            params.append(subject_key(subject))
+        query += " ORDER BY f.position IS NULL, f.position"
+        return [json.loads(r["data"]) for r in self._conn().execute(query, params)]
+
+    def add_blob_ref(self, session_id, blob_id):
+        self._conn().execute(
+            "INSERT OR IGNORE INTO blob_refs (blob_id, session_id) VALUES (?, ?)", (blob_id, session_id))
+
+    def release_blob_refs(self, session_id):
+        with self._transaction(write=True) as conn:
+            blob_ids = [r["blob_id"] for r in conn.execute(
+                "SELECT blob_id FROM blob_refs WHERE session_id = ?", (session_id,))]
+            conn.execute("DELETE FROM blob_refs WHERE session_id = ?", (session_id,))
+            return [
+                blob_id for blob_id in blob_ids
+                if conn.execute("SELECT 1 FROM blob_refs WHERE blob_id = ? LIMIT 1", (blob_id,)).fetchone() is None
+            ]
+
+    def delete_if_unreferenced(self, blob_id, delete):
+        # The write transaction holds SQLite's write lock, so add_blob_ref in
+        # any worker waits until the file is gone
+        with self._transaction(write=True) as conn:
+            if conn.execute("SELECT 1 FROM blob_refs WHERE blob_id = ? LIMIT 1", (blob_id,)).fetchone() is None:
+                delete(blob_id)
+
+    def put_job(self, job):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO jobs (id, updated, data) VALUES (?, ?, ?)",
+            (job["id"], time.time(), json.dumps(job)))
+
+    def get_job(self, job_id):
+        row = self._conn().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def prune_jobs(self, max_age):
+        self._conn().execute("DELETE FROM jobs WHERE updated < ?", (time.time() - max_age,))
+
+    def count_sessions(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def count_notes(self):
+        return self._conn().execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def stats(self):
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {
+            "backend": self.name,
+            "sessions": self.count_sessions(),
+            "notes": self.count_notes(),
+            "uploads": self._conn().execute("SELECT COUNT(DISTINCT blob_id) FROM blob_refs").fetchone()[0],
+            "db_bytes": size
+        }
+
+
+def create_store(config):
+    """Build the store selected by config.SESSION_STORE"""
+    if config.SESSION_STORE == "sqlite" or config.SHARED_STATE:
+        return SQLiteStore(config.SESSION_DB_PATH, ttl=config.SESSION_TTL)
+    if config.SESSION_STORE == "memory":
+        return MemoryStore(
+            ttl=config.SESSION_TTL,
+            max_bytes=config.MEMORY_STORE_MAX_BYTES,
+            max_sessions=config.MEMORY_STORE_MAX_SESSIONS,
+            compress=config.MEMORY_STORE_COMPRESS
+        )
+    raise ValueError(f"Unknown session store: {config.SESSION_STORE}")
@@ -0,0 +1,154 @@
+"""Content-addressed storage for uploaded files"""
+import hashlib
+import os
+import threading
+import uuid
+
+
+class UploadStore:
+    """Uploaded files stored once per distinct content.
+
+    A file is hashed while it is streamed to disk and kept as
+    ``<root>/<hash[:2]>/<hash><ext>``; uploading content that is already
+    stored costs only that one streaming pass. Text extracted from a file is
+    kept next to it, so a duplicate upload skips extraction too. With
+    ``retention="text"`` the original is deleted as soon as its text has
+    been extracted.
+
+    Which sessions use which file is tracked by the session store
+    (``add_blob_ref``/``release_blob_refs``); files no session references
+    any more are removed with delete().
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, root, retention="file", text_budget=0):
+        if retention not in ("file", "text"):
+            raise ValueError(f"Unknown upload retention mode: {retention}")
+        self.root = root
+        self.retention = retention
+        self.text_budget = text_budget
+        self._tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._extracting = {}   # blob_id -> lock held while its text is extracted
+        self.saved = 0
+        self.deduplicated = 0
+        self.deleted = 0
+
+    def _path(self, blob_id):
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    def _text_path(self, blob_id):
+        # The budget is part of the name: text cut at another budget is not reused
+        return f"{self._path(blob_id)}.{self.text_budget}.txt"
+
+    def save(self, stream, filename, before_commit=None):
+        """Stream an upload into storage and return its blob id.
+
+        ``before_commit(blob_id)`` runs once the hash is known but before
+        checking for an existing copy. Registering the session's reference
+        there is what keeps a concurrent delete of the same content safe,
+        provided the deleter re-checks references under the same lock (see
+        Store.delete_if_unreferenced); if it deletes first, this call finds
+        no copy and stores the file again.
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self._tmp_dir, uuid.uuid4().hex)
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+            blob_id = digest.hexdigest() + ext
+            if before_commit is not None:
+                before_commit(blob_id)
+
+            path = self._path(blob_id)
+            if os.path.exists(path) or os.path.exists(self._text_path(blob_id)):
+                os.remove(tmp_path)
+                with self._lock:
+                    self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                with self._lock:
+                    self.saved += 1
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_id
+
+    def _read_text(self, blob_id):
+        try:
+            with open(self._text_path(blob_id), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def text(self, blob_id, extract):
+        """Extracted text of a stored file.
+
+        extract(path) runs only for the first upload of this content; later
+        calls (from any session) read the saved text.
+        """
+        text = self._read_text(blob_id)
+        if text is not None:
+            return text
+
+        with self._lock:
+            lock = self._extracting.setdefault(blob_id, threading.Lock())
+        with lock:
+            text = self._read_text(blob_id)
+            if text is None:
+                text = extract(self._path(blob_id))
+                if text:
+                    self._write_text(blob_id, text)
+                else:
+                    # Another worker may have extracted it and dropped the original
+                    text = self._read_text(blob_id) or text
+        with self._lock:
+            self._extracting.pop(blob_id, None)
+        return text
+
+    def _write_text(self, blob_id, text):
+        path = self._text_path(blob_id)
+        tmp_path = os.path.join(self._tmp_dir, uuid.uuid4().hex)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        if self.retention == "text":
+            try:
+                os.remove(self._path(blob_id))
+            except OSError:
+                pass
+
+    def delete(self, blob_id):
+        """Remove a file and its extracted text"""
+        directory = os.path.dirname(self._path(blob_id))
+        try:
+            names = [name for name in os.listdir(directory)
+                     if name == blob_id or name.startswith(blob_id + ".")]
+        except OSError:
+            return
+        for name in names:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError as e:
+                print(f"Upload delete error: {e}")
+        with self._lock:
+            self.deleted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "retention": self.retention,
+                "saved": self.saved,
+                "deduplicated": self.deduplicated,
+                "deleted": self.deleted
+            }